@@ -2,13 +2,21 @@
 import os
 import random
 import asyncio
+import contextlib
+import contextvars
 import datetime as dt
+import hashlib
+import json
 import logging
+import math
 import re
+import time
+import uuid
+from collections import OrderedDict, deque
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 from typing import Dict, Any
-from pymongo.errors import PyMongoError
+from pymongo.errors import DuplicateKeyError, PyMongoError
 from bson import ObjectId
 
 
@@ -17,14 +25,17 @@ from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.encoders import jsonable_encoder
 
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
-from telegram.error import BadRequest
+from telegram.error import BadRequest, Forbidden, RetryAfter
 from telegram.ext import (
     Application, ApplicationBuilder, CommandHandler, CallbackQueryHandler,
     MessageHandler, ContextTypes, filters
 )
 
-from pymongo import MongoClient, ASCENDING, DESCENDING
+from pymongo import MongoClient, ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+from apscheduler.jobstores.mongodb import MongoDBJobStore
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 import cohere
+import httpx
 
 # =========================
 # ENV
@@ -33,6 +44,9 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 MONGO_URI = os.getenv("MONGO_URI")
 COHERE_API_KEY = os.getenv("COHERE_API_KEY")
 COHERE_MODEL = os.getenv("COHERE_MODEL", "command-r-08-2024")
+COHERE_MODEL_FAST = os.getenv("COHERE_MODEL_FAST", "command-r7b-12-2024")
+COHERE_MODEL_LARGE = os.getenv("COHERE_MODEL_LARGE", "command-r-plus-08-2024")
+LLM_ROUTES_JSON = os.getenv("LLM_ROUTES_JSON")  # optional per-call-site overrides, e.g. {"phrase_intervention": {"timeout_sec": 5}}
 TZ = os.getenv("TZ", "America/Toronto")
 TZINFO = ZoneInfo(TZ)
 RENDER_EXTERNAL_URL = os.getenv("RENDER_EXTERNAL_URL")
@@ -42,6 +56,72 @@ WEBHOOK_URL = os.getenv("WEBHOOK_URL")
 TELEGRAM_SECRET_TOKEN = os.getenv("TELEGRAM_SECRET_TOKEN")  # for webhook header validation
 CRON_SECRET = os.getenv("CRON_SECRET")                      # for /cron/* endpoints protection
 
+def _env_flag(name: str, default: bool) -> bool:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    return raw.strip().lower() in {"1", "true", "yes", "on"}
+
+# Free-text coaching replies stream into one Telegram message that is edited in place.
+STREAM_COACH_REPLIES = _env_flag("STREAM_COACH_REPLIES", True)
+STREAM_EDIT_INTERVAL_SEC = float(os.getenv("STREAM_EDIT_INTERVAL_SEC", "1.0"))
+# Samples kept per LLM call site for /ops/llm percentiles.
+LLM_METRICS_WINDOW = int(os.getenv("LLM_METRICS_WINDOW", "500"))
+LLM_METRICS_HOURS = 48
+# Outbound Telegram delivery: token buckets for the bot as a whole and for each chat.
+OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", "25"))   # messages per second
+OUTBOUND_CHAT_RATE = float(os.getenv("OUTBOUND_CHAT_RATE", "1"))        # messages per second per chat
+OUTBOUND_CHAT_BURST = float(os.getenv("OUTBOUND_CHAT_BURST", "3"))
+OUTBOUND_WORKERS = max(1, int(os.getenv("OUTBOUND_WORKERS", "4")))
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", "3"))
+# Proactive messages go through the persistent outbox; inline delivery sends right after the write.
+OUTBOX_INLINE_DELIVERY = _env_flag("OUTBOX_INLINE_DELIVERY", True)
+OUTBOX_BATCH_SIZE = max(1, int(os.getenv("OUTBOX_BATCH_SIZE", "50")))
+OUTBOX_POLL_SEC = float(os.getenv("OUTBOX_POLL_SEC", "5"))
+OUTBOX_MAX_ATTEMPTS = max(1, int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5")))
+OUTBOX_CLAIM_TIMEOUT_SEC = int(os.getenv("OUTBOX_CLAIM_TIMEOUT_SEC", "120"))
+# Pending messages for one user claimed in the same outbox worker batch are merged into one send (see OUTBOX_MERGE_RULES).
+OUTBOX_MERGE_ENABLED = _env_flag("OUTBOX_MERGE_ENABLED", True)
+OUTBOX_MERGE_MAX = max(1, int(os.getenv("OUTBOX_MERGE_MAX", "3")))
+# Inline sends of mergeable messages wait this long, so a second message for the same user joins the first.
+OUTBOX_MERGE_WINDOW_SEC = max(0.0, float(os.getenv("OUTBOX_MERGE_WINDOW_SEC", "2")))
+INSTANCE_ID = os.getenv("RENDER_INSTANCE_ID") or f"{os.getenv('HOSTNAME', 'local')}:{os.getpid()}"
+# Users (or sessions) a cron run works on at the same time.
+CRON_CONCURRENCY = max(1, int(os.getenv("CRON_CONCURRENCY", "8")))
+# Webhook updates are acknowledged at once and processed by a worker pool.
+WEBHOOK_WORKERS = max(1, int(os.getenv("WEBHOOK_WORKERS", "8")))
+WEBHOOK_QUEUE_SIZE = max(1, int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000")))
+# "webhook" (default) or "polling": pull updates with getUpdates instead of receiving POSTs.
+INGESTION_MODE = os.getenv("INGESTION_MODE", "webhook").strip().lower()
+POLL_BATCH_LIMIT = min(100, max(1, int(os.getenv("POLL_BATCH_LIMIT", "100"))))
+POLL_TIMEOUT_SEC = int(os.getenv("POLL_TIMEOUT_SEC", "30"))
+POLL_CONCURRENCY = max(1, int(os.getenv("POLL_CONCURRENCY", str(WEBHOOK_WORKERS))))
+POLL_BACKOFF_MAX_SEC = 60
+# Telegram update_id values remembered to drop redeliveries (in memory, and in Mongo for this many seconds).
+UPDATE_DEDUPE_MEMORY = max(1, int(os.getenv("UPDATE_DEDUPE_MEMORY", "10000")))
+UPDATE_DEDUPE_TTL_SEC = int(os.getenv("UPDATE_DEDUPE_TTL_SEC", "86400"))
+# cron_daily only visits users whose next_due_at has passed (or is missing).
+CRON_DAILY_DUE_ONLY = _env_flag("CRON_DAILY_DUE_ONLY", True)
+CRON_DAILY_RECHECK_MIN = int(os.getenv("CRON_DAILY_RECHECK_MIN", "15"))
+# Daily-loop prompts go out at a stable per-user minute in [0, N) of the chosen hour instead of all at :00; 0 disables.
+DAILY_LOOP_JITTER_MIN = min(60, max(0, int(os.getenv("DAILY_LOOP_JITTER_MIN", "45"))))
+# How often /cron/daily is triggered. Without timers a prompt can only go out on a tick, so the jitter snaps to it.
+CRON_DAILY_TICK_MIN = max(1, int(os.getenv("CRON_DAILY_TICK_MIN", "60")))
+# In-process timers (APScheduler, Mongo job store) fire session nudges and daily-loop work on time; cron stays as a sweep.
+TIMER_SERVICE_ENABLED = _env_flag("TIMER_SERVICE_ENABLED", True)
+TIMER_DEBOUNCE_SEC = int(os.getenv("TIMER_DEBOUNCE_SEC", "30"))
+# Mongo lease per cron job so overlapping triggers (Render cron, GitHub Actions, other instances) never double-run.
+CRON_LEASE_TTL_SEC = max(15, int(os.getenv("CRON_LEASE_TTL_SEC", "120")))
+CRON_FOLLOW_UP = _env_flag("CRON_FOLLOW_UP", False)   # queue one follow-up run instead of just exiting
+# cron_daily stops between chunks once its budget is spent and resumes from a user_id cursor next time.
+CRON_TIME_BUDGET_SEC = float(os.getenv("CRON_TIME_BUDGET_SEC", "600"))
+CRON_CHUNK_SIZE = max(1, int(os.getenv("CRON_CHUNK_SIZE", "100")))
+CRON_JOB_HISTORY = max(1, int(os.getenv("CRON_JOB_HISTORY", "50")))   # finished cron jobs kept for /cron/jobs
+CRON_RUNS_RETENTION_DAYS = max(1, int(os.getenv("CRON_RUNS_RETENTION_DAYS", "30")))   # cron_runs ledger rows expire after this
+# Users packed into one weekly-summary phrasing request; 1 disables batching.
+WEEKLY_SUMMARY_BATCH_SIZE = max(1, int(os.getenv("WEEKLY_SUMMARY_BATCH_SIZE", "10")))
+WEEKLY_SUMMARY_LOCAL_HOUR = min(23, max(0, int(os.getenv("WEEKLY_SUMMARY_LOCAL_HOUR", "9"))))   # users get their summary from this local hour on Monday
+
 logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
 logger = logging.getLogger("brobot")
 
@@ -55,7 +135,7 @@ co = cohere.Client(COHERE_API_KEY)
 mongo = MongoClient(MONGO_URI)
 db = mongo["Brobot"]
 
-users = db["users"]    # {user_id, name, streak, missed_days, checkin_hour, created_at}
+users = db["users"]    # {user_id, name, streak, missed_days, checkin_hour, next_due_at, weekly_summary_week, weekly_summary_attempted_week, created_at}
 goals = db["goals"]    # {user_id, goal, why, updated_at}
 logs = db["logs"]      # {user_id, ts, kind, data}
 state = db["state"]    # {user_id, mood, energy, focus, cooldown_until, last_checkin}
@@ -69,6 +149,11 @@ control_stats = db["control_stats"]  # { user_id, category, bucket, attempts, su
 control_events = db["control_events"]  # { user_id, ts, outcome_type, message_type, trigger, phase, hour_bin, time_bucket, intervention_key, pressure_level, silence_reason, related_goal_id, related_session_id, updated_at }
 system_state = db["system_state"]  # { _id, fake_utc_now, updated_at }
 test_outbox = db["test_outbox"]  # { user_id, ts, text, message_type, phase, trigger, related_session_id, updated_at }
+outbox = db["outbox"]  # { idempotency_key, user_id, status, text, message_type, phase, trigger, reply_markup, parse_mode, related_session_id, attempts, next_attempt_at, claimed_by, claimed_at, telegram_message_id, sent_at, created_at }
+cron_leases = db["cron_leases"]  # { _id: job name, owner, acquired_at, expires_at, follow_up_requested }
+processed_updates = db["processed_updates"]  # { _id: update_id, seen_at }  expires after UPDATE_DEDUPE_TTL_SEC
+daily_plans = db["daily_plans"]  # { user_id, date, timezone, morning, midday, eod, minute, current_goal, built_at, cached_at }
+cron_runs = db["cron_runs"]  # { job_id, job, source, status, started_at, duration_sec, runs, users_scanned, users_due, sent, suppressed, deferred, llm_requests, llm_merged, errors, user_ms_p95, remaining }
 
 started_confirmed: bool
 nudges_sent: int
@@ -80,10 +165,13 @@ positive_minutes: int
 
 # Indexes
 users.create_index([("user_id", ASCENDING)], unique=True)
+users.create_index([("next_due_at", ASCENDING)])
 goals.create_index([("user_id", ASCENDING), ("goal", ASCENDING)], unique=True)
 logs.create_index([("user_id", ASCENDING), ("ts", DESCENDING)])
 state.create_index([("user_id", ASCENDING)], unique=True)
 sessions.create_index([("user_id", ASCENDING), ("state", ASCENDING), ("started_at", DESCENDING)])
+sessions.create_index([("state", ASCENDING), ("next_check_at", ASCENDING)])
+sessions.create_index([("state", ASCENDING), ("ends_at", ASCENDING)])
 events.create_index([("user_id", ASCENDING), ("ts", DESCENDING)])
 profiles.create_index([("user_id", ASCENDING)], unique=True)
 daily_intentions.create_index([("user_id", ASCENDING), ("date", ASCENDING)], unique=True)
@@ -93,6 +181,13 @@ control_stats.create_index([("user_id", ASCENDING), ("category", ASCENDING), ("b
 control_events.create_index([("user_id", ASCENDING), ("ts", DESCENDING)])
 system_state.create_index([("_id", ASCENDING)])
 test_outbox.create_index([("user_id", ASCENDING), ("ts", DESCENDING)])
+outbox.create_index([("idempotency_key", ASCENDING)], unique=True)
+outbox.create_index([("status", ASCENDING), ("next_attempt_at", ASCENDING)])
+processed_updates.create_index([("seen_at", ASCENDING)], expireAfterSeconds=UPDATE_DEDUPE_TTL_SEC)
+daily_plans.create_index([("user_id", ASCENDING), ("date", DESCENDING)], unique=True)
+daily_plans.create_index([("cached_at", ASCENDING)], expireAfterSeconds=3 * 86400)
+cron_runs.create_index([("job", ASCENDING), ("started_at", DESCENDING)])
+cron_runs.create_index([("started_at", ASCENDING)], expireAfterSeconds=CRON_RUNS_RETENTION_DAYS * 86400)
 
 COMMON_BLOCKERS = ["overwhelmed", "distracted", "tired", "anxious", "perfectionist"]
 PUSH_STYLES = ["gentle", "firm", "ruthless"]
@@ -180,12 +275,17 @@ def ensure_profile(user_id: int, name: str = "") -> Dict[str, Any]:
             "restart_size_min": 10,
             "onboarding_complete": False,
             "conversation": None,
+            "loop_jitter_minute": loop_jitter_minute(user_id),
             "created_at": now(),
             "updated_at": now(),
         }},
         upsert=True
     )
     profile = get_profile(user_id)
+    if "loop_jitter_minute" not in profile:
+        # Profiles created before the jitter existed get theirs once, here, not on the read paths.
+        profile["loop_jitter_minute"] = loop_jitter_minute(user_id)
+        profiles.update_one({"user_id": user_id}, {"$set": {"loop_jitter_minute": profile["loop_jitter_minute"]}})
     if profile.get("push_style"):
         set_memory(user_id, "preferred_tone", profile.get("push_style"), 0.9)
     return profile
@@ -193,6 +293,8 @@ def ensure_profile(user_id: int, name: str = "") -> Dict[str, Any]:
 def set_profile_fields(user_id: int, **fields):
     fields["updated_at"] = now()
     profiles.update_one({"user_id": user_id}, {"$set": fields}, upsert=True)
+    if DAILY_LOOP_TIMING_FIELDS.intersection(fields):
+        mark_user_due(user_id)
     if "push_style" in fields:
         set_memory(user_id, "preferred_tone", fields["push_style"], 0.95)
     if "blockers" in fields and isinstance(fields["blockers"], list):
@@ -315,6 +417,7 @@ def upsert_today_intention(user_id: int, **fields):
         {"$set": payload, "$setOnInsert": insert_defaults},
         upsert=True,
     )
+    mark_user_due(user_id, replan=False)
     return get_today_intention(user_id)
 
 def mark_goal_status(user_id: int, goal: str, status: str):
@@ -325,6 +428,7 @@ def mark_goal_status(user_id: int, goal: str, status: str):
     else:
         updates["completed_at"] = None
     goals.update_one({"user_id": user_id, "goal": goal}, {"$set": updates}, upsert=False)
+    mark_user_due(user_id)
     if normalized == "done":
         next_goal_name = None
         if (users.find_one({"user_id": user_id}) or {}).get("active_goal") == goal:
@@ -1107,6 +1211,7 @@ def start_session(user_id: int, timebox_min: int, goal: str | None = None, *, nu
     }
     res = sessions.insert_one(doc)
     sid = res.inserted_id
+    schedule_session_timer(sid)
     log_event(user_id, "session_start", {"goal": g, "timebox_min": timebox_min, "sid": str(sid), "nudges_enabled": bool(nudges_enabled), "source": source})
     record_outcome(
         user_id,
@@ -1167,21 +1272,209 @@ def style_text(tone: str, msg: str) -> str:
         return f"⚠️ {msg}"
     return f"➡️ {msg}"
 
+# =========================
+# LLM INSTRUMENTATION
+# =========================
+LLM_METRICS: Dict[str, Dict[str, Any]] = {}
+
+def _llm_site_metrics(call_site: str) -> Dict[str, Any]:
+    site = LLM_METRICS.get(call_site)
+    if site is None:
+        site = {
+            "calls": 0,
+            "errors": 0,
+            "fallbacks": 0,
+            "latency_ms": deque(maxlen=LLM_METRICS_WINDOW),
+            "prompt_chars": deque(maxlen=LLM_METRICS_WINDOW),
+            "response_chars": deque(maxlen=LLM_METRICS_WINDOW),
+            "hourly_calls": {},
+        }
+        LLM_METRICS[call_site] = site
+    return site
+
+def record_llm_call(call_site: str, *, prompt_chars: int, response_chars: int, latency_ms: float, error: bool = False):
+    site = _llm_site_metrics(call_site)
+    site["calls"] += 1
+    if error:
+        site["errors"] += 1
+    site["latency_ms"].append(float(latency_ms))
+    site["prompt_chars"].append(int(prompt_chars))
+    site["response_chars"].append(int(response_chars))
+    hour_key = _hour_bucket(dt.datetime.now(dt.timezone.utc))
+    hourly = site["hourly_calls"]
+    hourly[hour_key] = hourly.get(hour_key, 0) + 1
+    for stale_key in sorted(hourly)[:-LLM_METRICS_HOURS]:
+        hourly.pop(stale_key, None)
+
+def record_llm_fallback(call_site: str):
+    _llm_site_metrics(call_site)["fallbacks"] += 1
+
+def percentile(values, pct: float) -> float | None:
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    rank = max(0, min(len(ordered) - 1, math.ceil((pct / 100.0) * len(ordered)) - 1))
+    return ordered[rank]
+
+def llm_metrics_payload() -> Dict[str, Any]:
+    sites: Dict[str, Any] = {}
+    for call_site, site in sorted(LLM_METRICS.items()):
+        latencies = list(site["latency_ms"])
+        prompt_chars = list(site["prompt_chars"])
+        response_chars = list(site["response_chars"])
+        sites[call_site] = {
+            "route": llm_route(call_site),
+            "calls": site["calls"],
+            "errors": site["errors"],
+            "fallbacks": site["fallbacks"],
+            "samples": len(latencies),
+            "latency_ms": {
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "p99": percentile(latencies, 99),
+                "max": max(latencies) if latencies else None,
+            },
+            "avg_prompt_chars": round(sum(prompt_chars) / len(prompt_chars), 1) if prompt_chars else None,
+            "avg_response_chars": round(sum(response_chars) / len(response_chars), 1) if response_chars else None,
+            "hourly_calls": dict(sorted(site["hourly_calls"].items())),
+        }
+    return {
+        "window": LLM_METRICS_WINDOW,
+        "routes": LLM_ROUTES,
+        "call_sites": sites,
+        "single_flight": {**LLM_SINGLE_FLIGHT_STATS, "in_flight": len(_LLM_INFLIGHT)},
+    }
+
+# Each call site gets its own model, temperature, output cap and timeout.
+LLM_DEFAULT_ROUTE = {"model": COHERE_MODEL, "temperature": 0.2, "max_tokens": 300, "timeout_sec": 20.0}
+LLM_ROUTES: Dict[str, Dict[str, Any]] = {
+    "ai_reply": {"model": COHERE_MODEL, "temperature": 0.2, "max_tokens": 300, "timeout_sec": 20.0},
+    "phrase_intervention": {"model": COHERE_MODEL_FAST, "temperature": 0.2, "max_tokens": 120, "timeout_sec": 8.0},
+    "phrase_weekly_summary": {"model": COHERE_MODEL_LARGE, "temperature": 0.2, "max_tokens": 350, "timeout_sec": 30.0},
+    "phrase_weekly_summary_batch": {"model": COHERE_MODEL_LARGE, "temperature": 0.2, "max_tokens": 3000, "timeout_sec": 90.0},
+}
+def apply_llm_route_overrides(routes: Dict[str, Dict[str, Any]], raw: str) -> Dict[str, Dict[str, Any]]:
+    """Merge ``{"call_site": {...}}`` from LLM_ROUTES_JSON into ``routes``; malformed input or entries are skipped."""
+    try:
+        overrides = json.loads(raw)
+    except ValueError:
+        logger.exception("Ignoring malformed LLM_ROUTES_JSON")
+        return routes
+    if not isinstance(overrides, dict):
+        logger.warning("Ignoring LLM_ROUTES_JSON: expected an object of call sites")
+        return routes
+    for site, override in overrides.items():
+        if not isinstance(override, dict):
+            logger.warning("Ignoring LLM_ROUTES_JSON entry for %s: expected an object", site)
+            continue
+        routes[site] = {**routes.get(site, LLM_DEFAULT_ROUTE), **override}
+    return routes
+
+if LLM_ROUTES_JSON:
+    apply_llm_route_overrides(LLM_ROUTES, LLM_ROUTES_JSON)
+
+def llm_route(call_site: str) -> Dict[str, Any]:
+    return LLM_ROUTES.get(call_site, LLM_DEFAULT_ROUTE)
+
+def _cohere_route_kwargs(call_site: str) -> Dict[str, Any]:
+    route = llm_route(call_site)
+    return {
+        "model": route["model"],
+        "temperature": float(route["temperature"]),
+        "max_tokens": int(route["max_tokens"]),
+        "request_options": {"timeout_in_seconds": int(math.ceil(float(route["timeout_sec"])))},
+    }
+
+def cohere_chat(call_site: str, prompt: str) -> str:
+    """Run one Cohere chat call on the ``call_site`` route and record it. Errors are re-raised."""
+    started = time.perf_counter()
+    try:
+        resp = co.chat(message=prompt, **_cohere_route_kwargs(call_site))
+    except Exception:
+        record_llm_call(call_site, prompt_chars=len(prompt), response_chars=0, latency_ms=(time.perf_counter() - started) * 1000.0, error=True)
+        raise
+    text = (resp.text or "").strip()
+    record_llm_call(call_site, prompt_chars=len(prompt), response_chars=len(text), latency_ms=(time.perf_counter() - started) * 1000.0)
+    return text
+
+async def cohere_chat_async(call_site: str, prompt: str) -> str:
+    """``cohere_chat`` on a worker thread, so concurrent cron work does not block the event loop."""
+    return await asyncio.to_thread(cohere_chat, call_site, prompt)
+
+AI_REPLY_FALLBACK = "Lock in. Pick the smallest useful next step and do it for 2 minutes right now."
+STREAM_PLACEHOLDER_TEXT = "…"
+
 def ai_reply(prompt: str) -> str:
     try:
-        resp = co.chat(model=COHERE_MODEL, message=prompt, temperature=0.2)
-        return (resp.text or "").strip()
+        return cohere_chat("ai_reply", prompt)
     except Exception:
-        logger.exception("Cohere chat failed using model %s", COHERE_MODEL)
-        return "Lock in. Pick the smallest useful next step and do it for 2 minutes right now."
+        logger.exception("Cohere chat failed using model %s", llm_route("ai_reply")["model"])
+        record_llm_fallback("ai_reply")
+        return AI_REPLY_FALLBACK
 
-def phrase_intervention(user_id: int, intervention: Dict[str, Any]) -> str:
+async def _edit_streamed_message(message, text: str):
+    try:
+        await message.edit_text(text)
+        EDIT_CACHE_METRICS["edits_sent"] += 1
+    except BadRequest as exc:
+        if "message is not modified" not in str(exc).lower():
+            logger.warning("Streaming edit rejected for chat_id=%s: %s", message.chat_id, exc)
+    except Exception:
+        logger.exception("Streaming edit failed for chat_id=%s", message.chat_id)
+
+async def stream_ai_reply(message, prompt: str) -> str:
+    """Reply with a placeholder right away, then edit it as the Cohere stream arrives."""
+    placeholder = await message.reply_text(STREAM_PLACEHOLDER_TEXT)
+    loop = asyncio.get_running_loop()
+    chunks: asyncio.Queue = asyncio.Queue()
+
+    def pump():
+        # The Cohere client is synchronous, so the stream is drained on a worker thread.
+        try:
+            for event in co.chat_stream(message=prompt, **_cohere_route_kwargs("ai_reply")):
+                if getattr(event, "event_type", None) == "text-generation":
+                    loop.call_soon_threadsafe(chunks.put_nowait, event.text or "")
+        except Exception as exc:
+            loop.call_soon_threadsafe(chunks.put_nowait, exc)
+        finally:
+            loop.call_soon_threadsafe(chunks.put_nowait, None)
+
+    started = time.perf_counter()
+    pump_done = loop.run_in_executor(None, pump)
+    text = ""
+    shown = STREAM_PLACEHOLDER_TEXT
+    last_edit_at = 0.0
+    failed = False
+    while True:
+        item = await chunks.get()
+        if item is None:
+            break
+        if isinstance(item, Exception):
+            logger.error("Cohere chat stream failed using model %s", llm_route("ai_reply")["model"], exc_info=item)
+            failed = True
+            continue
+        text += item
+        visible = text.strip()
+        if visible and visible != shown and loop.time() - last_edit_at >= STREAM_EDIT_INTERVAL_SEC:
+            await _edit_streamed_message(placeholder, visible)
+            shown = visible
+            last_edit_at = loop.time()
+    await pump_done
+    record_llm_call("ai_reply", prompt_chars=len(prompt), response_chars=len(text.strip()), latency_ms=(time.perf_counter() - started) * 1000.0, error=failed)
+    final = text.strip() or AI_REPLY_FALLBACK
+    if not text.strip():
+        record_llm_fallback("ai_reply")
+    if final != shown:
+        await _edit_streamed_message(placeholder, final)
+    return final
+
+def intervention_phrase_prompt(user_id: int, intervention: Dict[str, Any]) -> str:
     goal = intervention.get("goal") or effective_intention_goal(user_id) or "your target"
     tone_policy = intervention.get("tone_policy", "firm")
     phrasing_style = intervention.get("phrasing_style", "tactical")
     pressure_level = intervention.get("pressure_level", "medium")
     recent_phrases = ", ".join(recent_list_memory(user_id, "recent_phrase_signatures", limit=3)) or "none"
-    prompt = (
+    return (
         f"You are phrasing a deterministic Telegram accountability intervention.\n"
         f"Tone policy: {tone_policy}.\n"
         f"Phrasing style: {phrasing_style}.\n"
@@ -1195,25 +1488,83 @@ def phrase_intervention(user_id: int, intervention: Dict[str, Any]) -> str:
         f"Recent phrase signatures to avoid repeating: {recent_phrases}.\n"
         "Write 1-2 short Telegram-ready sentences. Keep it sharp, useful, and non-generic. Do not invent logic or extra options."
     )
-    try:
-        resp = co.chat(model=COHERE_MODEL, message=prompt, temperature=0.2)
-        text = (resp.text or "").strip() or intervention.get("action", "Take the smallest next step now.")
-    except Exception:
-        logger.exception("Cohere intervention phrasing failed using model %s", COHERE_MODEL)
+
+# Cron phrasing for the same deterministic intervention shares one in-flight Cohere request (single-flight);
+# the shared wording names the goal as a token that each user's own goal replaces.
+INTERVENTION_SHARED_FIELDS = ("trigger", "mode", "blocker", "action_offer", "action", "tone_policy", "phrasing_style", "pressure_level")
+INTERVENTION_GOAL_TOKEN = "[GOAL]"
+LLM_SINGLE_FLIGHT_STATS: Dict[str, int] = {"requests": 0, "merged": 0, "repeats": 0}
+_LLM_INFLIGHT: Dict[tuple, asyncio.Future] = {}
+
+def shared_intervention_prompt(intervention: Dict[str, Any]) -> str:
+    return (
+        f"You are phrasing a deterministic Telegram accountability intervention.\n"
+        f"Tone policy: {intervention.get('tone_policy', 'firm')}.\n"
+        f"Phrasing style: {intervention.get('phrasing_style', 'tactical')}.\n"
+        f"Pressure level: {intervention.get('pressure_level', 'medium')}.\n"
+        f"Goal: write it exactly as {INTERVENTION_GOAL_TOKEN}.\n"
+        f"Trigger: {intervention.get('trigger')}.\n"
+        f"Mode: {intervention.get('mode')}.\n"
+        f"Blocker: {intervention.get('blocker') or 'none'}.\n"
+        f"Action offer: {intervention.get('action_offer') or 'default'}.\n"
+        f"Action: {intervention.get('action')}.\n"
+        "Write 1-2 short Telegram-ready sentences. Keep it sharp, useful, and non-generic. Do not invent logic or extra options."
+    )
+
+async def phrase_shared_intervention(intervention: Dict[str, Any]) -> str:
+    """Phrasing for the intervention tuple; callers arriving while it is in flight await the same request."""
+    key = tuple(intervention.get(field) for field in INTERVENTION_SHARED_FIELDS)
+    inflight = _LLM_INFLIGHT.get(key)
+    if inflight is not None:
+        LLM_SINGLE_FLIGHT_STATS["merged"] += 1
+        count_cron_run("llm_merged")
+        return await asyncio.shield(inflight)
+    LLM_SINGLE_FLIGHT_STATS["requests"] += 1
+    count_cron_run("llm_requests")
+    task = asyncio.ensure_future(cohere_chat_async("phrase_intervention", shared_intervention_prompt(intervention)))
+    _LLM_INFLIGHT[key] = task
+    task.add_done_callback(lambda _done: _LLM_INFLIGHT.pop(key, None))
+    return await asyncio.shield(task)
+
+def phrase_signature(text: str) -> str:
+    return " ".join(text.lower().split()[:8])
+
+def _finish_intervention_phrase(user_id: int, intervention: Dict[str, Any], text: str) -> str:
+    if not text:
+        record_llm_fallback("phrase_intervention")
         text = intervention.get("action", "Take the smallest next step now.")
-    signature = " ".join(text.lower().split()[:8])
-    push_recent_memory(user_id, "recent_phrasing_styles", phrasing_style, limit=4, confidence=0.7)
+    signature = phrase_signature(text)
+    push_recent_memory(user_id, "recent_phrasing_styles", intervention.get("phrasing_style", "tactical"), limit=4, confidence=0.7)
     push_recent_memory(user_id, "recent_phrase_signatures", signature, limit=4, confidence=0.7)
     return text
 
-def weekly_summary_facts(user_id: int) -> Dict[str, Any]:
-    since = now() - timedelta(days=7)
-    week_intentions = list(daily_intentions.find({"user_id": user_id, "updated_at": {"$gte": since}}).sort("date", ASCENDING))
-    week_logs = list(logs.find({"user_id": user_id, "ts": {"$gte": since}}).sort("ts", ASCENDING))
-    week_outcomes = list(intervention_outcomes.find({"user_id": user_id, "ts": {"$gte": since}}))
+def phrase_intervention(user_id: int, intervention: Dict[str, Any]) -> str:
+    prompt = intervention_phrase_prompt(user_id, intervention)
+    try:
+        text = cohere_chat("phrase_intervention", prompt)
+    except Exception:
+        logger.exception("Cohere intervention phrasing failed using model %s", llm_route("phrase_intervention")["model"])
+        text = ""
+    return _finish_intervention_phrase(user_id, intervention, text)
 
-    active_statuses = {"active", "partial", "done", "reset_tomorrow"}
-    days_active = sum(1 for item in week_intentions if item.get("status") in active_statuses)
+async def phrase_intervention_async(user_id: int, intervention: Dict[str, Any]) -> str:
+    """Shared phrasing with this user's goal filled in; a wording the user saw recently is rephrased for them alone."""
+    goal = intervention.get("goal") or effective_intention_goal(user_id) or "your target"
+    try:
+        text = (await phrase_shared_intervention(intervention)).replace(INTERVENTION_GOAL_TOKEN, goal)
+        if text and phrase_signature(text) in recent_list_memory(user_id, "recent_phrase_signatures", limit=3):
+            LLM_SINGLE_FLIGHT_STATS["repeats"] += 1
+            text = await cohere_chat_async("phrase_intervention", intervention_phrase_prompt(user_id, intervention))
+    except Exception:
+        logger.exception("Cohere intervention phrasing failed using model %s", llm_route("phrase_intervention")["model"])
+        text = ""
+    return _finish_intervention_phrase(user_id, intervention, text)
+
+WEEKLY_ACTIVE_STATUSES = {"active", "partial", "done", "reset_tomorrow"}
+
+def build_weekly_summary_facts(week_intentions: list, week_logs: list, week_outcomes: list, slumps=None, modes=None) -> Dict[str, Any]:
+    """Pure weekly facts from one user's last 7 days; intentions are expected in date order."""
+    days_active = sum(1 for item in week_intentions if item.get("status") in WEEKLY_ACTIVE_STATUSES)
     done_goals = [item.get("selected_goal") for item in week_intentions if item.get("status") == "done" and item.get("selected_goal")]
     key_wins = list(dict.fromkeys(done_goals))[:3]
 
@@ -1255,13 +1606,57 @@ def weekly_summary_facts(user_id: int) -> Dict[str, Any]:
         "main_blocker_pattern": main_blocker_pattern,
         "what_worked": what_worked,
         "adjustment": adjustment,
-        "top_slump_hour": top_bucket(get_memory(user_id, "time_of_day_slumps", {})) or "none",
-        "effective_style": top_bucket(get_memory(user_id, "effective_intervention_modes", {})) or what_worked,
+        "top_slump_hour": top_bucket(slumps or {}) or "none",
+        "effective_style": top_bucket(modes or {}) or what_worked,
     }
 
-def phrase_weekly_summary(user_id: int, facts: Dict[str, Any]) -> str:
+def weekly_summary_facts(user_id: int) -> Dict[str, Any]:
+    since = now() - timedelta(days=7)
+    return build_weekly_summary_facts(
+        list(daily_intentions.find({"user_id": user_id, "updated_at": {"$gte": since}}).sort("date", ASCENDING)),
+        list(logs.find({"user_id": user_id, "ts": {"$gte": since}}).sort("ts", ASCENDING)),
+        list(intervention_outcomes.find({"user_id": user_id, "ts": {"$gte": since}})),
+        get_memory(user_id, "time_of_day_slumps", {}),
+        get_memory(user_id, "effective_intervention_modes", {}),
+    )
+
+def weekly_summary_facts_for_cohort(user_ids: list[int]) -> Dict[int, Dict[str, Any]]:
+    """Weekly facts for many users from one aggregation ($unionWith over the three source collections)."""
+    since = now() - timedelta(days=7)
+    pipeline = [
+        {"$match": {"user_id": {"$in": user_ids}, "updated_at": {"$gte": since}}},
+        {"$project": {"_id": 0, "user_id": 1, "date": 1, "status": 1, "selected_goal": 1, "source": {"$literal": "intentions"}}},
+        {"$unionWith": {"coll": logs.name, "pipeline": [
+            {"$match": {"user_id": {"$in": user_ids}, "ts": {"$gte": since}, "kind": "loop_status"}},
+            {"$project": {"_id": 0, "user_id": 1, "kind": 1, "data.status": 1, "source": {"$literal": "logs"}}},
+        ]}},
+        {"$unionWith": {"coll": intervention_outcomes.name, "pipeline": [
+            {"$match": {"user_id": {"$in": user_ids}, "ts": {"$gte": since}}},
+            {"$project": {"_id": 0, "user_id": 1, "blocker": 1, "progress_occurred": 1, "mode": 1, "source": {"$literal": "outcomes"}}},
+        ]}},
+        {"$sort": {"date": 1}},
+        {"$group": {"_id": {"user_id": "$user_id", "source": "$source"}, "docs": {"$push": "$$ROOT"}}},
+    ]
+    records: Dict[int, Dict[str, list]] = {uid: {"intentions": [], "logs": [], "outcomes": []} for uid in user_ids}
+    for group in daily_intentions.aggregate(pipeline):
+        records[group["_id"]["user_id"]][group["_id"]["source"]] = group["docs"]
+    memories: Dict[int, Dict[str, Any]] = {}
+    for doc in memory.find({"user_id": {"$in": user_ids}, "key": {"$in": ["time_of_day_slumps", "effective_intervention_modes"]}}, {"user_id": 1, "key": 1, "value": 1}):
+        memories.setdefault(doc["user_id"], {})[doc["key"]] = doc.get("value")
+    return {
+        uid: build_weekly_summary_facts(
+            parts["intentions"],
+            parts["logs"],
+            parts["outcomes"],
+            memories.get(uid, {}).get("time_of_day_slumps"),
+            memories.get(uid, {}).get("effective_intervention_modes"),
+        )
+        for uid, parts in records.items()
+    }
+
+def weekly_summary_prompt(facts: Dict[str, Any]) -> str:
     wins = ", ".join(facts.get("key_wins") or ["none"])
-    prompt = (
+    return (
         "Phrase this deterministic weekly accountability summary in 4-5 short lines.\n"
         f"Days active: {facts.get('days_active', 0)}.\n"
         f"Key wins: {wins}.\n"
@@ -1271,13 +1666,9 @@ def phrase_weekly_summary(user_id: int, facts: Dict[str, Any]) -> str:
         f"Adjustment for next week: {facts.get('adjustment', '')}.\n"
         "Do not invent facts. Keep it practical, sharp, and free of generic praise."
     )
-    try:
-        resp = co.chat(model=COHERE_MODEL, message=prompt, temperature=0.2)
-        text = (resp.text or "").strip()
-        if text:
-            return text
-    except Exception:
-        logger.exception("Cohere weekly summary phrasing failed using model %s", COHERE_MODEL)
+
+def weekly_summary_template(facts: Dict[str, Any]) -> str:
+    wins = ", ".join(facts.get("key_wins") or ["none"])
     return (
         "Weekly summary\n"
         f"Days active: {facts.get('days_active', 0)}\n"
@@ -1288,6 +1679,81 @@ def phrase_weekly_summary(user_id: int, facts: Dict[str, Any]) -> str:
         f"Next adjustment: {facts.get('adjustment', '')}"
     )
 
+def phrase_weekly_summary(user_id: int, facts: Dict[str, Any]) -> str:
+    try:
+        text = cohere_chat("phrase_weekly_summary", weekly_summary_prompt(facts))
+        if text:
+            return text
+    except Exception:
+        logger.exception("Cohere weekly summary phrasing failed using model %s", llm_route("phrase_weekly_summary")["model"])
+    record_llm_fallback("phrase_weekly_summary")
+    return weekly_summary_template(facts)
+
+async def phrase_weekly_summary_async(user_id: int, facts: Dict[str, Any]) -> str:
+    try:
+        text = await cohere_chat_async("phrase_weekly_summary", weekly_summary_prompt(facts))
+        if text:
+            return text
+    except Exception:
+        logger.exception("Cohere weekly summary phrasing failed using model %s", llm_route("phrase_weekly_summary")["model"])
+    record_llm_fallback("phrase_weekly_summary")
+    return weekly_summary_template(facts)
+
+WEEKLY_SUMMARY_FACT_KEYS = ("days_active", "key_wins", "main_blocker_pattern", "what_worked", "top_slump_hour", "adjustment")
+WEEKLY_SUMMARY_MAX_CHARS = 900
+
+def weekly_summary_batch_prompt(facts_by_user: Dict[int, Dict[str, Any]]) -> str:
+    payload = {
+        str(uid): {key: facts.get(key) for key in WEEKLY_SUMMARY_FACT_KEYS}
+        for uid, facts in facts_by_user.items()
+    }
+    return (
+        "Phrase each deterministic weekly accountability summary below in 4-5 short lines.\n"
+        "The input is a JSON object keyed by user ID.\n"
+        "Return only a JSON object with exactly the same user ID keys, each mapped to that user's summary as one string.\n"
+        "Do not invent facts. Keep it practical, sharp, and free of generic praise.\n"
+        f"Input: {json.dumps(payload, sort_keys=True)}"
+    )
+
+def parse_weekly_summary_batch(raw: str, user_ids) -> Dict[int, str]:
+    """Pull valid per-user summaries out of a batch reply. Missing or malformed entries are left out."""
+    text = (raw or "").strip()
+    start = text.find("{")
+    end = text.rfind("}")
+    if start < 0 or end <= start:
+        return {}
+    try:
+        data = json.loads(text[start:end + 1])
+    except ValueError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    parsed: Dict[int, str] = {}
+    for uid in user_ids:
+        value = data.get(str(uid))
+        if isinstance(value, str) and value.strip() and len(value.strip()) <= WEEKLY_SUMMARY_MAX_CHARS:
+            parsed[uid] = value.strip()
+    return parsed
+
+async def phrase_weekly_summaries_batch(facts_by_user: Dict[int, Dict[str, Any]]) -> Dict[int, str]:
+    if len(facts_by_user) == 1:
+        uid, facts = next(iter(facts_by_user.items()))
+        return {uid: await phrase_weekly_summary_async(uid, facts)}
+    try:
+        raw = await cohere_chat_async("phrase_weekly_summary_batch", weekly_summary_batch_prompt(facts_by_user))
+    except Exception:
+        logger.exception("Cohere batch weekly summary phrasing failed using model %s", llm_route("phrase_weekly_summary_batch")["model"])
+        raw = ""
+    parsed = parse_weekly_summary_batch(raw, list(facts_by_user))
+    summaries: Dict[int, str] = {}
+    for uid, facts in facts_by_user.items():
+        if uid in parsed:
+            summaries[uid] = parsed[uid]
+            continue
+        record_llm_fallback("phrase_weekly_summary_batch")
+        summaries[uid] = weekly_summary_template(facts)
+    return summaries
+
 def cooldown_active(user_id: int) -> bool:
     s = state.find_one({"user_id": user_id}) or {}
     cu = ensure_aware(s.get("cooldown_until"))
@@ -1307,17 +1773,43 @@ def log_event(user_id: int, kind: str, data: Dict[str, Any] | None = None):
         "kind": kind,   # checkin|mood|done|skip|reason|insight|override
         "data": data or {}
     })
+    if kind == "loop_status":
+        # Avoidance counts feed the daily loop's recovery check, not the day's plan.
+        mark_user_due(user_id, replan=False)
 
 def log_structured(event: str, **fields):
     pairs = " ".join(f"{key}={fields[key]!r}" for key in sorted(fields))
     logger.info("event=%s %s", event, pairs)
 
+EDIT_CACHE_METRICS = {"edits_sent": 0, "edits_avoided": 0, "not_modified_errors": 0}
+
+def _markup_dict(reply_markup) -> Dict[str, Any] | None:
+    markup = reply_markup.to_dict() if reply_markup is not None else None
+    return markup if markup and markup.get("inline_keyboard") else None
+
+def is_rendered(message, text: str, reply_markup=None, parse_mode=None) -> bool:
+    """True when ``message`` (as Telegram sent it with the callback) already shows ``text`` and ``reply_markup``.
+
+    Markdown/HTML edits are never skipped: the message carries the rendered text, not the source.
+    """
+    if message is None or parse_mode is not None:
+        return False
+    current_text = getattr(message, "text", None)
+    if current_text is None:
+        return False
+    return current_text == text and _markup_dict(getattr(message, "reply_markup", None)) == _markup_dict(reply_markup)
+
 async def safe_edit_message_text(query, text: str, *, reply_markup=None, parse_mode=None):
+    if is_rendered(query.message, text, reply_markup, parse_mode):
+        EDIT_CACHE_METRICS["edits_avoided"] += 1
+        return False
     try:
         await query.edit_message_text(text=text, reply_markup=reply_markup, parse_mode=parse_mode)
+        EDIT_CACHE_METRICS["edits_sent"] += 1
         return True
     except BadRequest as exc:
         if "message is not modified" in str(exc).lower():
+            EDIT_CACHE_METRICS["not_modified_errors"] += 1
             await query.answer("Already up to date.")
             return False
         raise
@@ -1328,6 +1820,7 @@ def set_goal_why(user_id: int, goal: str, why: str):
         {"$set": {"why": why, "status": "active", "completed_at": None, "updated_at": now()}},
         upsert=True
     )
+    mark_user_due(user_id)
 
 def get_first_goal(user_id: int):
     return resolve_current_goal(user_id)
@@ -1654,8 +2147,55 @@ def set_active_goal(user_id: int, goal: str) -> bool:
     if not g:
         return False
     users.update_one({"user_id": user_id}, {"$set": {"active_goal": g["goal"]}}, upsert=True)
+    mark_user_due(user_id)
     return True
 
+def loop_jitter_minute(user_id: int) -> int:
+    """Deterministic minute offset for a user: the same on every instance and every day, spread evenly by sha256."""
+    if DAILY_LOOP_JITTER_MIN <= 0:
+        return 0
+    digest = hashlib.sha256(f"loop_jitter:{user_id}".encode("utf-8")).hexdigest()
+    return int(digest, 16) % DAILY_LOOP_JITTER_MIN
+
+def loop_tick_minutes() -> int:
+    """Granularity at which a daily-loop prompt can actually go out: timers fire on the minute, cron on its tick."""
+    return 1 if TIMER_SERVICE_ENABLED else CRON_DAILY_TICK_MIN
+
+def loop_jitter_for_profile(user_id: int, profile: Dict[str, Any]) -> int:
+    """The user's offset (stored by ensure_profile), snapped down to the loop tick so no prompt waits for a later tick."""
+    minute = profile.get("loop_jitter_minute")
+    if not isinstance(minute, int) or not 0 <= minute < max(1, DAILY_LOOP_JITTER_MIN):
+        minute = loop_jitter_minute(user_id)
+    return minute - minute % loop_tick_minutes()
+
+def simulate_send_smoothing(user_ids, *, tick_minutes: int | None = None) -> Dict[str, Any]:
+    """Sends per loop tick when every user shares one loop hour: all at :00 (before) vs at their jitter minute (after).
+
+    ``tick_minutes`` defaults to the deployment's real tick (loop_tick_minutes); a send goes out on the first
+    tick at or after its slot, and ``max_delay_min_after`` reports how late that is.
+    """
+    user_ids = list(user_ids)
+    tick = max(1, tick_minutes or loop_tick_minutes())
+    after: Dict[int, int] = {}
+    max_delay = 0
+    for uid in user_ids:
+        slot = loop_jitter_for_profile(uid, {})
+        sent = -(-slot // tick) * tick
+        max_delay = max(max_delay, sent - slot)
+        after[sent] = after.get(sent, 0) + 1
+    peak_before = len(user_ids)  # without jitter every slot is :00, which every tick hits
+    peak_after = max(after.values()) if after else 0
+    return {
+        "users": len(user_ids),
+        "jitter_minutes": DAILY_LOOP_JITTER_MIN,
+        "tick_minutes": tick,
+        "peak_per_tick_before": peak_before,
+        "peak_per_tick_after": peak_after,
+        "busy_ticks_after": len(after),
+        "max_delay_min_after": max_delay,
+        "peak_reduction": round(peak_before / peak_after, 1) if peak_after else None,
+    }
+
 def daily_loop_hours_for_user(user_id: int) -> Dict[str, int]:
     profile = ensure_profile(user_id)
     user_doc = users.find_one({"user_id": user_id}) or {}
@@ -1674,6 +2214,7 @@ def daily_loop_hours_for_user(user_id: int) -> Dict[str, int]:
         "morning": morning,
         "midday": midday,
         "eod": end_of_day,
+        "minute": loop_jitter_for_profile(user_id, profile),
     }
 
 def goals_list_buttons(user_id: int):
@@ -1804,7 +2345,7 @@ def profile_summary(user_id: int) -> str:
         f"Goals: {goals_list}\n"
         f"Push style: {profile.get('push_style', 'firm')}\n"
         f"Work start: {profile.get('work_start_hour', 9):02d}:00\n"
-        f"Daily loop: {loop_hours['morning']:02d}:00 / {loop_hours['midday']:02d}:00 / {loop_hours['eod']:02d}:00 {tz_name}\n"
+        f"Daily loop: {loop_hours['morning']:02d}:{loop_hours['minute']:02d} / {loop_hours['midday']:02d}:{loop_hours['minute']:02d} / {loop_hours['eod']:02d}:{loop_hours['minute']:02d} {tz_name}\n"
         f"Blockers: {blockers}\n"
         f"Restart size: {profile.get('restart_size_min', 10)} min"
     )
@@ -1878,6 +2419,7 @@ async def cmd_focus(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         sid = start_session(user.id, mins, g["goal"], nudges_enabled=True, source="command")
         sessions.update_one({"_id": sid}, {"$set": {"next_check_at": now() + timedelta(minutes=5)}})
+        schedule_session_timer(sid)
     except Exception as e:
         return await update.message.reply_text(f"Could not start session: {e}")
 
@@ -1943,7 +2485,7 @@ async def cmd_checkintime(update: Update, context: ContextTypes.DEFAULT_TYPE):
     tz_name = get_user_timezone(user.id)
     await update.message.reply_text(
         f"Daily loop anchor set to {hour:02d}:00 {tz_name}.\n"
-        f"Morning: {loop_hours['morning']:02d}:00 | Midday: {loop_hours['midday']:02d}:00 | End-of-day: {loop_hours['eod']:02d}:00"
+        f"Morning: {loop_hours['morning']:02d}:{loop_hours['minute']:02d} | Midday: {loop_hours['midday']:02d}:{loop_hours['minute']:02d} | End-of-day: {loop_hours['eod']:02d}:{loop_hours['minute']:02d}"
     )
 
 async def cmd_checkin(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -2048,24 +2590,24 @@ async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         goal_count = int((conversation.get("data") or {}).get("goal_count", goals.count_documents({"user_id": user.id})))
         if action == "add" and goal_count < 3:
             set_profile_conversation(user.id, "onboarding", "goal_name", {"goal_count": goal_count})
-            await query.edit_message_text(f"Send goal {goal_count + 1} in a few words.")
+            await safe_edit_message_text(query, f"Send goal {goal_count + 1} in a few words.")
             return
         set_profile_conversation(user.id, "onboarding", "push_style", {"goal_count": goal_count})
-        await query.edit_message_text("Onboarding step 3/6.\nPick the push style you want from me.", reply_markup=push_style_buttons())
+        await safe_edit_message_text(query, "Onboarding step 3/6.\nPick the push style you want from me.", reply_markup=push_style_buttons())
         return
 
     if data.startswith("ob:style:"):
         style = data.split(":", 2)[2]
         set_profile_fields(user.id, push_style=style)
         set_profile_conversation(user.id, "onboarding", "work_start", {})
-        await query.edit_message_text("Onboarding step 4/6.\nWhat time does your workday usually start?", reply_markup=work_start_buttons())
+        await safe_edit_message_text(query, "Onboarding step 4/6.\nWhat time does your workday usually start?", reply_markup=work_start_buttons())
         return
 
     if data.startswith("ob:work:"):
         hour = int(data.split(":", 2)[2])
         set_profile_fields(user.id, work_start_hour=hour)
         set_profile_conversation(user.id, "onboarding", "blockers", {"selected_blockers": []})
-        await query.edit_message_text(
+        await safe_edit_message_text(query,
             "Onboarding step 5/6.\nPick your common blockers. Tap to toggle, then press done.",
             reply_markup=blocker_buttons([]),
         )
@@ -2091,14 +2633,14 @@ async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
         set_profile_fields(user.id, blockers=selected)
         set_profile_conversation(user.id, "onboarding", "restart_size", {})
-        await query.edit_message_text("Onboarding step 6/6.\nWhat's your preferred restart size?", reply_markup=restart_size_buttons())
+        await safe_edit_message_text(query, "Onboarding step 6/6.\nWhat's your preferred restart size?", reply_markup=restart_size_buttons())
         return
 
     if data.startswith("ob:restart:"):
         minutes = int(data.split(":", 2)[2])
         set_profile_fields(user.id, restart_size_min=minutes, onboarding_complete=True)
         clear_profile_conversation(user.id)
-        await query.edit_message_text(
+        await safe_edit_message_text(query,
             "Setup complete.\n\n"
             + profile_summary(user.id)
             + "\n\nNext move: set today's intention so the bot can guide you with less friction.",
@@ -2109,7 +2651,7 @@ async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if data == "intent:begin":
         current = resolve_current_goal(user.id)
         if not current:
-            await query.edit_message_text("Set at least one goal first in /settings.")
+            await safe_edit_message_text(query, "Set at least one goal first in /settings.")
             return
         goals_for_user = list_user_goals(user.id)
         if len(goals_for_user) == 1:
@@ -2126,7 +2668,7 @@ async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         goal_ref = data.split(":", 2)[2]
         goal_doc = get_goal_by_ref(user.id, goal_ref)
         if not goal_doc:
-            await query.edit_message_text("I couldn't match that goal. Open the intention flow again and pick one more time.")
+            await safe_edit_message_text(query, "I couldn't match that goal. Open the intention flow again and pick one more time.")
             return
         goal = goal_doc["goal"]
         upsert_today_intention(user.id, selected_goal=goal, status="planned")
@@ -2138,7 +2680,7 @@ async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         status = data.split(":", 2)[2]
         intention = get_today_intention(user.id)
         if not intention:
-            await query.edit_message_text("No daily intention found yet. Start with Today's intention first.")
+            await safe_edit_message_text(query, "No daily intention found yet. Start with Today's intention first.")
             return
         if intention.get("status") == status:
             await query.answer(f"Already marked {status}.")
@@ -2161,7 +2703,7 @@ async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if data == "intent:refresh":
         intention = get_today_intention(user.id)
         if not intention:
-            await query.edit_message_text("No daily intention found yet. Start with Today's intention first.")
+            await safe_edit_message_text(query, "No daily intention found yet. Start with Today's intention first.")
             return
         summary = intention_summary(user.id)
         intention = get_today_intention(user.id) or intention
@@ -2175,7 +2717,7 @@ async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if data == "focus:begin":
         goal = effective_intention_goal(user.id)
         if not goal:
-            await query.edit_message_text("Set a goal first, then come back to focus.")
+            await safe_edit_message_text(query, "Set a goal first, then come back to focus.")
             return
         await safe_edit_message_text(query, f"Pick a focus duration for {goal}.", reply_markup=focus_duration_buttons())
         return
@@ -2195,11 +2737,12 @@ async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         nudges_enabled = nudges_value == "on"
         goal = effective_intention_goal(user.id)
         if not goal:
-            await query.edit_message_text("Set a goal first, then start a focus session.")
+            await safe_edit_message_text(query, "Set a goal first, then start a focus session.")
             return
         sid = start_session(user.id, minutes, goal, nudges_enabled=nudges_enabled, source="button")
         next_check = now() + timedelta(minutes=5)
         sessions.update_one({"_id": sid}, {"$set": {"next_check_at": next_check if nudges_enabled else None}})
+        schedule_session_timer(sid)
         session_doc = sessions.find_one({"_id": sid}) or {"goal": goal, "timebox_min": minutes, "ends_at": now() + timedelta(minutes=minutes), "nudges_enabled": nudges_enabled}
         record_intervention_outcome(
             user.id,
@@ -2211,7 +2754,7 @@ async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             progress_occurred=False,
             issue_repeated=False,
         )
-        await query.edit_message_text(
+        await safe_edit_message_text(query,
             focus_started_text(user.id, session_doc),
             reply_markup=focus_completion_buttons(),
         )
@@ -2280,13 +2823,13 @@ async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             log_event(user.id, "focus_completion", {"status": "done"})
             record_intervention_outcome(user.id, trigger_type="focus_completion", mode="focus", responded=True, session_started=True, progress_occurred=True, issue_repeated=False)
             record_outcome(user.id, {"outcome_type": "progress_marked", "message_type": "focus_completion", "phase": "focus", "progress_occurred": True})
-            await query.edit_message_text("Session logged as done. Keep the momentum.")
+            await safe_edit_message_text(query, "Session logged as done. Keep the momentum.")
         elif outcome == "partial":
             upsert_today_intention(user.id, status="partial")
             log_event(user.id, "focus_completion", {"status": "partial"})
             record_intervention_outcome(user.id, trigger_type="focus_completion", mode="momentum", responded=True, session_started=True, progress_occurred=True, issue_repeated=False)
             record_outcome(user.id, {"outcome_type": "progress_marked", "message_type": "focus_completion", "phase": "focus", "progress_occurred": True})
-            await query.edit_message_text("Partial counts. Keep the useful pieces and reset clean.")
+            await safe_edit_message_text(query, "Partial counts. Keep the useful pieces and reset clean.")
         else:
             upsert_today_intention(user.id, status="blocked")
             log_event(user.id, "focus_completion", {"status": "blocked"})
@@ -2302,7 +2845,7 @@ async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if data == "loop:morning:continue":
         yesterday = get_intention_for_date(user.id, date_key_for_user(user.id, -1))
         if not yesterday or not yesterday.get("selected_goal"):
-            await query.edit_message_text("No clean yesterday target found. Pick a new one instead.", reply_markup=intention_goal_buttons(user.id))
+            await safe_edit_message_text(query, "No clean yesterday target found. Pick a new one instead.", reply_markup=intention_goal_buttons(user.id))
             set_profile_conversation(user.id, "intention", "goal_pick", {})
             return
         upsert_today_intention(
@@ -2314,7 +2857,7 @@ async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             morning_choice="continue_yesterday",
             morning_response_at=now(),
         )
-        await query.edit_message_text(
+        await safe_edit_message_text(query,
             intention_summary(user.id),
             reply_markup=intention_action_buttons("active"),
         )
@@ -2323,31 +2866,31 @@ async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if data == "loop:morning:new":
         upsert_today_intention(user.id, morning_choice="new_target", morning_response_at=now(), status="planned")
         set_profile_conversation(user.id, "intention", "goal_pick", {})
-        await query.edit_message_text("Pick the goal for today's target.", reply_markup=intention_goal_buttons(user.id))
+        await safe_edit_message_text(query, "Pick the goal for today's target.", reply_markup=intention_goal_buttons(user.id))
         return
 
     if data == "loop:morning:choose":
         current = resolve_current_goal(user.id)
         if not current:
-            await query.edit_message_text("Set a goal first in /settings.")
+            await safe_edit_message_text(query, "Set a goal first in /settings.")
             return
         upsert_today_intention(user.id, selected_goal=current["goal"], morning_choice="you_choose", morning_response_at=now(), status="planned")
         set_profile_conversation(user.id, "intention", "target_text", {"selected_goal": current["goal"]})
-        await query.edit_message_text(f"Today's best bet is {current['goal']}.\nWhat's the target?")
+        await safe_edit_message_text(query, f"Today's best bet is {current['goal']}.\nWhat's the target?")
         return
 
     if data == "loop:midday:started":
         upsert_today_intention(user.id, status="active", midday_status="started", midday_response_at=now())
         log_event(user.id, "loop_status", {"phase": "midday", "status": "started"})
         record_intervention_outcome(user.id, trigger_type="midday_check", mode="momentum", responded=True, session_started=False, progress_occurred=True, issue_repeated=False)
-        await query.edit_message_text("Good. Protect the next block and keep moving.", reply_markup=focus_duration_buttons())
+        await safe_edit_message_text(query, "Good. Protect the next block and keep moving.", reply_markup=focus_duration_buttons())
         return
 
     if data == "loop:midday:almost":
         upsert_today_intention(user.id, status="active", midday_status="almost", midday_response_at=now())
         log_event(user.id, "loop_status", {"phase": "midday", "status": "almost"})
         record_intervention_outcome(user.id, trigger_type="midday_check", mode="focus", responded=True, session_started=False, progress_occurred=False, issue_repeated=False)
-        await query.edit_message_text(
+        await safe_edit_message_text(query,
             render_intervention_text(user.id, "inactivity_after_target"),
             reply_markup=focus_duration_buttons(),
         )
@@ -2359,7 +2902,7 @@ async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         record_outcome(user.id, {"outcome_type": "repeated_avoidance", "message_type": "midday_prompt", "phase": "midday", "issue_repeated": True})
         increment_memory_counter(user.id, "time_of_day_slumps", str(local_now_for_user(user.id).hour), 1, 0.7)
         record_intervention_outcome(user.id, trigger_type="midday_check", mode="recovery", responded=True, session_started=False, progress_occurred=False, issue_repeated=True)
-        await query.edit_message_text(
+        await safe_edit_message_text(query,
             "Name the blocker so I can give you the right restart.",
             reply_markup=blocker_choice_buttons("recover"),
         )
@@ -2386,7 +2929,7 @@ async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if status == "done":
             bump_streak(user.id, 1)
             record_intervention_outcome(user.id, trigger_type="eod_check", mode="momentum", responded=True, session_started=False, progress_occurred=True, issue_repeated=False)
-            await query.edit_message_text("Logged done. Bank the win and protect tomorrow.")
+            await safe_edit_message_text(query, "Logged done. Bank the win and protect tomorrow.")
         elif status == "missed":
             bump_missed(user.id, 1)
             record_outcome(user.id, {"outcome_type": "missed_day", "message_type": "eod_prompt", "phase": "eod", "issue_repeated": True})
@@ -2399,10 +2942,10 @@ async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
         elif status == "reset":
             record_intervention_outcome(user.id, trigger_type="eod_check", mode="starter", responded=True, session_started=False, progress_occurred=False, issue_repeated=False)
-            await query.edit_message_text("Reset accepted. Tomorrow starts with a clean board.")
+            await safe_edit_message_text(query, "Reset accepted. Tomorrow starts with a clean board.")
         else:
             record_intervention_outcome(user.id, trigger_type="eod_check", mode="momentum", responded=True, session_started=False, progress_occurred=True, issue_repeated=False)
-            await query.edit_message_text("Partial logged. Keep the useful residue and come back tomorrow.")
+            await safe_edit_message_text(query, "Partial logged. Keep the useful residue and come back tomorrow.")
         return
 
     # Mood selected
@@ -2415,7 +2958,7 @@ async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         step = tiny_steps(mood, g["goal"])
         why = get_why(user.id, g["goal"])
         msg = style_text(tone, f"{step}\n\nYour why: “{why or '—'}”.")
-        await query.edit_message_text(msg, reply_markup=action_buttons(g["goal"]))
+        await safe_edit_message_text(query, msg, reply_markup=action_buttons(g["goal"]))
         log_event(user.id, "mood", {"mood": mood})
         return
 
@@ -2427,7 +2970,7 @@ async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         udoc = users.find_one({"user_id": user.id}) or {}
         line = praise_line(udoc.get("streak", 0))
         log_event(user.id, "done", {"goal": goal})
-        await query.edit_message_text(f"✅ Logged: {goal}. Goal marked done, so it will drop out of your active list. {line}")
+        await safe_edit_message_text(query, f"✅ Logged: {goal}. Goal marked done, so it will drop out of your active list. {line}")
         return
 
     # Skip → friction + ask reason
@@ -2436,7 +2979,7 @@ async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         set_cooldown(user.id, minutes=10)
         bump_missed(user.id, 1)
         log_event(user.id, "skip", {"goal": goal})
-        await query.edit_message_text(
+        await safe_edit_message_text(query,
             "Skip noted. Entertainment cooldown: 10 min.\nWhat’s the reason?"
         )
         context.user_data["awaiting_reason_for"] = goal
@@ -2446,7 +2989,7 @@ async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if data.startswith("override:"):
         goal = data.split(":")[1]
         await run_override(user.id, goal, context)
-        await query.edit_message_text("Override initiated. Check your chat.")
+        await safe_edit_message_text(query, "Override initiated. Check your chat.")
         return
     
     # Set active goal from inline button
@@ -2455,9 +2998,9 @@ async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         goal_doc = get_goal_by_ref(user.id, goal_ref)
         if goal_doc and set_active_goal(user.id, goal_ref):
             upsert_today_intention(user.id, selected_goal=goal_doc["goal"])
-            await query.edit_message_text(f"Active goal set to: {goal_doc['goal']}")
+            await safe_edit_message_text(query, f"Active goal set to: {goal_doc['goal']}")
         else:
-            await query.edit_message_text("Could not set active goal.")
+            await safe_edit_message_text(query, "Could not set active goal.")
         return
     
         # === PHASE 1: session callback handlers ===
@@ -2465,40 +3008,45 @@ async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         s = sessions.find_one({"user_id": user.id, "state": "ACTIVE"}, sort=[("started_at", DESCENDING)])
         if s:
             sessions.update_one({"_id": s["_id"]}, {"$set": {"started_confirmed": True, "next_check_at": now() + timedelta(minutes=15)}})
-        await query.edit_message_text("Locked in. Next check at +15. Keep swinging. 🔥")
+            schedule_session_timer(s["_id"])
+        await safe_edit_message_text(query, "Locked in. Next check at +15. Keep swinging. 🔥")
         return
 
     if data == "sess:start_no":
         s = sessions.find_one({"user_id": user.id, "state": "ACTIVE"}, sort=[("started_at", DESCENDING)])
         if s:
             sessions.update_one({"_id": s["_id"]}, {"$set": {"next_check_at": now() + timedelta(minutes=5)}})
-        await query.edit_message_text("No shame—start the tiniest step. Timer in 5. ⏱️")
+            schedule_session_timer(s["_id"])
+        await safe_edit_message_text(query, "No shame—start the tiniest step. Timer in 5. ⏱️")
         return
 
     if data == "sess:still_yes":
         s = sessions.find_one({"user_id": user.id, "state": "ACTIVE"}, sort=[("started_at", DESCENDING)])
         if s:
             sessions.update_one({"_id": s["_id"]}, {"$set": {"next_check_at": now() + timedelta(minutes=15)}})
-        await query.edit_message_text("Nice—momentum > motivation. I’ll ping later. ⚡")
+            schedule_session_timer(s["_id"])
+        await safe_edit_message_text(query, "Nice—momentum > motivation. I’ll ping later. ⚡")
         return
 
     if data == "sess:still_no":
         s = sessions.find_one({"user_id": user.id, "state": "ACTIVE"}, sort=[("started_at", DESCENDING)])
         if s:
             sessions.update_one({"_id": s["_id"]}, {"$set": {"next_check_at": now() + timedelta(minutes=5)}})
-        await query.edit_message_text("Reset the board: one micro-task, 5-min timer. You’ve got this. 🔁")
+            schedule_session_timer(s["_id"])
+        await safe_edit_message_text(query, "Reset the board: one micro-task, 5-min timer. You’ve got this. 🔁")
         return
 
     if data == "sess:complete_yes":
         ok = finish_latest_session(user.id, state="DONE")
-        await query.edit_message_text("🏁 Session marked done. Save the win and breathe. 🙌")
+        await safe_edit_message_text(query, "🏁 Session marked done. Save the win and breathe. 🙌")
         return
 
     if data == "sess:complete_no":
         s = sessions.find_one({"user_id": user.id, "state": "ACTIVE"}, sort=[("started_at", DESCENDING)])
         if s:
             sessions.update_one({"_id": s["_id"]}, {"$set": {"asked_completion": True, "next_check_at": now() + timedelta(minutes=5)}})
-        await query.edit_message_text("All good. 5 more minutes. Then we reassess. ⏳")
+            schedule_session_timer(s["_id"])
+        await safe_edit_message_text(query, "All good. 5 more minutes. Then we reassess. ⏳")
         return
 
 
@@ -2584,6 +3132,9 @@ async def text_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"Current focus goal: '{goal}'.\n"
         "Reply as a concise, no-nonsense accountability coach. Offer a smallest next step."
     )
+    if STREAM_COACH_REPLIES:
+        await stream_ai_reply(update.message, prompt)
+        return
     reply = ai_reply(prompt)
     await update.message.reply_text(reply)
 
@@ -2606,7 +3157,8 @@ async def run_override(user_id: int, goal: str, context: ContextTypes.DEFAULT_TY
     )
 
 def loop_hours_for_user(user_id: int) -> Dict[str, int]:
-    return daily_loop_hours_for_user(user_id)
+    plan = daily_plan_for_user(user_id)
+    return {key: plan[key] for key in ("morning", "midday", "eod", "minute")}
 
 async def send_proactive_message(
     app: Application,
@@ -2620,7 +3172,27 @@ async def send_proactive_message(
     parse_mode=None,
     intervention: Dict[str, Any] | None = None,
     related_session_id: str | None = None,
+    idempotency_extra: str | None = None,
 ):
+    """Queue (and inline-send) one proactive message.
+
+    Returns True when queued, False when held back, and ``"duplicate"`` when an earlier pass already queued
+    this key. A duplicate is truthy: the message is out (or the worker owns it), so callers record it as sent.
+    """
+    local_now = local_now_for_user(user_id)
+    idempotency_key = outbox_key(
+        user_id,
+        local_now.date().isoformat(),
+        phase=phase,
+        trigger=trigger or message_type,
+        related_session_id=related_session_id,
+        extra=idempotency_extra,
+    )
+    if outbox.find_one({"idempotency_key": idempotency_key}, {"_id": 1}):
+        # Written by an earlier, interrupted pass: the outbox worker owns delivery, the caller just records it.
+        OUTBOX_METRICS["duplicates"] += 1
+        log_structured("outbox_duplicate_skipped", user_id=user_id, idempotency_key=idempotency_key)
+        return "duplicate"
     decision = should_send_message(
         user_id,
         message_type,
@@ -2653,10 +3225,11 @@ async def send_proactive_message(
             },
         )
         log_structured("message_suppressed", user_id=user_id, message_type=message_type, phase=phase, trigger=trigger, decision=decision["decision"], reason=decision["reason"])
+        count_cron_run("deferred" if decision["decision"] == "defer" else "suppressed")
         return False
-    await deliver_message(
-        app.bot,
+    item, created = enqueue_outbox(
         user_id,
+        idempotency_key,
         text=text,
         message_type=message_type,
         phase=phase,
@@ -2664,9 +3237,15 @@ async def send_proactive_message(
         reply_markup=reply_markup,
         parse_mode=parse_mode,
         related_session_id=related_session_id,
+        hold_sec=inline_merge_window(message_type) if OUTBOX_INLINE_DELIVERY else 0.0,
     )
-    local_date = local_now_for_user(user_id).date().isoformat()
-    local_hour = local_now_for_user(user_id).hour
+    if not created:
+        return "duplicate"
+    count_cron_run("queued")
+    if OUTBOX_INLINE_DELIVERY:
+        await send_outbox_item_inline(app.bot, item)
+    local_date = local_now.date().isoformat()
+    local_hour = local_now.hour
     pending = {
         "message_type": message_type,
         "phase": phase,
@@ -2715,7 +3294,7 @@ async def send_proactive_message(
 
 async def send_intervention_message(app: Application, user_id: int, trigger: str, *, blocker: str | None = None, session_doc: Dict[str, Any] | None = None, reply_markup=None):
     intervention = choose_intervention(user_id, trigger, blocker=blocker, session_doc=session_doc)
-    text = phrase_intervention(user_id, intervention)
+    text = await phrase_intervention_async(user_id, intervention)
     sent = await send_proactive_message(
         app,
         user_id,
@@ -2747,23 +3326,29 @@ async def send_intervention_message(app: Application, user_id: int, trigger: str
     return True
 
 async def run_daily_loop_for_user(app: Application, uid: int):
-    ensure_profile(uid, (users.find_one({"user_id": uid}) or {}).get("name", "human"))
-    local_now = current_utc_now().astimezone(ZoneInfo(get_user_timezone(uid)))
+    try:
+        await _run_daily_loop_pass(app, uid)
+    finally:
+        refresh_next_due_at(uid)
+
+async def _run_daily_loop_pass(app: Application, uid: int):
+    plan = daily_plan_for_user(uid)
+    local_now = current_utc_now().astimezone(ZoneInfo(plan["timezone"]))
     hour = local_now.hour
-    hours = loop_hours_for_user(uid)
-    intention = get_today_intention(uid) or {}
-    yesterday = get_intention_for_date(uid, date_key_for_user(uid, -1)) or {}
+    slot = (hour, local_now.minute)
+    intention = get_intention_for_date(uid, plan["date"]) or {}
+    yesterday = get_intention_for_date(uid, (local_now - timedelta(days=1)).date().isoformat()) or {}
     state_doc = get_state(uid)
-    current_goal = resolve_current_goal(uid)
+    current_goal = plan["current_goal"]
     last_touch = ensure_aware(state_doc.get("last_user_touch_at"))
 
-    if yesterday.get("status") == "missed" and hour >= hours["morning"] and not intention.get("missed_day_recovery_sent_at"):
+    if yesterday.get("status") == "missed" and slot >= (plan["morning"], plan["minute"]) and not intention.get("missed_day_recovery_sent_at"):
         sent = await send_intervention_message(app, uid, "missed_day", reply_markup=intervention_reply_markup(uid, "missed_day"))
         if sent:
             upsert_today_intention(uid, missed_day_recovery_sent_at=now(), morning_prompt_sent_at=intention.get("morning_prompt_sent_at") or now())
         return
 
-    if hour >= hours["morning"] and not intention.get("morning_prompt_sent_at"):
+    if slot >= (plan["morning"], plan["minute"]) and not intention.get("morning_prompt_sent_at"):
         sent = await send_proactive_message(
             app,
             uid,
@@ -2788,7 +3373,7 @@ async def run_daily_loop_for_user(app: Application, uid: int):
                     upsert_today_intention(uid, morning_followup_sent_at=now())
                 return
 
-    if hour >= hours["midday"] and intention.get("target") and not intention.get("midday_prompt_sent_at"):
+    if slot >= (plan["midday"], plan["minute"]) and intention.get("target") and not intention.get("midday_prompt_sent_at"):
         sent = await send_proactive_message(
             app,
             uid,
@@ -2820,7 +3405,7 @@ async def run_daily_loop_for_user(app: Application, uid: int):
                     upsert_today_intention(uid, target_inactivity_sent_at=now())
                 return
 
-    if hour >= hours["eod"] and intention.get("target") and not intention.get("eod_prompt_sent_at"):
+    if slot >= (plan["eod"], plan["minute"]) and intention.get("target") and not intention.get("eod_prompt_sent_at"):
         sent = await send_proactive_message(
             app,
             uid,
@@ -2849,13 +3434,362 @@ async def run_daily_loop_for_user(app: Application, uid: int):
             if sent:
                 state.update_one({"user_id": uid}, {"$set": {"stale_goal_sent_at": now()}}, upsert=True)
 
-async def run_daily_loop_service(app: Application):
-    for u in users.find(live_user_query()):
-        uid = u["user_id"]
+# =========================
+# DAILY LOOP SCHEDULING
+# =========================
+# Profile fields that move the loop hours; changing one makes the user due on the next cron pass.
+DAILY_LOOP_TIMING_FIELDS = {"timezone", "work_start_hour", "loop_anchor_hour"}
+
+DAILY_PLAN_METRICS = {"hits": 0, "built": 0, "invalidated": 0}
+
+def build_daily_plan(uid: int) -> Dict[str, Any]:
+    """Resolve what the daily loop needs for the user's local day and cache it in daily_plans.
+
+    Profile timing, timezone and goal edits invalidate the plan (see mark_user_due). Learned timing
+    (timing_hour stats, which every outcome updates, slump reports and time_of_day_activity) is read once
+    when the plan is built and frozen for the local day; what it learns today moves tomorrow's hours.
+    """
+    ensure_profile(uid, (users.find_one({"user_id": uid}) or {}).get("name", "human"))
+    tz_name = get_user_timezone(uid)
+    hours = daily_loop_hours_for_user(uid)
+    goal = resolve_current_goal(uid)
+    plan = {
+        "user_id": uid,
+        "date": current_utc_now().astimezone(ZoneInfo(tz_name)).date().isoformat(),
+        "timezone": tz_name,
+        **hours,
+        "current_goal": {"goal": goal["goal"], "updated_at": goal.get("updated_at")} if goal else None,
+        "built_at": now(),
+        "cached_at": dt.datetime.now(dt.timezone.utc),
+    }
+    try:
+        daily_plans.replace_one({"user_id": uid, "date": plan["date"]}, plan, upsert=True)
+    except DuplicateKeyError:
+        pass  # a concurrent pass built the same plan
+    DAILY_PLAN_METRICS["built"] += 1
+    return plan
+
+def daily_plan_for_user(uid: int) -> Dict[str, Any]:
+    """Today's plan in one query; built on the first pass of the user's local day or after an invalidation."""
+    plan = daily_plans.find_one({"user_id": uid}, sort=[("date", DESCENDING)])
+    if plan and plan["date"] == current_utc_now().astimezone(ZoneInfo(plan["timezone"])).date().isoformat():
+        DAILY_PLAN_METRICS["hits"] += 1
+        return plan
+    return build_daily_plan(uid)
+
+def mark_user_due(user_id: int, *, replan: bool = True):
+    """Cheap invalidation: let the next cron_daily pass (or a timer shortly) run the loop and recompute next_due_at.
+
+    ``replan`` also drops the cached daily plan; pass False when only the day's intention changed.
+    """
+    if replan and daily_plans.delete_many({"user_id": user_id}).deleted_count:
+        DAILY_PLAN_METRICS["invalidated"] += 1
+    users.update_one({"user_id": user_id}, {"$set": {"next_due_at": now()}})
+    schedule_daily_loop_timer(user_id, now() + timedelta(seconds=TIMER_DEBOUNCE_SEC))
+
+def compute_next_due_at(uid: int) -> dt.datetime:
+    """Earliest time a branch of the daily loop can fire, mirroring its conditions.
+
+    A branch that is already eligible but did not fire (suppressed, session running) is rechecked
+    after CRON_DAILY_RECHECK_MIN; tomorrow's morning prompt always bounds the result.
+    """
+    plan = daily_plan_for_user(uid)
+    local_now = current_utc_now().astimezone(ZoneInfo(plan["timezone"]))
+    intention = get_intention_for_date(uid, plan["date"]) or {}
+    yesterday = get_intention_for_date(uid, (local_now - timedelta(days=1)).date().isoformat()) or {}
+    last_touch = ensure_aware(get_state(uid).get("last_user_touch_at"))
+
+    def at_hour(hour: int, days: int = 0) -> dt.datetime:
+        local = (local_now + timedelta(days=days)).replace(hour=hour, minute=plan["minute"], second=0, microsecond=0)
+        return local.astimezone(dt.timezone.utc)
+
+    candidates = [at_hour(plan["morning"], days=1)]
+    if yesterday.get("status") == "missed" and not intention.get("missed_day_recovery_sent_at"):
+        candidates.append(at_hour(plan["morning"]))
+    if not intention.get("morning_prompt_sent_at"):
+        candidates.append(at_hour(plan["morning"]))
+    morning_sent_at = ensure_aware(intention.get("morning_prompt_sent_at"))
+    if morning_sent_at and not intention.get("morning_response_at") and not intention.get("morning_followup_sent_at"):
+        if not last_touch or last_touch <= morning_sent_at:
+            candidates.append(morning_sent_at + timedelta(hours=2))
+    if intention.get("target"):
+        if not intention.get("midday_prompt_sent_at"):
+            candidates.append(at_hour(plan["midday"]))
+        if not intention.get("eod_prompt_sent_at"):
+            candidates.append(at_hour(plan["eod"]))
+        target_updated_at = ensure_aware(intention.get("updated_at"))
+        if (
+            target_updated_at
+            and intention.get("status") in {"planned", "active", "partial", "blocked"}
+            and not intention.get("target_inactivity_sent_at")
+            and (not last_touch or last_touch <= target_updated_at)
+        ):
+            candidates.append(target_updated_at + timedelta(minutes=90))
+    if not intention.get("avoidance_recovery_sent_at") and recent_avoidance_count(uid) >= 2:
+        candidates.append(current_utc_now())
+    current_goal = plan["current_goal"]
+    goal_updated_at = ensure_aware((current_goal or {}).get("updated_at"))
+    if current_goal and goal_updated_at and not intention and not get_state(uid).get("stale_goal_sent_at"):
+        candidates.append(goal_updated_at + timedelta(days=7))
+
+    next_due = min(candidates)
+    if next_due <= current_utc_now():
+        next_due = current_utc_now() + timedelta(minutes=CRON_DAILY_RECHECK_MIN)
+    return next_due
+
+def refresh_next_due_at(uid: int) -> dt.datetime | None:
+    try:
+        next_due = compute_next_due_at(uid)
+    except Exception:
+        logger.exception("next_due_at computation failed for user_id=%s", uid)
+        return None
+    users.update_one({"user_id": uid}, {"$set": {"next_due_at": next_due}})
+    schedule_daily_loop_timer(uid, next_due)
+    return next_due
+
+def due_user_query(shard: tuple[int, int] | None = None) -> Dict[str, Any]:
+    query = live_user_query()
+    if CRON_DAILY_DUE_ONLY:
+        query["$or"] = [{"next_due_at": {"$lte": current_utc_now()}}, {"next_due_at": None}]
+    query.update(shard_filter(shard))
+    return query
+
+# =========================
+# TIMER SERVICE
+# =========================
+# Jobs live in Mongo (timer_jobs), so pending timers survive a restart; one job per session and per user.
+# Every instance can arm timers, but only the holder of the timer lease runs its scheduler; the others stay paused.
+TIMER_LEASE_ID = "timer_service"
+TIMER_LEASE_CHECK_SEC = min(10.0, CRON_LEASE_TTL_SEC / 3)
+_TIMER_OWNER: Dict[str, Any] = {"task": None, "owner": False}
+timer_scheduler = AsyncIOScheduler(
+    jobstores={"default": MongoDBJobStore(database=db.name, collection="timer_jobs", client=mongo)},
+    job_defaults={"coalesce": True, "misfire_grace_time": None, "max_instances": 1},
+    timezone=dt.timezone.utc,
+)
+TIMER_METRICS: Dict[str, Any] = {"scheduled": 0, "fired": 0, "errors": 0, "lag_ms": deque(maxlen=LLM_METRICS_WINDOW)}
+
+def _timers_running() -> bool:
+    return TIMER_SERVICE_ENABLED and timer_scheduler.running
+
+def timer_wall_clock(run_at: dt.datetime) -> dt.datetime:
+    """Map an app-clock time (now(), which the dev clock can shift) onto the wall clock the scheduler runs on."""
+    real_now = dt.datetime.now(dt.timezone.utc)
+    return max(real_now, real_now + (ensure_aware(run_at) - current_utc_now()))
+
+def _schedule_timer(job_id: str, func, run_at: dt.datetime, *args):
+    run_at = timer_wall_clock(run_at)
+    try:
+        timer_scheduler.add_job(
+            func,
+            trigger="date",
+            run_date=run_at,
+            args=[*args, run_at.isoformat()],
+            id=job_id,
+            replace_existing=True,
+        )
+        TIMER_METRICS["scheduled"] += 1
+    except Exception:
+        logger.exception("Could not schedule timer %s", job_id)
+
+def _cancel_timer(job_id: str):
+    try:
+        timer_scheduler.remove_job(job_id)
+    except Exception:
+        pass
+
+def _record_timer_fire(due_iso: str):
+    TIMER_METRICS["fired"] += 1
+    lag = dt.datetime.now(dt.timezone.utc) - parse_iso_dt(due_iso)
+    TIMER_METRICS["lag_ms"].append(max(lag.total_seconds(), 0.0) * 1000.0)
+
+def schedule_session_timer(session_id):
+    """(Re)arm the timer for a session's next nudge or its end, whichever is first."""
+    if not _timers_running():
+        return
+    doc = sessions.find_one({"_id": session_id}, {"state": 1, "next_check_at": 1, "ends_at": 1, "asked_completion": 1, "nudges_enabled": 1})
+    job_id = f"session:{session_id}"
+    if not doc or doc.get("state") != "ACTIVE":
+        _cancel_timer(job_id)
+        return
+    times = []
+    if not doc.get("asked_completion") and doc.get("ends_at"):
+        times.append(ensure_aware(doc["ends_at"]))
+    if doc.get("nudges_enabled", True) and doc.get("next_check_at"):
+        times.append(ensure_aware(doc["next_check_at"]))
+    if not times:
+        _cancel_timer(job_id)
+        return
+    _schedule_timer(job_id, fire_session_timer, min(times), str(session_id))
+
+async def fire_session_timer(session_id: str, due_iso: str):
+    _record_timer_fire(due_iso)
+    doc = sessions.find_one({"_id": ObjectId(session_id)}, {"user_id": 1})
+    if not doc:
+        return
+    try:
+        async with user_serial(doc["user_id"]):
+            # Re-read under the lock: a callback that just ran may have moved or ended the session.
+            doc = sessions.find_one({"_id": ObjectId(session_id), "state": "ACTIVE"})
+            if doc:
+                await run_session_tick_for_doc(tg_app, doc)
+    except Exception:
+        TIMER_METRICS["errors"] += 1
+        logger.exception("Session timer failed for session_id=%s", session_id)
+
+def schedule_daily_loop_timer(uid: int, run_at: dt.datetime):
+    if _timers_running():
+        _schedule_timer(f"daily:{uid}", fire_daily_loop_timer, ensure_aware(run_at), uid)
+
+async def fire_daily_loop_timer(uid: int, due_iso: str):
+    _record_timer_fire(due_iso)
+    if not users.find_one({"user_id": uid, **live_user_query()}, {"_id": 1}):
+        return
+    try:
+        async with user_serial(uid):
+            await run_daily_loop_for_user(tg_app, uid)
+    except Exception:
+        TIMER_METRICS["errors"] += 1
+        logger.exception("Daily loop timer failed for user_id=%s", uid)
+
+def hold_lease(lease_id: str, owner: str, held: bool) -> bool:
+    """Renew a standing lease when ``held``, otherwise take it only if nobody holds it."""
+    if held:
+        return renew_cron_lease(lease_id, owner)
+    holder = cron_leases.find_one({"_id": lease_id}, {"owner": 1, "expires_at": 1}) or {}
+    if holder.get("owner") not in (None, owner) and ensure_aware(holder["expires_at"]) > dt.datetime.now(dt.timezone.utc):
+        return False
+    return acquire_cron_lease(lease_id, owner)
+
+def hold_timer_lease(owner: str, held: bool) -> bool:
+    return hold_lease(TIMER_LEASE_ID, owner, held)
+
+async def _timer_lease_loop():
+    while True:
         try:
-            await run_daily_loop_for_user(app, uid)
-        except Exception:
-            logger.exception("Daily loop service failed for user_id=%s", uid)
+            held = hold_timer_lease(INSTANCE_ID, _TIMER_OWNER["owner"])
+        except PyMongoError:
+            logger.exception("Could not check the timer lease")
+            held = False
+        if held and not _TIMER_OWNER["owner"]:
+            timer_scheduler.resume()
+            logger.info("Timer service owns the timers with %s stored jobs", len(timer_scheduler.get_jobs()))
+        elif not held and _TIMER_OWNER["owner"]:
+            timer_scheduler.pause()
+            logger.info("Timer service lost the timer lease; standing by")
+        elif held:
+            # Timers armed by standby instances go straight to the store without waking this scheduler.
+            timer_scheduler.wakeup()
+        _TIMER_OWNER["owner"] = held
+        await asyncio.sleep(TIMER_LEASE_CHECK_SEC)
+
+def start_timer_service():
+    if TIMER_SERVICE_ENABLED and not timer_scheduler.running:
+        timer_scheduler.start(paused=True)
+        _TIMER_OWNER["task"] = asyncio.create_task(_timer_lease_loop())
+
+def stop_timer_service():
+    task = _TIMER_OWNER["task"]
+    if task is not None:
+        task.cancel()
+        _TIMER_OWNER["task"] = None
+    if _TIMER_OWNER["owner"]:
+        _TIMER_OWNER["owner"] = False
+        release_cron_lease(TIMER_LEASE_ID, INSTANCE_ID)
+    if timer_scheduler.running:
+        timer_scheduler.shutdown(wait=False)
+
+def timer_metrics_payload() -> Dict[str, Any]:
+    lags = list(TIMER_METRICS["lag_ms"])
+    return {
+        "running": _timers_running(),
+        "owner": _TIMER_OWNER["owner"],
+        "pending_jobs": len(timer_scheduler.get_jobs()) if timer_scheduler.running else None,
+        "counters": {key: value for key, value in TIMER_METRICS.items() if not isinstance(value, deque)},
+        "lag_ms": {"p50": percentile(lags, 50), "p95": percentile(lags, 95), "p99": percentile(lags, 99)},
+    }
+
+def _after_user_id(query: Dict[str, Any], last_user_id: int | None) -> Dict[str, Any]:
+    if last_user_id is None:
+        return query
+    return {**query, "user_id": {**query.get("user_id", {}), "$gt": last_user_id}}
+
+async def run_daily_loop_service(app: Application, shard: tuple[int, int] | None = None, *, budget_sec: float | None = None) -> Dict[str, Any]:
+    """Walk due users in user_id order, CRON_CHUNK_SIZE at a time, until done or the time budget is spent.
+
+    The last finished user_id is checkpointed in system_state, so the next run resumes where this one
+    stopped and users late in the order are not starved. Reaching the end resets the cursor.
+    ``remaining`` is estimated from the users the last full pass walked, so a stopped run never counts the collection.
+    """
+    cursor_id = f"cron_cursor:{shard_job_name('daily', shard)}"
+    cursor = system_state.find_one({"_id": cursor_id}) or {}
+    last_user_id = cursor.get("last_user_id")
+    resumed_from = last_user_id
+    deadline = time.monotonic() + (budget_sec or CRON_TIME_BUDGET_SEC)
+    started = time.perf_counter()
+    durations: list[float] = []
+    processed = errors = scanned = 0
+    pass_complete = False
+    while time.monotonic() < deadline:
+        query = _after_user_id(due_user_query(shard), last_user_id)
+        uids = [u["user_id"] for u in users.find(query, {"user_id": 1}).sort("user_id", ASCENDING).limit(CRON_CHUNK_SIZE)]
+        scanned += len(uids)
+        if uids:
+            chunk = await fan_out(
+                "daily_loop",
+                uids,
+                lambda uid: run_daily_loop_for_user(app, uid),
+                describe=lambda uid: f"user_id={uid}",
+                durations=durations,
+            )
+            processed += chunk["items"]
+            errors += chunk["errors"]
+            if cron_lease_lost():
+                # The new holder owns the cursor now; leave it alone.
+                raise RuntimeError(f"lost the daily lease after {processed} users")
+            last_user_id = uids[-1]
+            system_state.update_one({"_id": cursor_id}, {"$set": {"last_user_id": last_user_id, "updated_at": dt.datetime.now(dt.timezone.utc)}}, upsert=True)
+        if len(uids) < CRON_CHUNK_SIZE:
+            pass_complete = True
+            break
+    runs_this_pass = int(cursor.get("runs_this_pass", 0)) + 1
+    scanned_this_pass = int(cursor.get("scanned_this_pass", 0)) + scanned
+    if pass_complete:
+        system_state.update_one(
+            {"_id": cursor_id},
+            {
+                "$set": {
+                    "last_user_id": None,
+                    "runs_this_pass": 0,
+                    "scanned_this_pass": 0,
+                    "last_pass_runs": runs_this_pass,
+                    "last_pass_scanned": scanned_this_pass,
+                    "last_pass_completed_at": dt.datetime.now(dt.timezone.utc),
+                },
+                "$inc": {"passes_completed": 1},
+            },
+            upsert=True,
+        )
+        remaining = 0
+    else:
+        system_state.update_one({"_id": cursor_id}, {"$set": {"runs_this_pass": runs_this_pass, "scanned_this_pass": scanned_this_pass}}, upsert=True)
+        last_pass = cursor.get("last_pass_scanned")
+        remaining = max(0, int(last_pass) - scanned_this_pass) if last_pass is not None else None
+        log_structured("cron_budget_exhausted", job="daily", shard=shard_label(shard), processed=processed, remaining=remaining, last_user_id=last_user_id)
+    elapsed = time.perf_counter() - started
+    return {
+        "items": processed,
+        "scanned": scanned,
+        "errors": errors,
+        "duration_sec": round(elapsed, 3),
+        "items_per_sec": round(processed / elapsed, 2) if elapsed > 0 else None,
+        "item_ms_p95": percentile(durations, 95),
+        "item_ms_p99": percentile(durations, 99),
+        "resumed_from": resumed_from,
+        "pass_complete": pass_complete,
+        "runs_this_pass": runs_this_pass,
+        "remaining": remaining,
+    }
 
 # =========================
 # CRON TASKS (hit by Cloudflare Cron)
@@ -2863,34 +3797,570 @@ async def run_daily_loop_service(app: Application):
 
 def _hour_bucket(dt_utc): return dt_utc.strftime("%Y-%m-%dT%H")
 
-async def cron_daily(app: Application):
+# Background cron jobs. A job record lives in CRON_JOBS; CURRENT_CRON_JOB lets fan_out report progress.
+CRON_JOBS: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_CRON_RUNNING: Dict[str, str] = {}
+_CRON_TASKS: Dict[str, asyncio.Task] = {}
+CURRENT_CRON_JOB: contextvars.ContextVar = contextvars.ContextVar("current_cron_job", default=None)
+
+def _real_utc_iso() -> str:
+    return dt.datetime.now(dt.timezone.utc).isoformat()
+
+def count_cron_run(counter: str, amount: int = 1):
+    """Add to a per-run counter of the cron job this task belongs to, if any.
+
+    ``queued`` counts outbox items created, ``sent`` messages Telegram accepted during the run (inline outbox
+    sends and weekly summaries); with OUTBOX_INLINE_DELIVERY off, queued items are sent later by the worker.
+    ``llm_requests`` and ``llm_merged`` count shared intervention phrasings issued and joined while in flight.
+    """
+    job = CURRENT_CRON_JOB.get()
+    if job is not None:
+        job["counters"][counter] = job["counters"].get(counter, 0) + amount
+
+def cron_job_payload(job: Dict[str, Any]) -> Dict[str, Any]:
+    payload = {key: value for key, value in job.items() if not key.startswith("_")}
+    if job["status"] == "running":
+        payload["duration_sec"] = round(time.monotonic() - job["_started_mono"], 3)
+    return payload
+
+CRON_LEASE_METRICS = {"acquired": 0, "contended": 0, "renewed": 0, "lost": 0, "follow_ups_requested": 0, "follow_ups_run": 0}
+
+def acquire_cron_lease(lease_id: str, owner: str) -> bool:
+    """Take the lease when it is free or expired. The unique _id makes a racing upsert fail instead of sharing it."""
+    real_now = dt.datetime.now(dt.timezone.utc)
+    try:
+        cron_leases.find_one_and_update(
+            {"_id": lease_id, "$or": [{"expires_at": {"$lt": real_now}}, {"owner": owner}]},
+            {
+                "$set": {"owner": owner, "acquired_at": real_now, "expires_at": real_now + timedelta(seconds=CRON_LEASE_TTL_SEC)},
+                "$setOnInsert": {"follow_up_requested": False},
+            },
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        holder = cron_leases.find_one({"_id": lease_id}) or {}
+        CRON_LEASE_METRICS["contended"] += 1
+        log_structured("cron_lease_contended", lease=lease_id, owner=owner, holder=holder.get("owner"), holder_expires_at=holder.get("expires_at"))
+        return False
+    CRON_LEASE_METRICS["acquired"] += 1
+    log_structured("cron_lease_acquired", lease=lease_id, owner=owner, ttl_sec=CRON_LEASE_TTL_SEC)
+    return True
+
+def renew_cron_lease(lease_id: str, owner: str) -> bool:
+    expires_at = dt.datetime.now(dt.timezone.utc) + timedelta(seconds=CRON_LEASE_TTL_SEC)
+    result = cron_leases.update_one({"_id": lease_id, "owner": owner}, {"$set": {"expires_at": expires_at}})
+    if result.matched_count:
+        CRON_LEASE_METRICS["renewed"] += 1
+        return True
+    CRON_LEASE_METRICS["lost"] += 1
+    log_structured("cron_lease_lost", lease=lease_id, owner=owner)
+    return False
+
+def release_cron_lease(lease_id: str, owner: str):
+    cron_leases.delete_one({"_id": lease_id, "owner": owner})
+    log_structured("cron_lease_released", lease=lease_id, owner=owner)
+
+def request_cron_follow_up(lease_id: str):
+    """Ask the current holder to run once more when it finishes; repeated requests collapse into one."""
+    result = cron_leases.update_one({"_id": lease_id}, {"$set": {"follow_up_requested": True}})
+    if result.modified_count:
+        CRON_LEASE_METRICS["follow_ups_requested"] += 1
+        log_structured("cron_follow_up_requested", lease=lease_id)
+
+def take_cron_follow_up(lease_id: str, owner: str) -> bool:
+    doc = cron_leases.find_one_and_update(
+        {"_id": lease_id, "owner": owner, "follow_up_requested": True},
+        {"$set": {"follow_up_requested": False}},
+    )
+    return doc is not None
+
+# Leases held by the current task, innermost last; _keep_cron_lease flags one as lost when renewal fails.
+CURRENT_CRON_LEASES: contextvars.ContextVar = contextvars.ContextVar("current_cron_leases", default=())
+
+def cron_lease_lost() -> bool:
+    """True once any lease this run holds was taken over; long loops check this and stop."""
+    return any(lease["lost"] for lease in CURRENT_CRON_LEASES.get())
+
+async def _keep_cron_lease(lease: Dict[str, Any], owner: str):
+    while True:
+        await asyncio.sleep(CRON_LEASE_TTL_SEC / 3)
+        try:
+            if not renew_cron_lease(lease["id"], owner):
+                lease["lost"] = True
+                return
+        except PyMongoError:
+            logger.exception("Could not renew cron lease %s", lease["id"])
+
+_SHARD_LEASE_SUFFIX = re.compile(r":shard\d+of(\d+)$")
+
+def conflicting_cron_leases(lease_id: str) -> list[str]:
+    """Live leases of the same job run under another sharding mode (unsharded vs ``of n`` vs ``of m``).
+
+    Their user slices overlap, so a run must not start next to them.
+    """
+    match = _SHARD_LEASE_SUFFIX.search(lease_id)
+    base = lease_id[:match.start()] if match else lease_id
+    mode = match.group(1) if match else None
+    conflicts = []
+    live = {"_id": {"$regex": f"^{re.escape(base)}(:shard\\d+of\\d+)?$"}, "expires_at": {"$gt": dt.datetime.now(dt.timezone.utc)}}
+    for doc in cron_leases.find(live, {"_id": 1}):
+        other = _SHARD_LEASE_SUFFIX.search(doc["_id"])
+        if (other.group(1) if other else None) != mode:
+            conflicts.append(doc["_id"])
+    return conflicts
+
+@contextlib.asynccontextmanager
+async def cron_lease(lease_id: str, owner: str):
+    """Yield True while holding ``lease_id`` (renewed in the background), or False when another run holds it.
+
+    A run is also refused while the same job runs under a different sharding mode.
+    """
+    if not acquire_cron_lease(lease_id, owner):
+        if CRON_FOLLOW_UP:
+            request_cron_follow_up(lease_id)
+        yield False
+        return
+    # Checked after acquiring, so two runs racing in different modes cannot both pass.
+    conflicts = conflicting_cron_leases(lease_id)
+    if conflicts:
+        release_cron_lease(lease_id, owner)
+        log_structured("cron_lease_mode_conflict", lease=lease_id, owner=owner, conflicts=conflicts)
+        yield False
+        return
+    lease = {"id": lease_id, "lost": False}
+    token = CURRENT_CRON_LEASES.set((*CURRENT_CRON_LEASES.get(), lease))
+    keeper = asyncio.create_task(_keep_cron_lease(lease, owner))
+    try:
+        yield True
+    finally:
+        CURRENT_CRON_LEASES.reset(token)
+        keeper.cancel()
+        await asyncio.gather(keeper, return_exceptions=True)
+        if not lease["lost"]:
+            release_cron_lease(lease_id, owner)
+
+async def _run_cron_job(job: Dict[str, Any], runner):
+    CURRENT_CRON_JOB.set(job)
+    try:
+        owner = f"{INSTANCE_ID}:{job['job_id']}"
+        async with cron_lease(job["job"], owner) as held:
+            if not held:
+                job["status"] = "skipped"
+                job["result"] = {"detail": f"{job['job']} is already running"}
+                return
+            job["result"] = await runner()
+            job["runs"] = 1
+            while CRON_FOLLOW_UP and not cron_lease_lost() and take_cron_follow_up(job["job"], owner):
+                CRON_LEASE_METRICS["follow_ups_run"] += 1
+                log_structured("cron_follow_up_start", job=job["job"], job_id=job["job_id"])
+                job["result"] = await runner()
+                job["runs"] += 1
+            if cron_lease_lost():
+                raise RuntimeError(f"lost the {job['job']} lease mid-run; another run took over")
+        job["status"] = "succeeded"
+    except Exception as exc:
+        job["status"] = "failed"
+        job["error"] = f"{type(exc).__name__}: {exc}"
+        logger.exception("Cron job %s (%s) failed", job["job"], job["job_id"])
+    finally:
+        job["finished_at"] = _real_utc_iso()
+        job["duration_sec"] = round(time.monotonic() - job["_started_mono"], 3)
+        _CRON_RUNNING.pop(job["job"], None)
+        _CRON_TASKS.pop(job["job_id"], None)
+        log_structured("cron_job_finish", job=job["job"], job_id=job["job_id"], status=job["status"], duration_sec=job["duration_sec"])
+        record_cron_run(job)
+
+def start_cron_job(name: str, runner, source: str = "manual") -> tuple[Dict[str, Any], bool]:
+    """Start ``runner()`` as a background job unless ``name`` is already running.
+
+    Returns ``(job, started)``; when a run is in progress its record is returned with ``started=False``.
+    """
+    running_id = _CRON_RUNNING.get(name)
+    if running_id and running_id in CRON_JOBS:
+        log_structured("cron_job_skipped", job=name, running_job_id=running_id)
+        if CRON_FOLLOW_UP:
+            request_cron_follow_up(name)
+        return CRON_JOBS[running_id], False
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "job": name,
+        "status": "running",
+        "started_at": _real_utc_iso(),
+        "finished_at": None,
+        "duration_sec": None,
+        "source": source,
+        "progress": {},
+        "counters": {},
+        "result": None,
+        "error": None,
+        "_started_mono": time.monotonic(),
+    }
+    CRON_JOBS[job["job_id"]] = job
+    _CRON_RUNNING[name] = job["job_id"]
+    while len(CRON_JOBS) > CRON_JOB_HISTORY:
+        oldest_id = next((jid for jid, old in CRON_JOBS.items() if old["status"] != "running"), None)
+        if oldest_id is None:
+            break
+        CRON_JOBS.pop(oldest_id)
+    _CRON_TASKS[job["job_id"]] = asyncio.create_task(_run_cron_job(job, runner))
+    log_structured("cron_job_start", job=name, job_id=job["job_id"])
+    return job, True
+
+async def stop_cron_jobs(timeout: float = 20.0):
+    tasks = list(_CRON_TASKS.values())
+    if not tasks:
+        return
+    _done, pending = await asyncio.wait(tasks, timeout=timeout)
+    for task in pending:
+        task.cancel()
+    if pending:
+        logger.warning("Cancelled %s cron jobs still running at shutdown", len(pending))
+        await asyncio.gather(*pending, return_exceptions=True)
+
+def cron_source(request: Request) -> str:
+    """Who triggered the run (``?source=render``, ``github-actions``...), for the cron_runs ledger."""
+    source = (request.query_params.get("source") or "manual").strip().lower()
+    return re.sub(r"[^a-z0-9_.-]", "", source)[:32] or "manual"
+
+def cron_run_totals(result: Dict[str, Any] | None) -> Dict[str, Any]:
+    """Ledger numbers from a cron result; a coordinator result is summed over the shards it ran."""
+    result = result or {}
+    parts = [item.get("result") or {} for item in result.get("shards", []) if item.get("status") == "succeeded"] if "shards" in result else [result]
+    def total(key):
+        values = [part[key] for part in parts if part.get(key) is not None]
+        return sum(values) if values else None
+    p95s = [part["user_ms_p95"] for part in parts if part.get("user_ms_p95") is not None]
+    remaining = [part["coverage"]["remaining"] for part in parts if (part.get("coverage") or {}).get("remaining") is not None]
+    return {
+        "users_scanned": total("users_scanned"),
+        "users_due": total("users"),
+        "errors": total("errors") or 0,
+        "user_ms_p95": max(p95s) if p95s else None,
+        "remaining": sum(remaining) if remaining else None,
+    }
+
+def record_cron_run(job: Dict[str, Any]):
+    """Append the finished job to cron_runs; a ledger failure is logged and never fails the job."""
+    doc = {
+        "job_id": job["job_id"],
+        "job": job["job"],
+        "source": job.get("source"),
+        "instance_id": INSTANCE_ID,
+        "status": job["status"],
+        "started_at": parse_iso_dt(job["started_at"]),
+        "duration_sec": job["duration_sec"],
+        "runs": job.get("runs", 0),
+        "queued": job["counters"].get("queued", 0),
+        "sent": job["counters"].get("sent", 0),
+        "suppressed": job["counters"].get("suppressed", 0),
+        "deferred": job["counters"].get("deferred", 0),
+        "llm_requests": job["counters"].get("llm_requests", 0),
+        "llm_merged": job["counters"].get("llm_merged", 0),
+        **cron_run_totals(job["result"] if job["status"] == "succeeded" else None),
+    }
+    if job["status"] == "failed":
+        doc["errors"] += 1
+        doc["error"] = job.get("error")
+    try:
+        cron_runs.insert_one(doc)
+    except PyMongoError:
+        logger.exception("Could not record cron run %s (%s)", job["job"], job["job_id"])
+
+CRON_RUN_TREND_FIELDS = ("duration_sec", "users_scanned", "users_due", "queued", "sent", "suppressed", "deferred", "llm_requests", "llm_merged", "errors", "user_ms_p95", "remaining")
+
+def cron_runs_payload(job: str | None = None, limit: int = 20) -> Dict[str, Any]:
+    """Recent runs per job, newest first, each with its change against the previous run of the same job."""
+    jobs = {}
+    for name in [job] if job else sorted(cron_runs.distinct("job")):
+        # Skipped runs carry no totals; drop them in the query so they do not eat into ``limit``.
+        job_runs = list(cron_runs.find({"job": name, "status": {"$ne": "skipped"}}, {"_id": 0}).sort("started_at", DESCENDING).limit(limit))
+        window = {"job": name, "status": "skipped"}
+        if job_runs:
+            window["started_at"] = {"$gte": job_runs[-1]["started_at"]}
+        for newer, older in zip(job_runs, job_runs[1:]):
+            newer["delta"] = {
+                key: round(newer[key] - older[key], 3)
+                for key in CRON_RUN_TREND_FIELDS
+                if isinstance(newer.get(key), (int, float)) and isinstance(older.get(key), (int, float))
+            }
+        durations = [run["duration_sec"] for run in job_runs if run.get("duration_sec") is not None]
+        jobs[name] = {
+            "runs": job_runs,
+            "skipped": cron_runs.count_documents(window),
+            "duration_sec_p50": percentile(durations, 50),
+            "duration_sec_max": max(durations) if durations else None,
+        }
+    # Plan cache counters live in process memory, unlike the ledger above.
+    return {"jobs": jobs, "daily_plans_this_instance": {"instance_id": INSTANCE_ID, **DAILY_PLAN_METRICS}}
+
+async def cron_job_response(request: Request, name: str, runner) -> JSONResponse:
+    """Shared body of the /cron/* endpoints: start in the background, or block with ``?wait=1``."""
+    job, started = start_cron_job(name, runner, cron_source(request))
+    if request.query_params.get("wait") in {"1", "true", "yes"}:
+        task = _CRON_TASKS.get(job["job_id"])
+        if task is not None:
+            await asyncio.shield(task)
+        return JSONResponse(jsonable_encoder(cron_job_payload(job)), status_code=500 if job["status"] == "failed" else 200)
+    payload = cron_job_payload(job)
+    payload["started"] = started
+    if not started:
+        payload["detail"] = f"{name} is already running"
+    return JSONResponse(jsonable_encoder(payload), status_code=202 if started else 200)
+
+def shard_filter(shard: tuple[int, int] | None) -> Dict[str, Any]:
+    """Mongo filter for slice ``i`` of ``n``; user_id mod n is stable for a user and spreads Telegram ids evenly."""
+    if not shard or shard[1] <= 1:
+        return {}
+    index, count = shard
+    return {"user_id": {"$mod": [count, index]}}
+
+def shard_label(shard: tuple[int, int] | None) -> str | None:
+    return f"{shard[0]}/{shard[1]}" if shard else None
+
+def shard_job_name(job: str, shard: tuple[int, int] | None) -> str:
+    return f"{job}:shard{shard[0]}of{shard[1]}" if shard and shard[1] > 1 else job
+
+def parse_shard_params(request: Request) -> tuple[int, int] | None:
+    shard, count = request.query_params.get("shard"), request.query_params.get("of")
+    if shard is None and count is None:
+        return None
+    try:
+        index, total = int(shard), int(count)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="shard and of must both be integers")
+    if total < 1 or not 0 <= index < total:
+        raise HTTPException(status_code=400, detail="shard must satisfy 0 <= shard < of")
+    return (index, total)
+
+async def coordinate_shards(job: str, count: int, run_shard) -> Dict[str, Any]:
+    """Walk shards 0..count-1 and run each one whose lease is free.
+
+    Coordinators on several instances share the work: a shard held elsewhere is skipped here.
+    """
+    current = CURRENT_CRON_JOB.get() or {}
+    owner = f"{INSTANCE_ID}:{current.get('job_id', 'inline')}"
+    shards = []
+    for index in range(count):
+        shard = (index, count)
+        async with cron_lease(shard_job_name(job, shard), owner) as held:
+            if not held:
+                shards.append({"shard": shard_label(shard), "status": "skipped"})
+                continue
+            started = time.perf_counter()
+            try:
+                result = await run_shard(shard)
+                shards.append({"shard": shard_label(shard), "status": "succeeded", "duration_sec": round(time.perf_counter() - started, 3), "result": result})
+            except Exception as exc:
+                logger.exception("%s shard %s failed", job, shard_label(shard))
+                shards.append({"shard": shard_label(shard), "status": "failed", "duration_sec": round(time.perf_counter() - started, 3), "error": str(exc)})
+    log_structured("cron_shards_finish", job=job, of=count, ran=sum(1 for item in shards if item["status"] != "skipped"), shards=[{k: v for k, v in item.items() if k != "result"} for item in shards])
+    return {"of": count, "ran": sum(1 for item in shards if item["status"] != "skipped"), "skipped": sum(1 for item in shards if item["status"] == "skipped"), "shards": shards}
+
+async def sharded_cron_response(request: Request, job: str, run_shard) -> JSONResponse:
+    """``?shard=i&of=n`` runs one slice; ``?coordinate=n`` claims free slices through per-shard leases."""
+    coordinate = request.query_params.get("coordinate")
+    if coordinate:
+        try:
+            count = int(coordinate)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="coordinate must be an integer shard count")
+        if count < 1:
+            raise HTTPException(status_code=400, detail="coordinate must be at least 1")
+        return await cron_job_response(request, f"{job}:coordinator:{INSTANCE_ID}", lambda: coordinate_shards(job, count, run_shard))
+    shard = parse_shard_params(request)
+    return await cron_job_response(request, shard_job_name(job, shard), lambda: run_shard(shard))
+
+async def fan_out(label: str, items, worker, *, concurrency: int | None = None, describe=str, durations: list | None = None) -> Dict[str, Any]:
+    """Await ``worker(item)`` for every item, at most ``concurrency`` at a time.
+
+    A failing item is logged and counted; it never stops the others. Returns run stats.
+    Once the cron lease is lost (see cron_lease_lost), items that have not started are skipped.
+    Pass ``durations`` to collect per-item milliseconds across several calls.
+    """
+    items = list(items)
+    limit = max(1, concurrency or CRON_CONCURRENCY)
+    semaphore = asyncio.Semaphore(limit)
+    durations = [] if durations is None else durations
+    first_duration = len(durations)
+    errors = skipped = 0
+
+    job = CURRENT_CRON_JOB.get()
+    if job is not None:
+        job["progress"] = {"stage": label, "total": len(items), "done": 0, "errors": 0}
+
+    async def run_one(item):
+        nonlocal errors, skipped
+        async with semaphore:
+            if cron_lease_lost():
+                skipped += 1
+                return
+            started = time.perf_counter()
+            try:
+                await worker(item)
+            except Exception:
+                errors += 1
+                if job is not None:
+                    job["progress"]["errors"] += 1
+                logger.exception("%s failed for %s", label, describe(item))
+            finally:
+                durations.append((time.perf_counter() - started) * 1000.0)
+                if job is not None:
+                    job["progress"]["done"] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run_one(item) for item in items))
+    elapsed = time.perf_counter() - started
+    stats = {
+        "label": label,
+        "items": len(items) - skipped,
+        "errors": errors,
+        "skipped": skipped,
+        "concurrency": limit,
+        "duration_sec": round(elapsed, 3),
+        "items_per_sec": round(len(items) / elapsed, 2) if elapsed > 0 else None,
+        "item_ms_p50": percentile(durations[first_duration:], 50),
+        "item_ms_p95": percentile(durations[first_duration:], 95),
+        "item_ms_p99": percentile(durations[first_duration:], 99),
+        "item_ms_max": round(max(durations[first_duration:]), 2) if durations[first_duration:] else None,
+    }
+    log_structured("fan_out_finish", **stats)
+    return stats
+
+async def cron_daily(app: Application, shard: tuple[int, int] | None = None):
     """Run the daily loop prompts and recovery checks."""
-    log_structured("cron_daily_start")
-    await run_daily_loop_service(app)
-    log_structured("cron_daily_finish")
+    log_structured("cron_daily_start", shard=shard_label(shard))
+    run = await run_daily_loop_service(app, shard)
+    log_structured(
+        "cron_daily_finish",
+        shard=shard_label(shard),
+        users=run["items"],
+        errors=run["errors"],
+        duration_sec=run["duration_sec"],
+        users_per_sec=run["items_per_sec"],
+        user_ms_p95=run["item_ms_p95"],
+        user_ms_p99=run["item_ms_p99"],
+        resumed_from=run["resumed_from"],
+        pass_complete=run["pass_complete"],
+        runs_this_pass=run["runs_this_pass"],
+        remaining=run["remaining"],
+    )
+    return {
+        "shard": shard_label(shard),
+        "users_scanned": run["scanned"],
+        "users": run["items"],
+        "errors": run["errors"],
+        "users_per_sec": run["items_per_sec"],
+        "user_ms_p95": run["item_ms_p95"],
+        "user_ms_p99": run["item_ms_p99"],
+        "coverage": {key: run[key] for key in ("resumed_from", "pass_complete", "runs_this_pass", "remaining")},
+    }
 
-async def cron_weekly(app: Application):
-    """Send a deterministic weekly summary phrased by AI."""
-    log_structured("cron_weekly_start")
-    for u in users.find(live_user_query()):
-        uid = u["user_id"]
+async def deliver_weekly_summary(app: Application, uid: int, facts: Dict[str, Any], msg: str, week: str | None = None):
+    await deliver_message(
+        app.bot,
+        uid,
+        text=msg,
+        message_type="weekly_summary",
+        phase="weekly",
+        trigger="weekly_summary",
+    )
+    count_cron_run("sent")
+    log_structured("weekly_summary_sent", user_id=uid, days_active=facts.get("days_active"), main_blocker=facts.get("main_blocker_pattern"), what_worked=facts.get("what_worked"))
+    log_event(uid, "insight", facts)
+    set_memory(uid, "last_weekly_summary", facts, 0.85)
+    if week:
+        users.update_one({"user_id": uid}, {"$set": {"weekly_summary_week": week}})
+
+def is_permanent_send_error(exc: Exception) -> bool:
+    """Telegram refused the chat itself (bot blocked, chat gone, bad request); sending again cannot succeed."""
+    return isinstance(exc, (Forbidden, BadRequest))
+
+async def send_weekly_summary_batch(app: Application, facts_by_user: Dict[int, Dict[str, Any]], week: str | None = None):
+    if week:
+        # Recorded before the Cohere call: a user whose send keeps failing costs one phrasing a week, not one per tick.
+        users.update_many({"user_id": {"$in": list(facts_by_user)}}, {"$set": {"weekly_summary_attempted_week": week}})
+    summaries = await phrase_weekly_summaries_batch(facts_by_user)
+    for uid, facts in facts_by_user.items():
         try:
-            facts = weekly_summary_facts(uid)
-            msg = phrase_weekly_summary(uid, facts)
-            await deliver_message(
-                app.bot,
-                uid,
-                text=msg,
-                message_type="weekly_summary",
-                phase="weekly",
-                trigger="weekly_summary",
-            )
-            log_structured("weekly_summary_sent", user_id=uid, days_active=facts.get("days_active"), main_blocker=facts.get("main_blocker_pattern"), what_worked=facts.get("what_worked"))
-            log_event(uid, "insight", facts)
-            set_memory(uid, "last_weekly_summary", facts, 0.85)
-        except Exception:
+            await deliver_weekly_summary(app, uid, facts, summaries[uid], week)
+        except Exception as exc:
+            permanent = is_permanent_send_error(exc)
+            if week and not permanent:
+                # Network or Telegram-side trouble: the next tick may try this user again.
+                users.update_one({"user_id": uid, "weekly_summary_attempted_week": week}, {"$unset": {"weekly_summary_attempted_week": ""}})
+            log_structured("weekly_summary_failed", user_id=uid, week=week, permanent=permanent, error=str(exc))
             logger.exception("Weekly summary failed for user_id=%s", uid)
-    log_structured("cron_weekly_finish")
+
+def weekly_cohorts(user_docs: list) -> Dict[str, list]:
+    """Group user docs by resolved timezone; the profile timezone wins over users.tz, then the default TZ."""
+    profile_tz = {
+        doc["user_id"]: doc.get("timezone")
+        for doc in profiles.find({"user_id": {"$in": [doc["user_id"] for doc in user_docs]}}, {"user_id": 1, "timezone": 1})
+    }
+    valid: Dict[str, bool] = {}
+    cohorts: Dict[str, list] = {}
+    for doc in user_docs:
+        tz_name = profile_tz.get(doc["user_id"]) or doc.get("tz") or TZ
+        if tz_name not in valid:
+            try:
+                ZoneInfo(tz_name)
+                valid[tz_name] = True
+            except Exception:
+                valid[tz_name] = False
+        cohorts.setdefault(tz_name if valid[tz_name] else TZ, []).append(doc)
+    return cohorts
+
+def weekly_cohort_week(tz_name: str, utc_now: dt.datetime) -> str | None:
+    """ISO week key (``2026-W42``) when it is Monday at or after WEEKLY_SUMMARY_LOCAL_HOUR in ``tz_name``, else None."""
+    local = utc_now.astimezone(ZoneInfo(tz_name))
+    if local.weekday() != 0 or local.hour < WEEKLY_SUMMARY_LOCAL_HOUR:
+        return None
+    year, week, _ = local.isocalendar()
+    return f"{year}-W{week:02d}"
+
+async def cron_weekly(app: Application):
+    """Send the weekly summary to every timezone cohort where it is now Monday morning.
+
+    Run it hourly: each cohort is picked up once its local Monday reaches WEEKLY_SUMMARY_LOCAL_HOUR, and the
+    per-user weekly_summary_week marker keeps a later tick (or a rerun) from sending twice. A user whose send
+    Telegram refused for good keeps weekly_summary_attempted_week and is not tried again until next week.
+    """
+    log_structured("cron_weekly_start")
+    user_docs = list(users.find(live_user_query(), {"user_id": 1, "tz": 1, "weekly_summary_week": 1, "weekly_summary_attempted_week": 1}))
+    utc_now = current_utc_now()
+    jobs = []
+    cohorts_due = 0
+    for tz_name, docs in weekly_cohorts(user_docs).items():
+        week = weekly_cohort_week(tz_name, utc_now)
+        if week is None:
+            continue
+        uids = [doc["user_id"] for doc in docs if week not in (doc.get("weekly_summary_week"), doc.get("weekly_summary_attempted_week"))]
+        if not uids:
+            continue
+        cohorts_due += 1
+        jobs.extend((tz_name, week, uids[i:i + WEEKLY_SUMMARY_BATCH_SIZE]) for i in range(0, len(uids), WEEKLY_SUMMARY_BATCH_SIZE))
+
+    async def summarize_chunk(job):
+        _tz_name, week, chunk = job
+        batch = weekly_summary_facts_for_cohort(chunk)
+        if batch:
+            await send_weekly_summary_batch(app, batch, week)
+
+    due = sum(len(chunk) for _tz, _week, chunk in jobs)
+    run = await fan_out("weekly_summary", jobs, summarize_chunk, describe=lambda job: f"timezone={job[0]} user_ids={job[2]}")
+    log_structured(
+        "cron_weekly_finish",
+        users_scanned=len(user_docs),
+        users=due,
+        cohorts=cohorts_due,
+        batches=run["items"],
+        errors=run["errors"],
+        duration_sec=run["duration_sec"],
+        users_per_sec=round(due / run["duration_sec"], 2) if run["duration_sec"] else None,
+        batch_ms_p95=run["item_ms_p95"],
+        batch_ms_p99=run["item_ms_p99"],
+    )
+    return {"users_scanned": len(user_docs), "users": due, "cohorts": cohorts_due, "batches": run["items"], "errors": run["errors"], "batch_ms_p95": run["item_ms_p95"], "batch_ms_p99": run["item_ms_p99"]}
 
 def test_clock_payload() -> Dict[str, Any]:
     fake = system_state.find_one({"_id": "clock"}) or {}
@@ -2960,7 +4430,485 @@ async def deliver_message(
         log_structured("test_outbox_capture", user_id=user_id, message_type=message_type, phase=phase, trigger=trigger)
     if test_mode.get("suppress_telegram"):
         return {"captured": True}
-    return await bot.send_message(chat_id=user_id, text=text, reply_markup=reply_markup, parse_mode=parse_mode)
+    return await send_outbound_message(bot, message_type, chat_id=user_id, text=text, reply_markup=reply_markup, parse_mode=parse_mode)
+
+# =========================
+# PROACTIVE OUTBOX
+# =========================
+OUTBOX_METRICS = {"enqueued": 0, "duplicates": 0, "sent": 0, "retried": 0, "failed": 0, "reclaimed": 0, "merged_sends": 0, "merged_items": 0}
+_OUTBOX_WORKER: Dict[str, Any] = {"task": None}
+
+# Which message types may share one Telegram message, and in what order their text appears.
+# Session messages carry session-scoped buttons without a session id, so they are never merged.
+_DAILY_LOOP_MERGEABLE = {"intervention", "morning_prompt", "midday_prompt", "eod_prompt"}
+OUTBOX_MERGE_RULES: Dict[str, Dict[str, Any]] = {
+    "intervention": {"order": 0, "merge_with": _DAILY_LOOP_MERGEABLE},
+    "morning_prompt": {"order": 1, "merge_with": _DAILY_LOOP_MERGEABLE},
+    "midday_prompt": {"order": 2, "merge_with": _DAILY_LOOP_MERGEABLE},
+    "eod_prompt": {"order": 3, "merge_with": _DAILY_LOOP_MERGEABLE},
+    "session_completion": {"order": 0, "merge_with": set()},
+    "session_nudge": {"order": 0, "merge_with": set()},
+    "weekly_summary": {"order": 9, "merge_with": set()},
+}
+
+def outbox_key(user_id: int, local_date: str, *, phase: str | None, trigger: str | None, related_session_id: str | None = None, extra: str | None = None) -> str:
+    parts = [str(user_id), local_date, phase or "-", trigger or "-"]
+    if related_session_id:
+        parts.append(related_session_id)
+    if extra:
+        parts.append(extra)
+    return ":".join(parts)
+
+def enqueue_outbox(
+    user_id: int,
+    idempotency_key: str,
+    *,
+    text: str,
+    message_type: str,
+    phase: str | None = None,
+    trigger: str | None = None,
+    reply_markup=None,
+    parse_mode=None,
+    related_session_id: str | None = None,
+    hold_sec: float = 0.0,
+) -> tuple[Dict[str, Any] | None, bool]:
+    """Write a pending outbox item. Returns ``(item, created)``; an existing key returns the stored item.
+
+    ``hold_sec`` keeps the worker off an item that an inline merge window will send.
+    """
+    real_now = dt.datetime.now(dt.timezone.utc)
+    doc = {
+        "idempotency_key": idempotency_key,
+        "user_id": user_id,
+        "status": "pending",
+        "text": text,
+        "message_type": message_type,
+        "phase": phase,
+        "trigger": trigger,
+        "reply_markup": reply_markup.to_dict() if reply_markup is not None else None,
+        "parse_mode": parse_mode,
+        "related_session_id": related_session_id,
+        "attempts": 0,
+        "next_attempt_at": real_now + timedelta(seconds=hold_sec),
+        "telegram_message_id": None,
+        "created_at": real_now,
+    }
+    try:
+        outbox.insert_one(doc)
+    except DuplicateKeyError:
+        OUTBOX_METRICS["duplicates"] += 1
+        return outbox.find_one({"idempotency_key": idempotency_key}), False
+    OUTBOX_METRICS["enqueued"] += 1
+    return doc, True
+
+def _claim_outbox_item(query: Dict[str, Any]) -> Dict[str, Any] | None:
+    return outbox.find_one_and_update(
+        {**query, "status": "pending"},
+        {"$set": {"status": "sending", "claimed_by": INSTANCE_ID, "claimed_at": dt.datetime.now(dt.timezone.utc)}, "$inc": {"attempts": 1}},
+        sort=[("next_attempt_at", ASCENDING)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+def _can_merge(group: list[Dict[str, Any]], item: Dict[str, Any]) -> bool:
+    if len(group) >= OUTBOX_MERGE_MAX:
+        return False
+    for other in group:
+        rule = OUTBOX_MERGE_RULES.get(other["message_type"], {})
+        if item["message_type"] not in rule.get("merge_with", ()) or item.get("parse_mode") != other.get("parse_mode"):
+            return False
+    return True
+
+def group_outbox_items(items: list[Dict[str, Any]]) -> list[list[Dict[str, Any]]]:
+    """Split one user's claimed items into send groups following OUTBOX_MERGE_RULES."""
+    ordered = sorted(items, key=lambda item: (OUTBOX_MERGE_RULES.get(item["message_type"], {}).get("order", 9), item["created_at"]))
+    groups: list[list[Dict[str, Any]]] = []
+    for item in ordered:
+        target = next((group for group in groups if OUTBOX_MERGE_ENABLED and _can_merge(group, item)), None)
+        if target is None:
+            groups.append([item])
+        else:
+            target.append(item)
+    return groups
+
+def _merged_reply_markup(items: list[Dict[str, Any]], bot):
+    rows = []
+    for item in items:
+        rows.extend((item.get("reply_markup") or {}).get("inline_keyboard", []))
+    return InlineKeyboardMarkup.de_json({"inline_keyboard": rows}, bot) if rows else None
+
+async def deliver_outbox_items(bot, items: list[Dict[str, Any]]) -> bool:
+    """Send claimed items of one user as a single message and record the outcome on each."""
+    primary = items[0]
+    try:
+        result = await deliver_message(
+            bot,
+            primary["user_id"],
+            text="\n\n".join(item["text"] for item in items),
+            message_type=primary["message_type"],
+            phase=primary.get("phase"),
+            trigger=primary.get("trigger"),
+            reply_markup=_merged_reply_markup(items, bot),
+            parse_mode=primary.get("parse_mode"),
+            related_session_id=primary.get("related_session_id"),
+        )
+    except Exception as exc:
+        for item in items:
+            attempts = int(item.get("attempts", 1))
+            if attempts >= OUTBOX_MAX_ATTEMPTS:
+                OUTBOX_METRICS["failed"] += 1
+                outbox.update_one({"_id": item["_id"]}, {"$set": {"status": "failed", "last_error": str(exc)}})
+                logger.exception("Outbox item %s failed permanently", item["idempotency_key"])
+            else:
+                OUTBOX_METRICS["retried"] += 1
+                retry_at = dt.datetime.now(dt.timezone.utc) + timedelta(seconds=min(15 * 2 ** attempts, 900))
+                outbox.update_one({"_id": item["_id"]}, {"$set": {"status": "pending", "next_attempt_at": retry_at, "last_error": str(exc)}})
+                log_structured("outbox_retry_scheduled", user_id=item["user_id"], idempotency_key=item["idempotency_key"], attempts=attempts, error=str(exc))
+        return False
+    OUTBOX_METRICS["sent"] += len(items)
+    count_cron_run("sent", len(items))
+    fields = {"status": "sent", "sent_at": dt.datetime.now(dt.timezone.utc), "telegram_message_id": getattr(result, "message_id", None)}
+    if len(items) > 1:
+        OUTBOX_METRICS["merged_sends"] += 1
+        OUTBOX_METRICS["merged_items"] += len(items) - 1
+        fields["merged_into"] = primary["idempotency_key"]
+        log_structured("outbox_merged", user_id=primary["user_id"], message_types=[item["message_type"] for item in items])
+    outbox.update_many({"_id": {"$in": [item["_id"] for item in items]}}, {"$set": fields})
+    return True
+
+async def deliver_outbox_item(bot, item: Dict[str, Any]) -> bool:
+    return await deliver_outbox_items(bot, [item])
+
+async def deliver_outbox_for_user(bot, items: list[Dict[str, Any]]) -> int:
+    sent = 0
+    for group in group_outbox_items(items):
+        if await deliver_outbox_items(bot, group):
+            sent += len(group)
+    return sent
+
+async def send_outbox_item_now(bot, item_id) -> bool:
+    item = _claim_outbox_item({"_id": item_id})
+    if item is None:
+        return False
+    return await deliver_outbox_item(bot, item)
+
+# Mergeable inline sends held per user until the merge window closes.
+_INLINE_HOLDS: Dict[int, Dict[str, Any]] = {}
+
+def inline_merge_window(message_type: str) -> float:
+    if not OUTBOX_MERGE_ENABLED or not OUTBOX_MERGE_RULES.get(message_type, {}).get("merge_with"):
+        return 0.0
+    return OUTBOX_MERGE_WINDOW_SEC
+
+async def _send_held_items(user_id: int, hold: Dict[str, Any]) -> int:
+    if _INLINE_HOLDS.get(user_id) is hold:
+        del _INLINE_HOLDS[user_id]
+    # Anything the worker or another instance already claimed is theirs; send what is still pending.
+    claimed = [item for item in (_claim_outbox_item({"_id": item_id}) for item_id in hold["ids"]) if item is not None]
+    return await deliver_outbox_for_user(hold["bot"], claimed) if claimed else 0
+
+async def _send_after_merge_window(user_id: int, hold: Dict[str, Any]):
+    try:
+        await asyncio.sleep(OUTBOX_MERGE_WINDOW_SEC)
+        await _send_held_items(user_id, hold)
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        logger.exception("Held outbox send failed for user_id=%s", user_id)
+
+async def send_outbox_item_inline(bot, item: Dict[str, Any]):
+    """Send a fresh item now, or hold a mergeable one for the merge window so a second item for the user joins it."""
+    if inline_merge_window(item["message_type"]) <= 0:
+        await send_outbox_item_now(bot, item["_id"])
+        return
+    hold = _INLINE_HOLDS.get(item["user_id"])
+    if hold is None:
+        hold = {"bot": bot, "ids": []}
+        _INLINE_HOLDS[item["user_id"]] = hold
+        hold["task"] = asyncio.create_task(_send_after_merge_window(item["user_id"], hold))
+    hold["ids"].append(item["_id"])
+
+async def flush_inline_outbox(user_id: int | None = None) -> int:
+    """Send held items now instead of at the end of their window (one user, or all of them)."""
+    sent = 0
+    for uid, hold in list(_INLINE_HOLDS.items()):
+        if user_id is not None and uid != user_id:
+            continue
+        if _INLINE_HOLDS.get(uid) is not hold:
+            # Its window closed meanwhile and the task is already sending.
+            await asyncio.gather(hold["task"], return_exceptions=True)
+            continue
+        hold["task"].cancel()
+        sent += await _send_held_items(uid, hold)
+    return sent
+
+def reclaim_stale_outbox_items() -> int:
+    """Put items whose sender died mid-send back to pending (delivery is at-least-once)."""
+    cutoff = dt.datetime.now(dt.timezone.utc) - timedelta(seconds=OUTBOX_CLAIM_TIMEOUT_SEC)
+    result = outbox.update_many({"status": "sending", "claimed_at": {"$lt": cutoff}}, {"$set": {"status": "pending"}})
+    if result.modified_count:
+        OUTBOX_METRICS["reclaimed"] += result.modified_count
+        log_structured("outbox_reclaimed", count=result.modified_count)
+    return result.modified_count
+
+async def drain_outbox(bot, limit: int | None = None) -> Dict[str, int]:
+    """Claim up to ``limit`` due items and send them concurrently."""
+    reclaimed = reclaim_stale_outbox_items()
+    claimed = []
+    due = {"next_attempt_at": {"$lte": dt.datetime.now(dt.timezone.utc)}}
+    for _ in range(limit or OUTBOX_BATCH_SIZE):
+        item = _claim_outbox_item(due)
+        if item is None:
+            break
+        claimed.append(item)
+    by_user: Dict[int, list] = {}
+    for item in claimed:
+        by_user.setdefault(item["user_id"], []).append(item)
+    results = await asyncio.gather(*(deliver_outbox_for_user(bot, items) for items in by_user.values()))
+    return {"reclaimed": reclaimed, "claimed": len(claimed), "sent": sum(results)}
+
+async def _outbox_worker(bot):
+    while True:
+        try:
+            drained = await drain_outbox(bot)
+            if drained["claimed"]:
+                log_structured("outbox_drained", **drained)
+                continue
+        except Exception:
+            logger.exception("Outbox worker pass failed")
+        await asyncio.sleep(OUTBOX_POLL_SEC)
+
+def start_outbox_worker(bot):
+    if _OUTBOX_WORKER["task"] is None:
+        _OUTBOX_WORKER["task"] = asyncio.create_task(_outbox_worker(bot))
+
+async def stop_outbox_worker():
+    await flush_inline_outbox()
+    task = _OUTBOX_WORKER["task"]
+    if task is None:
+        return
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    _OUTBOX_WORKER["task"] = None
+
+def outbox_metrics_payload() -> Dict[str, Any]:
+    try:
+        by_status = {row["_id"]: row["count"] for row in outbox.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}])}
+    except PyMongoError:
+        by_status = None
+    return {
+        "worker_running": _OUTBOX_WORKER["task"] is not None,
+        "inline_delivery": OUTBOX_INLINE_DELIVERY,
+        "merge_window_sec": OUTBOX_MERGE_WINDOW_SEC,
+        "users_held": len(_INLINE_HOLDS),
+        "counters": dict(OUTBOX_METRICS),
+        "by_status": by_status,
+    }
+
+# =========================
+# OUTBOUND DELIVERY QUEUE
+# =========================
+# Lower number is sent first. Unlisted message types use OUTBOUND_DEFAULT_PRIORITY.
+OUTBOUND_PRIORITIES = {
+    "session_completion": 0,
+    "session_nudge": 0,
+    "override": 0,
+    "intervention": 1,
+    "morning_prompt": 1,
+    "midday_prompt": 1,
+    "eod_prompt": 1,
+    "weekly_summary": 2,
+}
+OUTBOUND_DEFAULT_PRIORITY = 1
+OUTBOUND_BUCKET_LIMIT = 5000
+
+OUTBOUND_METRICS: Dict[str, Any] = {
+    "enqueued": 0,
+    "sent": 0,
+    "failed": 0,
+    "retry_after": 0,
+    "retried": 0,
+    "throttled_global": 0,
+    "throttled_chat": 0,
+    "max_depth": 0,
+    "send_latency_ms": deque(maxlen=LLM_METRICS_WINDOW),
+    "queue_wait_ms": deque(maxlen=LLM_METRICS_WINDOW),
+}
+_OUTBOUND: Dict[str, Any] = {"queue": None, "workers": [], "seq": 0, "paused_until": 0.0}
+_OUTBOUND_BUCKETS: Dict[Any, Dict[str, float]] = {}
+
+def _retry_after_seconds(exc: RetryAfter) -> float:
+    value = getattr(exc, "retry_after", 1)
+    if isinstance(value, timedelta):
+        return max(value.total_seconds(), 0.5)
+    return max(float(value or 1), 0.5)
+
+def _bucket_wait(key, rate: float, burst: float) -> float:
+    """Refill ``key`` and return seconds until it holds one token (0.0 when a token is ready)."""
+    mono = time.monotonic()
+    bucket = _OUTBOUND_BUCKETS.get(key)
+    if bucket is None:
+        if len(_OUTBOUND_BUCKETS) >= OUTBOUND_BUCKET_LIMIT:
+            idle = [k for k, b in _OUTBOUND_BUCKETS.items() if k != "global" and mono - b["updated"] > 60]
+            for idle_key in idle:
+                _OUTBOUND_BUCKETS.pop(idle_key, None)
+        bucket = {"tokens": burst, "updated": mono}
+        _OUTBOUND_BUCKETS[key] = bucket
+    bucket["tokens"] = min(burst, bucket["tokens"] + (mono - bucket["updated"]) * rate)
+    bucket["updated"] = mono
+    if bucket["tokens"] >= 1.0:
+        return 0.0
+    return (1.0 - bucket["tokens"]) / max(rate, 0.001)
+
+async def _acquire_send_slot(chat_id: int):
+    while True:
+        pause = _OUTBOUND["paused_until"] - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+            continue
+        global_wait = _bucket_wait("global", OUTBOUND_GLOBAL_RATE, max(OUTBOUND_GLOBAL_RATE, 1.0))
+        chat_wait = _bucket_wait(("chat", chat_id), OUTBOUND_CHAT_RATE, max(OUTBOUND_CHAT_BURST, 1.0))
+        if global_wait <= 0 and chat_wait <= 0:
+            _OUTBOUND_BUCKETS["global"]["tokens"] -= 1.0
+            _OUTBOUND_BUCKETS[("chat", chat_id)]["tokens"] -= 1.0
+            return
+        if global_wait > 0:
+            OUTBOUND_METRICS["throttled_global"] += 1
+        if chat_wait > 0:
+            OUTBOUND_METRICS["throttled_chat"] += 1
+        await asyncio.sleep(max(global_wait, chat_wait))
+
+def _note_retry_after(exc: RetryAfter, chat_id: int, attempt: int) -> float:
+    delay = _retry_after_seconds(exc)
+    OUTBOUND_METRICS["retry_after"] += 1
+    _OUTBOUND["paused_until"] = max(_OUTBOUND["paused_until"], time.monotonic() + delay)
+    log_structured("outbound_retry_after", chat_id=chat_id, retry_after=delay, attempt=attempt)
+    return delay
+
+async def _timed_send(bot, kwargs: Dict[str, Any]):
+    started = time.perf_counter()
+    result = await bot.send_message(**kwargs)
+    OUTBOUND_METRICS["send_latency_ms"].append((time.perf_counter() - started) * 1000.0)
+    OUTBOUND_METRICS["sent"] += 1
+    return result
+
+async def _send_inline(bot, kwargs: Dict[str, Any]):
+    """Rate-limited send used when the worker pool is not running (scripts, tests)."""
+    attempt = 0
+    while True:
+        await _acquire_send_slot(kwargs["chat_id"])
+        try:
+            return await _timed_send(bot, kwargs)
+        except RetryAfter as exc:
+            attempt += 1
+            _note_retry_after(exc, kwargs["chat_id"], attempt)
+            if attempt > OUTBOUND_MAX_RETRIES:
+                OUTBOUND_METRICS["failed"] += 1
+                raise
+            OUTBOUND_METRICS["retried"] += 1
+        except Exception:
+            OUTBOUND_METRICS["failed"] += 1
+            raise
+
+def _enqueue_outbound(job: Dict[str, Any]):
+    queue = _OUTBOUND["queue"]
+    if queue is None:
+        if not job["future"].done():
+            job["future"].set_exception(RuntimeError("Outbound delivery stopped"))
+        return
+    _OUTBOUND["seq"] += 1
+    queue.put_nowait((job["priority"], _OUTBOUND["seq"], job))
+    OUTBOUND_METRICS["max_depth"] = max(OUTBOUND_METRICS["max_depth"], queue.qsize())
+
+async def send_outbound_message(bot, message_type: str, **kwargs):
+    """Send through the priority queue when workers run, otherwise inline. Returns the Telegram message."""
+    OUTBOUND_METRICS["enqueued"] += 1
+    if _OUTBOUND["queue"] is None:
+        return await _send_inline(bot, kwargs)
+    job = {
+        "bot": bot,
+        "kwargs": kwargs,
+        "priority": OUTBOUND_PRIORITIES.get(message_type, OUTBOUND_DEFAULT_PRIORITY),
+        "message_type": message_type,
+        "attempts": 0,
+        "queued_at": time.perf_counter(),
+        "future": asyncio.get_running_loop().create_future(),
+    }
+    _enqueue_outbound(job)
+    return await job["future"]
+
+async def _outbound_worker():
+    queue = _OUTBOUND["queue"]
+    loop = asyncio.get_running_loop()
+    while True:
+        _priority, _seq, job = await queue.get()
+        try:
+            if job["future"].done():
+                continue
+            chat_id = job["kwargs"]["chat_id"]
+            await _acquire_send_slot(chat_id)
+            OUTBOUND_METRICS["queue_wait_ms"].append((time.perf_counter() - job["queued_at"]) * 1000.0)
+            try:
+                result = await _timed_send(job["bot"], job["kwargs"])
+            except RetryAfter as exc:
+                job["attempts"] += 1
+                delay = _note_retry_after(exc, chat_id, job["attempts"])
+                if job["attempts"] > OUTBOUND_MAX_RETRIES:
+                    OUTBOUND_METRICS["failed"] += 1
+                    job["future"].set_exception(exc)
+                else:
+                    OUTBOUND_METRICS["retried"] += 1
+                    loop.call_later(delay, _enqueue_outbound, job)
+                continue
+            except Exception as exc:
+                OUTBOUND_METRICS["failed"] += 1
+                if not job["future"].done():
+                    job["future"].set_exception(exc)
+                continue
+            if not job["future"].done():
+                job["future"].set_result(result)
+        finally:
+            queue.task_done()
+
+def start_outbound_delivery():
+    if _OUTBOUND["queue"] is not None:
+        return
+    _OUTBOUND["queue"] = asyncio.PriorityQueue()
+    _OUTBOUND["workers"] = [asyncio.create_task(_outbound_worker()) for _ in range(OUTBOUND_WORKERS)]
+    logger.info("Outbound delivery started with %s workers", OUTBOUND_WORKERS)
+
+async def stop_outbound_delivery(timeout: float = 10.0):
+    queue = _OUTBOUND["queue"]
+    if queue is None:
+        return
+    try:
+        await asyncio.wait_for(queue.join(), timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.warning("Outbound delivery stopped with %s messages still queued", queue.qsize())
+    for worker in _OUTBOUND["workers"]:
+        worker.cancel()
+    await asyncio.gather(*_OUTBOUND["workers"], return_exceptions=True)
+    _OUTBOUND["queue"] = None
+    _OUTBOUND["workers"] = []
+    while not queue.empty():
+        _priority, _seq, job = queue.get_nowait()
+        if not job["future"].done():
+            job["future"].set_exception(RuntimeError("Outbound delivery stopped"))
+
+def outbound_metrics_payload() -> Dict[str, Any]:
+    queue = _OUTBOUND["queue"]
+    latencies = list(OUTBOUND_METRICS["send_latency_ms"])
+    waits = list(OUTBOUND_METRICS["queue_wait_ms"])
+    return {
+        "running": queue is not None,
+        "workers": len(_OUTBOUND["workers"]),
+        "queue_depth": queue.qsize() if queue is not None else 0,
+        "users_with_backlog": len(_USER_BACKLOG),
+        "paused_for_sec": round(max(_OUTBOUND["paused_until"] - time.monotonic(), 0.0), 3),
+        "limits": {"global_per_sec": OUTBOUND_GLOBAL_RATE, "chat_per_sec": OUTBOUND_CHAT_RATE, "chat_burst": OUTBOUND_CHAT_BURST},
+        "counters": {key: value for key, value in OUTBOUND_METRICS.items() if not isinstance(value, deque)},
+        "send_latency_ms": {"p50": percentile(latencies, 50), "p95": percentile(latencies, 95), "p99": percentile(latencies, 99)},
+        "queue_wait_ms": {"p50": percentile(waits, 50), "p95": percentile(waits, 95), "p99": percentile(waits, 99)},
+    }
 
 def mongo_safe(value: Any):
     return jsonable_encoder(
@@ -2995,6 +4943,8 @@ def reset_user_test_data(user_id: int):
     control_stats.delete_many({"user_id": user_id})
     control_events.delete_many({"user_id": user_id})
     profiles.delete_many({"user_id": user_id})
+    outbox.delete_many({"user_id": user_id})
+    daily_plans.delete_many({"user_id": user_id})
     users.delete_many({"user_id": user_id})
 
 def seed_test_user(user_id: int, *, timezone: str = "America/Toronto"):
@@ -3009,6 +4959,7 @@ def seed_test_user(user_id: int, *, timezone: str = "America/Toronto"):
         restart_size_min=10,
         onboarding_complete=True,
         conversation=None,
+        loop_jitter_minute=0,  # scenario clocks are set to a few minutes past the hour
     )
     users.update_one({"user_id": user_id}, {"$set": {"tz": timezone, "checkin_hour": 8, "is_test_user": True}}, upsert=True)
     set_goal_why(user_id, "optimization-of-brobot", "ship a cleaner bot")
@@ -3462,7 +5413,9 @@ async def verify_dependencies():
         raise RuntimeError(f"Mongo ping failed: {e}")
 
     webhook_base = (WEBHOOK_URL or RENDER_EXTERNAL_URL or "").rstrip("/")
-    if webhook_base:
+    if INGESTION_MODE == "polling":
+        logger.info("INGESTION_MODE=polling; webhook registration skipped")
+    elif webhook_base:
         webhook_url = f"{webhook_base}/webhook"
         try:
             await tg_app.bot.set_webhook(
@@ -3476,9 +5429,21 @@ async def verify_dependencies():
             raise
     else:
         logger.warning("WEBHOOK_URL/RENDER_EXTERNAL_URL not set; webhook was not auto-registered")
-    
+    start_outbound_delivery()
+    start_webhook_workers()
+    start_outbox_worker(tg_app.bot)
+    start_timer_service()
+    if INGESTION_MODE == "polling":
+        await start_polling_ingestion()
+
 @app.on_event("shutdown")
 async def on_shutdown():
+    await stop_polling_ingestion()
+    await stop_webhook_workers()
+    stop_timer_service()
+    await stop_cron_jobs()
+    await stop_outbox_worker()
+    await stop_outbound_delivery()
     await tg_app.stop()
     await tg_app.shutdown()   
     
@@ -3493,6 +5458,36 @@ async def ops_summary(request: Request):
     hours = max(1, min(hours, 168))
     return JSONResponse(ops_summary_payload(hours))
 
+@app.get("/ops/llm")
+async def ops_llm(request: Request):
+    _check_cron_auth(request)
+    return JSONResponse(llm_metrics_payload())
+
+@app.get("/ops/delivery")
+async def ops_delivery(request: Request):
+    _check_cron_auth(request)
+    return JSONResponse(jsonable_encoder({
+        **outbound_metrics_payload(),
+        "outbox": outbox_metrics_payload(),
+        "edit_cache": EDIT_CACHE_METRICS,
+    }))
+
+@app.get("/ops/webhook")
+async def ops_webhook(request: Request):
+    _check_cron_auth(request)
+    return JSONResponse({"ingestion_mode": INGESTION_MODE, **webhook_metrics_payload(), "polling": polling_metrics_payload()})
+
+@app.get("/ops/timers")
+async def ops_timers(request: Request):
+    _check_cron_auth(request)
+    return JSONResponse(timer_metrics_payload())
+
+@app.get("/ops/cron-runs")
+async def ops_cron_runs(request: Request):
+    _check_cron_auth(request)
+    limit = max(1, min(int(request.query_params.get("limit", "20")), 200))
+    return JSONResponse(jsonable_encoder(cron_runs_payload(request.query_params.get("job"), limit)))
+
 @app.get("/ops/verify")
 async def ops_verify(request: Request):
     _check_cron_auth(request)
@@ -3540,6 +5535,81 @@ async def dev_clock_set(request: Request):
         iso_value = None
     return JSONResponse(set_test_clock(iso_value))
 
+async def _bench_post_webhook(client: httpx.AsyncClient, update: Update) -> int:
+    """POST one update to the real /webhook route, backing off on 503 the way Telegram redelivers. Returns the retries."""
+    headers = {"x-telegram-bot-api-secret-token": TELEGRAM_SECRET_TOKEN} if TELEGRAM_SECRET_TOKEN else {}
+    retries = 0
+    while True:
+        response = await client.post("/webhook", json=update.to_dict(), headers=headers)
+        if response.status_code != 503:
+            response.raise_for_status()
+            return retries
+        retries += 1
+        await asyncio.sleep(min(1.0, 0.01 * retries))
+
+async def bench_ingestion_mode(mode: str, updates: list) -> Dict[str, Any]:
+    """Time ``updates`` from intake until every handler finished: POSTed to /webhook in-process, or as polling batches.
+
+    The synthetic update_ids are removed from the dedupe store and memory afterwards, so a bench never leaves
+    claims behind that could swallow a real update.
+    """
+    started = time.perf_counter()
+    retries = 0
+    try:
+        if mode == "webhook":
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                for update in updates:
+                    retries += await _bench_post_webhook(client, update)
+            queue = _WEBHOOK["queue"]
+            if queue is not None:
+                await queue.join()
+        else:
+            for idx in range(0, len(updates), POLL_BATCH_LIMIT):
+                await process_update_batch(updates[idx:idx + POLL_BATCH_LIMIT])
+        elapsed = time.perf_counter() - started
+    finally:
+        update_ids = [update.update_id for update in updates]
+        for update_id in update_ids:
+            _SEEN_UPDATE_IDS.pop(update_id, None)
+        processed_updates.delete_many({"_id": {"$in": update_ids}})
+    return {
+        "mode": mode,
+        "updates": len(updates),
+        "retried_503": retries,
+        "elapsed_sec": round(elapsed, 3),
+        "updates_per_sec": round(len(updates) / elapsed, 1) if elapsed > 0 else None,
+    }
+
+@app.post("/dev/bench/ingestion")
+async def dev_bench_ingestion(request: Request):
+    """Push synthetic handler-free updates through the webhook and polling paths, timed until fully processed."""
+    _require_api_secret(request)
+    data = await request.json()
+    count = max(1, min(int(data.get("count", 1000)), 100000))
+    modes = [data["mode"]] if data.get("mode") in {"webhook", "polling"} else ["webhook", "polling"]
+    first_id = int(data.get("first_update_id") or (2_000_000_000 + random.randint(0, 10**8)))
+    results = {}
+    for offset, mode in enumerate(modes):
+        base = first_id + offset * count
+        updates = [Update.de_json({"update_id": base + idx}, tg_app.bot) for idx in range(count)]
+        results[mode] = await bench_ingestion_mode(mode, updates)
+    return JSONResponse(results)
+
+@app.post("/dev/bench/send-smoothing")
+async def dev_bench_send_smoothing(request: Request):
+    """Peak daily-loop sends per tick with and without the per-user jitter, for synthetic or live user ids."""
+    _require_api_secret(request)
+    data = await request.json()
+    if data.get("live"):
+        user_ids = [doc["user_id"] for doc in users.find(live_user_query(), {"user_id": 1})]
+    else:
+        count = max(1, min(int(data.get("users", 10000)), 1_000_000))
+        first_id = int(data.get("first_user_id", 100_000_000))
+        user_ids = range(first_id, first_id + count)
+    tick_minutes = data.get("tick_minutes")
+    return JSONResponse(simulate_send_smoothing(user_ids, tick_minutes=int(tick_minutes) if tick_minutes else None))
+
 @app.post("/dev/scenarios/seed")
 async def dev_seed_scenario(request: Request):
     _require_api_secret(request)
@@ -3581,6 +5651,8 @@ async def dev_run_scenario(request: Request):
             log_structured("weekly_summary_sent", user_id=user_id, days_active=facts.get("days_active"), main_blocker=facts.get("main_blocker_pattern"), what_worked=facts.get("what_worked"))
             log_event(user_id, "insight", facts)
             set_memory(user_id, "last_weekly_summary", facts, confidence=0.8)
+        # Held sends must land while test mode still captures them.
+        await flush_inline_outbox(user_id)
         return mongo_safe({
             "seed": result,
             "clock": test_clock_payload(),
@@ -3598,21 +5670,394 @@ async def dev_record_outcome(request: Request):
     event = {k: v for k, v in data.items() if k != "user_id"}
     return mongo_safe(record_outcome(user_id, event))
 
+# =========================
+# WEBHOOK UPDATE QUEUE
+# =========================
+WEBHOOK_METRICS: Dict[str, Any] = {
+    "received": 0,
+    "enqueued": 0,
+    "rejected_full": 0,
+    "rejected_stopping": 0,
+    "rejected_invalid": 0,
+    "processed": 0,
+    "failed": 0,
+    "parked": 0,
+    "max_depth": 0,
+    "ack_ms": deque(maxlen=LLM_METRICS_WINDOW),
+    "queue_wait_ms": deque(maxlen=LLM_METRICS_WINDOW),
+    "process_ms": deque(maxlen=LLM_METRICS_WINDOW),
+}
+_WEBHOOK: Dict[str, Any] = {"queue": None, "workers": [], "stopping": False}
+
+UPDATE_DEDUPE_METRICS = {"claimed": 0, "duplicate_memory": 0, "duplicate_store": 0, "store_errors": 0}
+_SEEN_UPDATE_IDS: "OrderedDict[int, None]" = OrderedDict()
+
+def _remember_update_id(update_id: int):
+    _SEEN_UPDATE_IDS[update_id] = None
+    _SEEN_UPDATE_IDS.move_to_end(update_id)
+    while len(_SEEN_UPDATE_IDS) > UPDATE_DEDUPE_MEMORY:
+        _SEEN_UPDATE_IDS.popitem(last=False)
+
+def claim_update(update_id: int) -> bool:
+    """Return True the first time ``update_id`` is seen, False for a redelivery.
+
+    The in-process set catches rapid retries; the TTL collection catches redeliveries across restarts and instances.
+    A Mongo failure lets the update through rather than dropping it.
+    """
+    if update_id in _SEEN_UPDATE_IDS:
+        UPDATE_DEDUPE_METRICS["duplicate_memory"] += 1
+        log_structured("update_duplicate_dropped", update_id=update_id, source="memory")
+        return False
+    try:
+        processed_updates.insert_one({"_id": update_id, "seen_at": dt.datetime.now(dt.timezone.utc)})
+    except DuplicateKeyError:
+        _remember_update_id(update_id)
+        UPDATE_DEDUPE_METRICS["duplicate_store"] += 1
+        log_structured("update_duplicate_dropped", update_id=update_id, source="store")
+        return False
+    except PyMongoError:
+        UPDATE_DEDUPE_METRICS["store_errors"] += 1
+        logger.exception("Could not record update_id=%s; processing without store dedupe", update_id)
+    _remember_update_id(update_id)
+    UPDATE_DEDUPE_METRICS["claimed"] += 1
+    return True
+
+def release_update(update_id: int):
+    """Forget a claim for an update we turned away, so Telegram's redelivery is processed."""
+    _SEEN_UPDATE_IDS.pop(update_id, None)
+    try:
+        processed_updates.delete_one({"_id": update_id})
+    except PyMongoError:
+        logger.exception("Could not release update_id=%s", update_id)
+
+async def process_update_timed(update: Update):
+    started = time.perf_counter()
+    try:
+        await tg_app.process_update(update)
+        WEBHOOK_METRICS["processed"] += 1
+    except Exception:
+        WEBHOOK_METRICS["failed"] += 1
+        logger.exception("Failed to process Telegram update %s", update.update_id)
+    finally:
+        WEBHOOK_METRICS["process_ms"].append((time.perf_counter() - started) * 1000.0)
+
+# One lock per user with a waiter count; the entry is dropped when the last holder leaves.
+USER_LOCK_METRICS: Dict[str, Any] = {"acquired": 0, "contended": 0, "max_live": 0, "wait_ms": deque(maxlen=LLM_METRICS_WINDOW)}
+_USER_LOCKS: Dict[int, Dict[str, Any]] = {}
+
+@contextlib.asynccontextmanager
+async def user_serial(user_id: int):
+    """Run the body after every earlier holder for ``user_id`` has finished."""
+    entry = _USER_LOCKS.get(user_id)
+    if entry is None:
+        entry = {"lock": asyncio.Lock(), "refs": 0}
+        _USER_LOCKS[user_id] = entry
+        USER_LOCK_METRICS["max_live"] = max(USER_LOCK_METRICS["max_live"], len(_USER_LOCKS))
+    entry["refs"] += 1
+    if entry["lock"].locked():
+        USER_LOCK_METRICS["contended"] += 1
+    started = time.perf_counter()
+    try:
+        async with entry["lock"]:
+            USER_LOCK_METRICS["acquired"] += 1
+            USER_LOCK_METRICS["wait_ms"].append((time.perf_counter() - started) * 1000.0)
+            yield
+    finally:
+        entry["refs"] -= 1
+        if entry["refs"] == 0 and _USER_LOCKS.get(user_id) is entry:
+            del _USER_LOCKS[user_id]
+
+def update_user_id(update: Update) -> int | None:
+    user = update.effective_user
+    if user is not None:
+        return user.id
+    chat = update.effective_chat
+    return chat.id if chat is not None else None
+
+async def process_update_ordered(update: Update):
+    """Updates from one user run in arrival order; different users run in parallel."""
+    user_id = update_user_id(update)
+    if user_id is None:
+        await process_update_timed(update)
+        return
+    async with user_serial(user_id):
+        await process_update_timed(update)
+
+# Updates parked behind a worker that is already running that user's updates.
+_USER_BACKLOG: Dict[int, deque] = {}
+
+async def _run_queued_update(queue: asyncio.Queue, queued_at: float, update: Update):
+    try:
+        WEBHOOK_METRICS["queue_wait_ms"].append((time.perf_counter() - queued_at) * 1000.0)
+        await process_update_ordered(update)
+    finally:
+        queue.task_done()
+
+async def _webhook_worker():
+    """Take the next update; if its user is already being served, park it there and move on.
+
+    The first worker to pick up a user's update drains that user's backlog in order, so a burst from one user
+    occupies one worker while the rest keep serving other users.
+    """
+    queue = _WEBHOOK["queue"]
+    while True:
+        queued_at, update = await queue.get()
+        user_id = update_user_id(update)
+        if user_id is not None and user_id in _USER_BACKLOG:
+            _USER_BACKLOG[user_id].append((queued_at, update))
+            WEBHOOK_METRICS["parked"] += 1
+            continue
+        backlog = _USER_BACKLOG.setdefault(user_id, deque()) if user_id is not None else deque()
+        try:
+            await _run_queued_update(queue, queued_at, update)
+            while backlog:
+                await _run_queued_update(queue, *backlog.popleft())
+        finally:
+            if user_id is not None and _USER_BACKLOG.get(user_id) is backlog:
+                del _USER_BACKLOG[user_id]
+
+def start_webhook_workers():
+    if _WEBHOOK["queue"] is not None:
+        return
+    _WEBHOOK["queue"] = asyncio.Queue(maxsize=WEBHOOK_QUEUE_SIZE)
+    _WEBHOOK["stopping"] = False
+    _WEBHOOK["workers"] = [asyncio.create_task(_webhook_worker()) for _ in range(WEBHOOK_WORKERS)]
+    logger.info("Webhook queue started with %s workers", WEBHOOK_WORKERS)
+
+async def stop_webhook_workers(timeout: float = 20.0):
+    queue = _WEBHOOK["queue"]
+    if queue is None:
+        return
+    # Stop intake first so the webhook answers 503 and Telegram redelivers to the next instance.
+    _WEBHOOK["stopping"] = True
+    _WEBHOOK["queue"] = None
+    try:
+        await asyncio.wait_for(queue.join(), timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.warning("Webhook queue stopped with %s updates unprocessed", queue.qsize())
+    for worker in _WEBHOOK["workers"]:
+        worker.cancel()
+    await asyncio.gather(*_WEBHOOK["workers"], return_exceptions=True)
+    _WEBHOOK["workers"] = []
+
+def webhook_metrics_payload() -> Dict[str, Any]:
+    queue = _WEBHOOK["queue"]
+    series = {name: list(WEBHOOK_METRICS[name]) for name in ("ack_ms", "queue_wait_ms", "process_ms")}
+    return {
+        "running": queue is not None,
+        "stopping": _WEBHOOK["stopping"],
+        "workers": len(_WEBHOOK["workers"]),
+        "queue_depth": queue.qsize() if queue is not None else 0,
+        "users_with_backlog": len(_USER_BACKLOG),
+        "queue_size": WEBHOOK_QUEUE_SIZE,
+        "counters": {key: value for key, value in WEBHOOK_METRICS.items() if not isinstance(value, deque)},
+        "dedupe": {**UPDATE_DEDUPE_METRICS, "remembered": len(_SEEN_UPDATE_IDS)},
+        "user_locks": {
+            "live": len(_USER_LOCKS),
+            **{key: value for key, value in USER_LOCK_METRICS.items() if not isinstance(value, deque)},
+            "wait_ms": {"p50": percentile(list(USER_LOCK_METRICS["wait_ms"]), 50), "p95": percentile(list(USER_LOCK_METRICS["wait_ms"]), 95), "p99": percentile(list(USER_LOCK_METRICS["wait_ms"]), 99)},
+        },
+        **{name: {"p50": percentile(values, 50), "p95": percentile(values, 95), "p99": percentile(values, 99)} for name, values in series.items()},
+    }
+
 @app.post("/webhook")
 async def telegram_webhook(request: Request):
+    started = time.perf_counter()
     # Validate Telegram secret token if provided
     if TELEGRAM_SECRET_TOKEN:
         hdr = request.headers.get("x-telegram-bot-api-secret-token")
         if hdr != TELEGRAM_SECRET_TOKEN:
             raise HTTPException(status_code=401, detail="Invalid telegram secret token")
-    data = await request.json()
-    update = Update.de_json(data=data, bot=tg_app.bot)
+    WEBHOOK_METRICS["received"] += 1
     try:
-        await tg_app.process_update(update)
+        data = await request.json()
+        update = Update.de_json(data=data, bot=tg_app.bot)
     except Exception:
-        logger.exception("Failed to process Telegram update")
-        raise HTTPException(status_code=500, detail="Update processing failed")
-    return JSONResponse({"status": "processed"})
+        WEBHOOK_METRICS["rejected_invalid"] += 1
+        logger.warning("Rejected malformed Telegram update")
+        raise HTTPException(status_code=400, detail="Invalid update payload")
+    if update is None:
+        WEBHOOK_METRICS["rejected_invalid"] += 1
+        raise HTTPException(status_code=400, detail="Invalid update payload")
+    status = await ingest_webhook_update(update)
+    if status == "full":
+        raise HTTPException(status_code=503, detail="Update queue is full")
+    if status == "stopping":
+        raise HTTPException(status_code=503, detail="Shutting down")
+    if status == "queued":
+        WEBHOOK_METRICS["ack_ms"].append((time.perf_counter() - started) * 1000.0)
+    return JSONResponse({"status": status})
+
+async def ingest_webhook_update(update: Update, *, wait: bool = False) -> str:
+    """The webhook's path after parsing: dedupe, then queue (or run inline before the workers start).
+
+    Returns ``duplicate``, ``processed``, ``queued``, ``full`` or ``stopping``; ``wait`` blocks on a full queue instead.
+    """
+    if _WEBHOOK["stopping"]:
+        # Left unclaimed, so Telegram's redelivery is processed by whichever instance takes it.
+        WEBHOOK_METRICS["rejected_stopping"] += 1
+        return "stopping"
+    if not claim_update(update.update_id):
+        return "duplicate"
+    queue = _WEBHOOK["queue"]
+    if queue is None:
+        # Workers not started yet (startup still running): process inline as before.
+        await process_update_ordered(update)
+        return "processed"
+    try:
+        if wait:
+            await queue.put((time.perf_counter(), update))
+        else:
+            queue.put_nowait((time.perf_counter(), update))
+    except asyncio.QueueFull:
+        WEBHOOK_METRICS["rejected_full"] += 1
+        release_update(update.update_id)
+        log_structured("webhook_queue_full", update_id=update.update_id, queue_size=WEBHOOK_QUEUE_SIZE)
+        return "full"
+    WEBHOOK_METRICS["enqueued"] += 1
+    WEBHOOK_METRICS["max_depth"] = max(WEBHOOK_METRICS["max_depth"], queue.qsize())
+    return "queued"
+
+# =========================
+# LONG-POLL INGESTION
+# =========================
+POLL_METRICS: Dict[str, Any] = {
+    "polls": 0,
+    "empty_polls": 0,
+    "poll_errors": 0,
+    "updates": 0,
+    "duplicates": 0,
+    "batch_ms": deque(maxlen=LLM_METRICS_WINDOW),
+    "batch_size": deque(maxlen=LLM_METRICS_WINDOW),
+}
+# Only the holder of the poller lease calls getUpdates; Telegram answers a second concurrent poller with 409 Conflict.
+POLL_LEASE_ID = "update_poller"
+POLL_LEASE_CHECK_SEC = min(10.0, CRON_LEASE_TTL_SEC / 3)
+_POLLER: Dict[str, Any] = {"task": None, "offset": None, "owner": False}
+
+def load_poll_offset() -> int | None:
+    doc = system_state.find_one({"_id": "poll_offset"}) or {}
+    return doc.get("offset")
+
+def save_poll_offset(offset: int):
+    system_state.update_one({"_id": "poll_offset"}, {"$set": {"offset": offset, "updated_at": dt.datetime.now(dt.timezone.utc)}}, upsert=True)
+
+async def process_update_batch(updates: list, *, concurrency: int | None = None) -> Dict[str, Any]:
+    """Run a batch through the webhook's dedupe and per-user ordering, ``concurrency`` at a time."""
+    started = time.perf_counter()
+    fresh = [update for update in updates if claim_update(update.update_id)]
+    semaphore = asyncio.Semaphore(concurrency or POLL_CONCURRENCY)
+    chains: Dict[Any, list] = {}
+    for update in fresh:
+        user_id = update_user_id(update)
+        chains.setdefault(user_id if user_id is not None else ("update", update.update_id), []).append(update)
+
+    async def run_chain(key, chain):
+        # A user's later updates wait their turn here, holding neither a slot nor anyone else's place.
+        for update in chain:
+            if isinstance(key, tuple):
+                async with semaphore:
+                    await process_update_timed(update)
+                continue
+            async with user_serial(key):
+                async with semaphore:
+                    await process_update_timed(update)
+
+    await asyncio.gather(*(run_chain(key, chain) for key, chain in chains.items()))
+    elapsed_ms = (time.perf_counter() - started) * 1000.0
+    POLL_METRICS["updates"] += len(fresh)
+    POLL_METRICS["duplicates"] += len(updates) - len(fresh)
+    POLL_METRICS["batch_ms"].append(elapsed_ms)
+    POLL_METRICS["batch_size"].append(len(updates))
+    return {"updates": len(updates), "processed": len(fresh), "duplicates": len(updates) - len(fresh), "batch_ms": round(elapsed_ms, 2)}
+
+async def _poll_updates_loop(get_updates=None):
+    """Long-poll forever while holding the poller lease. Any failure (getUpdates, a batch, the offset write) is
+    logged and retried with backoff; without the lease the loop stands by and checks again.
+    """
+    get_updates = get_updates or tg_app.bot.get_updates
+    offset, loaded, failures = None, False, 0
+    try:
+        while True:
+            try:
+                held = hold_lease(POLL_LEASE_ID, INSTANCE_ID, _POLLER["owner"])
+            except PyMongoError:
+                logger.exception("Could not check the poller lease")
+                held = False
+            if held != _POLLER["owner"]:
+                logger.info("Polling ingestion %s the poller lease", "took" if held else "lost")
+                # Another instance may have moved the offset while this one stood by.
+                loaded = False
+            _POLLER["owner"] = held
+            if not held:
+                await asyncio.sleep(POLL_LEASE_CHECK_SEC)
+                continue
+            offset, loaded, failures = await _poll_once(get_updates, offset, loaded, failures)
+    finally:
+        if _POLLER["owner"]:
+            _POLLER["owner"] = False
+            with contextlib.suppress(PyMongoError):
+                release_cron_lease(POLL_LEASE_ID, INSTANCE_ID)
+
+async def _poll_once(get_updates, offset, loaded: bool, failures: int):
+    try:
+        if not loaded:
+            offset = load_poll_offset()
+            _POLLER["offset"] = offset
+            loaded = True
+        updates = await get_updates(
+            offset=offset,
+            limit=POLL_BATCH_LIMIT,
+            # Short enough that the lease is renewed well before it expires.
+            timeout=min(POLL_TIMEOUT_SEC, CRON_LEASE_TTL_SEC // 2),
+            allowed_updates=Update.ALL_TYPES,
+        )
+        POLL_METRICS["polls"] += 1
+        if updates:
+            # The offset only moves after the batch ran, so a crash redelivers and dedupe drops what already ran.
+            await process_update_batch(list(updates))
+            offset = updates[-1].update_id + 1
+            _POLLER["offset"] = offset
+            save_poll_offset(offset)
+        else:
+            POLL_METRICS["empty_polls"] += 1
+        failures = 0
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        failures += 1
+        POLL_METRICS["poll_errors"] += 1
+        delay = min(POLL_BACKOFF_MAX_SEC, 2 ** (failures - 1))
+        logger.exception("Polling iteration failed (%s in a row); retrying in %ss", failures, delay)
+        await asyncio.sleep(delay)
+    return offset, loaded, failures
+
+async def start_polling_ingestion():
+    if _POLLER["task"] is not None:
+        return
+    await tg_app.bot.delete_webhook(drop_pending_updates=False)
+    _POLLER["task"] = asyncio.create_task(_poll_updates_loop())
+    logger.info("Polling ingestion started (batch=%s, timeout=%ss)", POLL_BATCH_LIMIT, POLL_TIMEOUT_SEC)
+
+async def stop_polling_ingestion():
+    task = _POLLER["task"]
+    if task is None:
+        return
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    _POLLER["task"] = None
+
+def polling_metrics_payload() -> Dict[str, Any]:
+    batch_ms = list(POLL_METRICS["batch_ms"])
+    sizes = list(POLL_METRICS["batch_size"])
+    return {
+        "running": _POLLER["task"] is not None,
+        "owner": _POLLER["owner"],
+        "offset": _POLLER["offset"],
+        "counters": {key: value for key, value in POLL_METRICS.items() if not isinstance(value, deque)},
+        "avg_batch_size": round(sum(sizes) / len(sizes), 2) if sizes else None,
+        "batch_ms": {"p50": percentile(batch_ms, 50), "p95": percentile(batch_ms, 95), "p99": percentile(batch_ms, 99)},
+    }
 
 # Protected cron endpoints (hit these via Cloudflare Cron or any scheduler)
 def _check_cron_auth(req: Request):
@@ -3625,14 +6070,12 @@ def _check_cron_auth(req: Request):
 @app.get("/cron/daily")
 async def cron_daily_endpoint(request: Request):
     _check_cron_auth(request)
-    await cron_daily(tg_app)
-    return PlainTextResponse("daily-ok")
+    return await sharded_cron_response(request, "daily", lambda shard: cron_daily(tg_app, shard))
 
 @app.get("/cron/weekly")
 async def cron_weekly_endpoint(request: Request):
     _check_cron_auth(request)
-    await cron_weekly(tg_app)
-    return PlainTextResponse("weekly-ok")
+    return await cron_job_response(request, "weekly", lambda: cron_weekly(tg_app))
 
 # === PHASE 0: simple API (protected by ?secret=CRON_SECRET) ===
 def _require_api_secret(req: Request):
@@ -3691,7 +6134,54 @@ async def api_events(request: Request):
 # === PHASE 1: minute tick driving nudges & completion asks ===
 def _session_msg_goal_line(s): return f"**{s.get('goal','—')}**"
 
-async def run_session_tick_for_doc(app: Application, s: Dict[str, Any]):
+# Fields run_session_tick_for_doc reads; cron_sessions_tick loads only these.
+SESSION_TICK_PROJECTION = {
+    "user_id": 1,
+    "goal": 1,
+    "state": 1,
+    "ends_at": 1,
+    "asked_completion": 1,
+    "next_check_at": 1,
+    "nudges_enabled": 1,
+    "nudges_sent": 1,
+    "started_confirmed": 1,
+}
+
+def due_sessions_query(now_utc: dt.datetime) -> Dict[str, Any]:
+    """ACTIVE sessions with a nudge or an end that has come due; served by the (state, next_check_at) and (state, ends_at) indexes."""
+    return {
+        "state": "ACTIVE",
+        "$or": [
+            {"next_check_at": {"$lte": now_utc}, "nudges_enabled": {"$ne": False}},
+            {"ends_at": {"$lte": now_utc}, "asked_completion": {"$ne": True}},
+            {"ends_at": None, "asked_completion": {"$ne": True}},
+        ],
+    }
+
+def _session_write(ops: list | None, s: Dict[str, Any], update: Dict[str, Any], *, guarded: bool = True):
+    """Write a tick result, by default only if the session still looks the way the tick read it.
+
+    The cron bulk_write lands after the whole run; a callback (sess:start_yes, still_no, ...) that moved
+    next_check_at or nudges_sent in between wins, and the next tick starts from its values. Pass
+    ``guarded=False`` for idempotent catch-up writes that must land regardless.
+    """
+    query = {"_id": s["_id"], "state": "ACTIVE"}
+    if guarded:
+        query.update({"next_check_at": s.get("next_check_at"), "nudges_sent": s.get("nudges_sent")})
+    if ops is None:
+        sessions.update_one(query, update)
+    else:
+        ops.append(UpdateOne(query, update))
+
+async def run_session_tick_for_doc(app: Application, s: Dict[str, Any], ops: list | None = None):
+    """Tick one session. With ``ops``, session writes are appended there for the caller to bulk_write."""
+    try:
+        await _run_session_tick_pass(app, s, ops)
+    finally:
+        if ops is None:
+            schedule_session_timer(s["_id"])
+
+async def _run_session_tick_pass(app: Application, s: Dict[str, Any], ops: list | None):
     now_utc = now()
     uid = s["user_id"]
     ends_at = ensure_aware(s.get("ends_at")) or now_utc
@@ -3710,7 +6200,7 @@ async def run_session_tick_for_doc(app: Application, s: Dict[str, Any]):
             if sent:
                 log_structured("session_completion_prompt_sent", user_id=uid, session_id=str(s["_id"]), goal=s.get("goal"))
                 log_event(uid, "focus_completion_prompt", {"status": "asked", "sid": str(s["_id"])})
-                sessions.update_one({"_id": s["_id"]}, {"$set": {"asked_completion": True}})
+                _session_write(ops, s, {"$set": {"asked_completion": True}})
         except Exception:
             logger.exception("Session completion prompt failed for user_id=%s", uid)
         return
@@ -3738,7 +6228,7 @@ async def run_session_tick_for_doc(app: Application, s: Dict[str, Any]):
         next_dt = now_utc + timedelta(minutes=15)
 
     if nudges >= 4 and started:
-        sessions.update_one({"_id": s["_id"]}, {"$set": {"next_check_at": next_dt}})
+        _session_write(ops, s, {"$set": {"next_check_at": next_dt}})
         return
 
     try:
@@ -3751,25 +6241,70 @@ async def run_session_tick_for_doc(app: Application, s: Dict[str, Any]):
             reply_markup=kb,
             parse_mode="Markdown",
             related_session_id=str(s["_id"]),
+            idempotency_extra=f"nudge{nudges + 1}",
         )
-        if sent:
+        if sent == "duplicate":
+            # Nudge N went out on a pass whose write was lost (race, crash, lost lease): catch the count up.
+            _session_write(ops, s, {"$set": {"next_check_at": next_dt}, "$max": {"nudges_sent": nudges + 1}}, guarded=False)
+        elif sent:
             log_structured("session_nudge_sent", user_id=uid, session_id=str(s["_id"]), started=started, nudges_sent=nudges + 1)
-            sessions.update_one({"_id": s["_id"]}, {"$set": {"next_check_at": next_dt}, "$inc": {"nudges_sent": 1}})
+            _session_write(ops, s, {"$set": {"next_check_at": next_dt}, "$inc": {"nudges_sent": 1}})
         else:
-            sessions.update_one({"_id": s["_id"]}, {"$set": {"next_check_at": next_dt}})
+            _session_write(ops, s, {"$set": {"next_check_at": next_dt}})
     except Exception:
         logger.exception("Session tick failed for user_id=%s", uid)
 
-async def cron_sessions_tick(app: Application):
-    log_structured("cron_sessions_tick_start")
-    active = list(sessions.find({"state": "ACTIVE"}))
+async def cron_sessions_tick(app: Application, shard: tuple[int, int] | None = None):
+    log_structured("cron_sessions_tick_start", shard=shard_label(shard))
+    active = list(sessions.find({**due_sessions_query(now()), **shard_filter(shard)}, SESSION_TICK_PROJECTION))
+    # Sessions of one user are ticked in order; different users run concurrently.
+    by_user: Dict[int, list] = {}
     for s in active:
-        await run_session_tick_for_doc(app, s)
-    log_structured("cron_sessions_tick_finish", active_sessions=len(active))
+        by_user.setdefault(s["user_id"], []).append(s)
+    ops: list = []
+
+    async def tick_user(docs):
+        for s in docs:
+            await run_session_tick_for_doc(app, s, ops)
+
+    run = await fan_out("sessions_tick", list(by_user.values()), tick_user, describe=lambda docs: f"user_id={docs[0]['user_id']}")
+    if cron_lease_lost():
+        raise RuntimeError("lost the sessions lease; session writes dropped for the new holder to redo")
+    written = 0
+    if ops:
+        written = sessions.bulk_write(ops, ordered=False).modified_count
+        for s in active:
+            schedule_session_timer(s["_id"])
+    log_structured(
+        "cron_sessions_tick_finish",
+        shard=shard_label(shard),
+        due_sessions=len(active),
+        session_writes=written,
+        users=run["items"],
+        duration_sec=run["duration_sec"],
+        users_per_sec=run["items_per_sec"],
+        user_ms_p95=run["item_ms_p95"],
+        user_ms_p99=run["item_ms_p99"],
+    )
+    return {"shard": shard_label(shard), "due_sessions": len(active), "session_writes": written, "users": run["items"], "errors": run["errors"], "user_ms_p95": run["item_ms_p95"], "user_ms_p99": run["item_ms_p99"]}
 
 # Endpoint to trigger it (like your other cron endpoints)
 @app.get("/cron/sessions-tick")
 async def cron_sessions_tick_endpoint(request: Request):
     _check_cron_auth(request)
-    await cron_sessions_tick(tg_app)
-    return PlainTextResponse("sessions-tick-ok")
+    return await sharded_cron_response(request, "sessions_tick", lambda shard: cron_sessions_tick(tg_app, shard))
+
+@app.get("/cron/jobs")
+async def cron_jobs_endpoint(request: Request):
+    _check_cron_auth(request)
+    jobs = [cron_job_payload(job) for job in reversed(CRON_JOBS.values())]
+    leases = list(cron_leases.find({}))
+    return JSONResponse(jsonable_encoder({"running": dict(_CRON_RUNNING), "leases": leases, "lease_counters": CRON_LEASE_METRICS, "jobs": jobs}))
+
+@app.get("/cron/jobs/{job_id}")
+async def cron_job_status_endpoint(job_id: str, request: Request):
+    _check_cron_auth(request)
+    job = CRON_JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown cron job")
+    return JSONResponse(jsonable_encoder(cron_job_payload(job)))
@@ -2,6 +2,7 @@ import argparse
 import json
 import os
 import sys
+import time
 
 import requests
 
@@ -177,6 +178,23 @@ def get_summary(base_url: str, secret: str, hours: int, *, timeout: int = 180):
     return resp.json()
 
 
+def bench_ingestion(base_url: str, secret: str, count: int, *, timeout: int = 180):
+    """Compare the webhook queue with getUpdates batches, each timed server-side until every update was handled."""
+    first_id = 2_100_000_000 + int(time.time()) % 10_000_000 * 10
+    return post(base_url, "/dev/bench/ingestion", secret, {"count": count, "first_update_id": first_id}, timeout=timeout)
+
+
+def bench_send_smoothing(base_url: str, secret: str, count: int, *, tick_minutes: int | None = None, timeout: int = 180):
+    """Peak daily-loop sends per tick for ``count`` users sharing one loop hour, before and after jitter.
+
+    Without ``tick_minutes`` the server uses its real tick (1 with timers, CRON_DAILY_TICK_MIN without).
+    """
+    payload = {"users": count}
+    if tick_minutes:
+        payload["tick_minutes"] = tick_minutes
+    return post(base_url, "/dev/bench/send-smoothing", secret, payload, timeout=timeout)
+
+
 def set_clock(base_url: str, secret: str, iso_value: str | None = None, *, reset: bool = False, timeout: int = 180):
     payload = {"reset": bool(reset)}
     if iso_value:
@@ -335,6 +353,8 @@ def main():
     parser.add_argument("--live", action="store_true", help="Send scenario messages to your Telegram chat instead of suppressing them")
     parser.add_argument("--summary-hours", type=int, default=24)
     parser.add_argument("--timeout", type=int, default=180, help="Per-request HTTP timeout in seconds")
+    parser.add_argument("--bench-ingestion", type=int, metavar="N", help="Compare webhook and polling ingestion with N synthetic updates")
+    parser.add_argument("--bench-send-smoothing", type=int, metavar="N", help="Simulate peak daily-loop sends per minute for N users in one hour, with and without jitter")
     args = parser.parse_args()
 
     if args.list:
@@ -344,6 +364,14 @@ def main():
     if not args.secret:
         parser.error("--secret is required unless you are using --list")
 
+    if args.bench_ingestion:
+        print_section("Ingestion benchmark:", bench_ingestion(args.base_url, args.secret, args.bench_ingestion, timeout=args.timeout))
+        return
+
+    if args.bench_send_smoothing:
+        print_section("Send smoothing:", bench_send_smoothing(args.base_url, args.secret, args.bench_send_smoothing, timeout=args.timeout))
+        return
+
     if args.reset_clock or args.clock:
         data = set_clock(args.base_url, args.secret, args.clock, reset=bool(args.reset_clock), timeout=args.timeout)
         print_section("Clock:", data)
@@ -103,6 +103,7 @@ class BrobotScenarioTests(unittest.IsolatedAsyncioTestCase):
                     await bot.run_session_tick_for_doc(bot.tg_app, session_doc)
             elif scenario_name == "weekly_summary":
                 _run_weekly_summary(user_id)
+            await bot.flush_inline_outbox(user_id)
             return {
                 "ops_summary_24h": bot.ops_summary_payload(24, user_id=user_id),
                 "test_outbox": bot.get_test_outbox(user_id),
@@ -281,5 +282,994 @@ class BrobotControlLogicTests(unittest.TestCase):
         self.assertIn(intervention["action_offer"], {"replace_goal", "split_goal", "shrink_target", "next_visible_win"})
 
 
+class BrobotInstrumentationTests(unittest.TestCase):
+    def test_percentile_uses_nearest_rank(self):
+        samples = list(range(1, 101))
+        self.assertEqual(bot.percentile(samples, 50), 50)
+        self.assertEqual(bot.percentile(samples, 95), 95)
+        self.assertEqual(bot.percentile(samples, 99), 99)
+        self.assertIsNone(bot.percentile([], 50))
+
+    def test_llm_metrics_are_bounded_and_split_by_call_site(self):
+        call_site = "test_call_site"
+        bot.LLM_METRICS.pop(call_site, None)
+        try:
+            for idx in range(bot.LLM_METRICS_WINDOW + 25):
+                bot.record_llm_call(call_site, prompt_chars=100, response_chars=40, latency_ms=float(idx), error=idx == 0)
+            bot.record_llm_fallback(call_site)
+            payload = bot.llm_metrics_payload()["call_sites"][call_site]
+            self.assertEqual(payload["calls"], bot.LLM_METRICS_WINDOW + 25)
+            self.assertEqual(payload["samples"], bot.LLM_METRICS_WINDOW)
+            self.assertEqual(payload["errors"], 1)
+            self.assertEqual(payload["fallbacks"], 1)
+            self.assertGreaterEqual(payload["latency_ms"]["p50"], 25.0)
+            self.assertEqual(sum(payload["hourly_calls"].values()), bot.LLM_METRICS_WINDOW + 25)
+        finally:
+            bot.LLM_METRICS.pop(call_site, None)
+
+    def test_weekly_summary_batch_parse_keeps_only_valid_entries(self):
+        raw = (
+            "```json\n"
+            '{"101": "Four active days. Keep the 5-minute restart.", "102": "", "103": 7, "999": "stray"}\n'
+            "```"
+        )
+        parsed = bot.parse_weekly_summary_batch(raw, [101, 102, 103, 104])
+        self.assertEqual(parsed, {101: "Four active days. Keep the 5-minute restart."})
+        self.assertEqual(bot.parse_weekly_summary_batch("not json at all", [101]), {})
+
+    def test_llm_route_overrides_skip_malformed_entries(self):
+        routes = {"ai_reply": dict(bot.LLM_DEFAULT_ROUTE)}
+        bot.apply_llm_route_overrides(routes, '{"ai_reply": {"max_tokens": 50}, "x": 5, "new_site": {"model": "m"}}')
+        self.assertEqual(routes["ai_reply"]["max_tokens"], 50)
+        self.assertNotIn("x", routes)
+        self.assertEqual(routes["new_site"]["model"], "m")
+        self.assertEqual(routes["new_site"]["timeout_sec"], bot.LLM_DEFAULT_ROUTE["timeout_sec"])
+        self.assertEqual(bot.apply_llm_route_overrides(routes, "[1, 2]"), routes)
+        self.assertEqual(bot.apply_llm_route_overrides(routes, "{not json"), routes)
+
+
+class BrobotSingleFlightTests(unittest.IsolatedAsyncioTestCase):
+    USER_IDS = (9230001, 9230002, 9230003)
+
+    def setUp(self):
+        bot.memory.delete_many({"user_id": {"$in": list(self.USER_IDS)}})
+
+    def tearDown(self):
+        bot.memory.delete_many({"user_id": {"$in": list(self.USER_IDS)}})
+
+    async def test_same_intervention_tuple_shares_one_request(self):
+        prompts = []
+
+        async def cohere_chat_async(call_site, prompt):
+            prompts.append(prompt)
+            await bot.asyncio.sleep(0.05)
+            return f"Open {bot.INTERVENTION_GOAL_TOKEN} and write one line."
+
+        intervention = {"trigger": "midday_check", "mode": "starter", "blocker": "tired", "action_offer": "two_min", "action": "Write one line."}
+        goals = ("thesis", "gym plan", "taxes")
+        original = bot.cohere_chat_async
+        bot.cohere_chat_async = cohere_chat_async
+        before = dict(bot.LLM_SINGLE_FLIGHT_STATS)
+        job = {"counters": {}}
+        token = bot.CURRENT_CRON_JOB.set(job)
+        try:
+            texts = await bot.asyncio.gather(*[
+                bot.phrase_intervention_async(user_id, {**intervention, "goal": goal}) for user_id, goal in zip(self.USER_IDS, goals)
+            ])
+            repeat = await bot.phrase_intervention_async(self.USER_IDS[0], {**intervention, "goal": goals[0]})
+        finally:
+            bot.CURRENT_CRON_JOB.reset(token)
+            bot.cohere_chat_async = original
+        self.assertEqual(texts, [f"Open {goal} and write one line." for goal in goals])
+        self.assertEqual(job["counters"], {"llm_requests": 2, "llm_merged": 2})
+        self.assertEqual(bot.LLM_SINGLE_FLIGHT_STATS["repeats"] - before["repeats"], 1)
+        self.assertEqual(len(prompts), 3)
+        self.assertNotIn("thesis", prompts[0])
+        self.assertIn("thesis", prompts[2])
+        self.assertEqual(repeat, "Open thesis and write one line.")
+        self.assertEqual(bot._LLM_INFLIGHT, {})
+
+
+class BrobotOutboundDeliveryTests(unittest.IsolatedAsyncioTestCase):
+    async def test_retry_after_pauses_and_resends_through_queue(self):
+        sent = []
+
+        class _FlakyBot:
+            async def send_message(self, **kwargs):
+                if not sent:
+                    sent.append(None)
+                    raise bot.RetryAfter(1)
+                sent.append(kwargs["chat_id"])
+                return {"chat_id": kwargs["chat_id"], "text": kwargs["text"]}
+
+        before = dict(bot.OUTBOUND_METRICS)
+        bot.start_outbound_delivery()
+        try:
+            result = await bot.send_outbound_message(_FlakyBot(), "session_nudge", chat_id=9100001, text="hello")
+        finally:
+            await bot.stop_outbound_delivery()
+        self.assertEqual(result["chat_id"], 9100001)
+        self.assertEqual(sent, [None, 9100001])
+        self.assertEqual(bot.OUTBOUND_METRICS["retry_after"] - before["retry_after"], 1)
+        self.assertEqual(bot.OUTBOUND_METRICS["sent"] - before["sent"], 1)
+
+    async def test_higher_priority_messages_leave_the_queue_first(self):
+        order = []
+
+        class _RecordingBot:
+            async def send_message(self, **kwargs):
+                order.append(kwargs["text"])
+                return {}
+
+        recording_bot = _RecordingBot()
+        bot._OUTBOUND["queue"] = bot.asyncio.PriorityQueue()
+        pending = [
+            bot.asyncio.create_task(bot.send_outbound_message(recording_bot, message_type, chat_id=9100010 + idx, text=message_type))
+            for idx, message_type in enumerate(["weekly_summary", "intervention", "session_completion"])
+        ]
+        await bot.asyncio.sleep(0)
+        bot._OUTBOUND["workers"] = [bot.asyncio.create_task(bot._outbound_worker())]
+        try:
+            await bot.asyncio.gather(*pending)
+        finally:
+            await bot.stop_outbound_delivery()
+        self.assertEqual(order, ["session_completion", "intervention", "weekly_summary"])
+
+
+class BrobotFanOutTests(unittest.IsolatedAsyncioTestCase):
+    async def test_fan_out_bounds_concurrency_and_isolates_failures(self):
+        active = {"now": 0, "peak": 0}
+        done = []
+
+        async def worker(item):
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+            try:
+                await bot.asyncio.sleep(0.01)
+                if item == 3:
+                    raise RuntimeError("boom")
+                done.append(item)
+            finally:
+                active["now"] -= 1
+
+        stats = await bot.fan_out("test_fan_out", range(10), worker, concurrency=4)
+        self.assertEqual(active["peak"], 4)
+        self.assertEqual(sorted(done), [0, 1, 2, 4, 5, 6, 7, 8, 9])
+        self.assertEqual(stats["items"], 10)
+        self.assertEqual(stats["errors"], 1)
+        self.assertIsNotNone(stats["item_ms_p99"])
+
+
+class BrobotUserSerialTests(unittest.IsolatedAsyncioTestCase):
+    async def test_user_serial_orders_one_user_and_overlaps_others(self):
+        events = []
+
+        async def handle(user_id, tag, delay):
+            async with bot.user_serial(user_id):
+                events.append(("start", tag))
+                await bot.asyncio.sleep(delay)
+                events.append(("end", tag))
+
+        await bot.asyncio.gather(handle(9200001, "a1", 0.03), handle(9200001, "a2", 0.0), handle(9200002, "b1", 0.0))
+        self.assertLess(events.index(("end", "a1")), events.index(("start", "a2")))
+        self.assertLess(events.index(("start", "b1")), events.index(("end", "a1")))
+        self.assertNotIn(9200001, bot._USER_LOCKS)
+        self.assertNotIn(9200002, bot._USER_LOCKS)
+
+
+class BrobotCronJobTests(unittest.IsolatedAsyncioTestCase):
+    async def test_cron_job_guard_rejects_a_second_concurrent_run(self):
+        release = bot.asyncio.Event()
+
+        async def runner():
+            await release.wait()
+            return {"users": 0}
+
+        first, started = bot.start_cron_job("test_guard", runner)
+        second, started_again = bot.start_cron_job("test_guard", runner)
+        self.assertTrue(started)
+        self.assertFalse(started_again)
+        self.assertEqual(first["job_id"], second["job_id"])
+        release.set()
+        await bot._CRON_TASKS[first["job_id"]]
+        self.assertEqual(first["status"], "succeeded")
+        self.assertEqual(first["result"], {"users": 0})
+        self.assertNotIn("test_guard", bot._CRON_RUNNING)
+
+
+class BrobotCronRunLedgerTests(unittest.IsolatedAsyncioTestCase):
+    JOB = "test_ledger"
+
+    async def asyncSetUp(self):
+        bot.cron_runs.delete_many({"job": self.JOB})
+
+    async def asyncTearDown(self):
+        bot.cron_runs.delete_many({"job": self.JOB})
+
+    async def test_cron_run_is_recorded_with_counters_and_delta(self):
+        async def runner():
+            bot.count_cron_run("queued", 2)
+            bot.count_cron_run("sent", 2)
+            bot.count_cron_run("deferred")
+            return {"users_scanned": 5, "users": 3, "errors": 0, "user_ms_p95": 12.5}
+
+        for _ in range(2):
+            job, _started = bot.start_cron_job(self.JOB, runner, "render")
+            await bot._CRON_TASKS[job["job_id"]]
+        payload = bot.cron_runs_payload(self.JOB)
+        runs = payload["jobs"][self.JOB]["runs"]
+        self.assertEqual(len(runs), 2)
+        self.assertEqual((runs[0]["source"], runs[0]["queued"], runs[0]["sent"], runs[0]["deferred"], runs[0]["users_due"]), ("render", 2, 2, 1, 3))
+        self.assertEqual(runs[0]["delta"]["users_due"], 0)
+        self.assertNotIn("delta", runs[1])
+        self.assertEqual(payload["daily_plans_this_instance"]["instance_id"], bot.INSTANCE_ID)
+
+    def test_skipped_runs_do_not_crowd_out_the_limit(self):
+        started = bot.dt.datetime.now(bot.dt.timezone.utc)
+        bot.cron_runs.insert_many(
+            [{"job": self.JOB, "status": "succeeded", "started_at": started - bot.timedelta(minutes=10 + i), "duration_sec": 1.0} for i in range(2)]
+            + [{"job": self.JOB, "status": "skipped", "started_at": started - bot.timedelta(minutes=i)} for i in range(5)]
+        )
+        listed = bot.cron_runs_payload(self.JOB, limit=2)["jobs"][self.JOB]
+        self.assertEqual([run["status"] for run in listed["runs"]], ["succeeded", "succeeded"])
+        self.assertEqual(listed["skipped"], 5)
+
+
+class BrobotIngestionTests(unittest.IsolatedAsyncioTestCase):
+    FIRST_UPDATE_ID = 2_099_000_000
+
+    def setUp(self):
+        self.update_ids = []
+
+    def tearDown(self):
+        bot.processed_updates.delete_many({"_id": {"$in": self.update_ids}})
+        for update_id in self.update_ids:
+            bot._SEEN_UPDATE_IDS.pop(update_id, None)
+        # A stopped queue keeps turning updates away; later tests ingest inline as before startup.
+        bot._WEBHOOK["stopping"] = False
+
+    def _updates(self, start: int, count: int):
+        ids = [self.FIRST_UPDATE_ID + start + idx for idx in range(count)]
+        self.update_ids.extend(ids)
+        return [bot.Update.de_json({"update_id": update_id}, bot.tg_app.bot) for update_id in ids]
+
+    async def test_poll_loop_keeps_running_after_failures(self):
+        batch = self._updates(0, 2)
+        calls = []
+        idle = bot.asyncio.Event()
+
+        async def get_updates(**kwargs):
+            calls.append(kwargs["offset"])
+            if len(calls) == 1:
+                raise RuntimeError("network down")
+            if len(calls) == 2:
+                return batch
+            idle.set()
+            await bot.asyncio.Event().wait()
+
+        saved = []
+
+        def save_poll_offset(offset):
+            saved.append(offset)
+            raise bot.PyMongoError("offset write failed")
+
+        original_load, original_save = bot.load_poll_offset, bot.save_poll_offset
+        bot.load_poll_offset, bot.save_poll_offset = (lambda: None), save_poll_offset
+        task = bot.asyncio.create_task(bot._poll_updates_loop(get_updates))
+        try:
+            await bot.asyncio.wait_for(idle.wait(), timeout=10)
+        finally:
+            task.cancel()
+            await bot.asyncio.gather(task, return_exceptions=True)
+            bot.load_poll_offset, bot.save_poll_offset = original_load, original_save
+        self.assertEqual(calls[:2], [None, None])
+        self.assertEqual(calls[2], batch[-1].update_id + 1)
+        self.assertEqual(saved, [batch[-1].update_id + 1])
+
+    def _user_updates(self, start: int, user_id: int, count: int):
+        ids = [self.FIRST_UPDATE_ID + start + idx for idx in range(count)]
+        self.update_ids.extend(ids)
+        return [
+            bot.Update.de_json(
+                {
+                    "update_id": update_id,
+                    "message": {
+                        "message_id": update_id,
+                        "date": 0,
+                        "chat": {"id": user_id, "type": "private"},
+                        "from": {"id": user_id, "is_bot": False, "first_name": "Test"},
+                        "text": "hi",
+                    },
+                },
+                bot.tg_app.bot,
+            )
+            for update_id in ids
+        ]
+
+    async def _burst_does_not_starve_other_users(self, run):
+        busy, other = 9210001, 9210002
+        release, other_done = bot.asyncio.Event(), bot.asyncio.Event()
+        seen = []
+
+        async def process_update_timed(update):
+            seen.append(update.update_id)
+            if update.effective_user.id == busy:
+                await release.wait()
+            else:
+                other_done.set()
+
+        burst, lone = self._user_updates(100, busy, 5), self._user_updates(200, other, 1)
+        original = bot.process_update_timed
+        bot.process_update_timed = process_update_timed
+        try:
+            task = bot.asyncio.create_task(run(burst + lone))
+            await bot.asyncio.wait_for(other_done.wait(), timeout=5)
+            release.set()
+            await bot.asyncio.wait_for(task, timeout=5)
+        finally:
+            release.set()
+            bot.process_update_timed = original
+        self.assertEqual([update_id for update_id in seen if update_id != lone[0].update_id], [update.update_id for update in burst])
+
+    async def test_burst_from_one_user_leaves_webhook_workers_for_others(self):
+        original_workers = bot.WEBHOOK_WORKERS
+        bot.WEBHOOK_WORKERS = 2
+
+        async def run(updates):
+            bot.start_webhook_workers()
+            try:
+                for update in updates:
+                    self.assertEqual(await bot.ingest_webhook_update(update), "queued")
+                await bot._WEBHOOK["queue"].join()
+            finally:
+                await bot.stop_webhook_workers()
+
+        try:
+            await self._burst_does_not_starve_other_users(run)
+        finally:
+            bot.WEBHOOK_WORKERS = original_workers
+        self.assertEqual(bot._USER_BACKLOG, {})
+
+    async def test_burst_from_one_user_leaves_poll_slots_for_others(self):
+        await self._burst_does_not_starve_other_users(lambda updates: bot.process_update_batch(updates, concurrency=2))
+
+    async def test_updates_arriving_during_shutdown_are_turned_away(self):
+        first, late = self._updates(300, 2)
+        release = bot.asyncio.Event()
+        seen = []
+
+        async def process_update_timed(update):
+            seen.append(update.update_id)
+            await release.wait()
+
+        original = bot.process_update_timed
+        bot.process_update_timed = process_update_timed
+        try:
+            bot.start_webhook_workers()
+            self.assertEqual(await bot.ingest_webhook_update(first), "queued")
+            stopping = bot.asyncio.create_task(bot.stop_webhook_workers())
+            await bot.asyncio.sleep(0)
+            self.assertEqual(await bot.ingest_webhook_update(late), "stopping")
+            release.set()
+            await stopping
+            self.assertEqual(await bot.ingest_webhook_update(late), "stopping")
+        finally:
+            release.set()
+            bot.process_update_timed = original
+        self.assertEqual(seen, [first.update_id])
+        self.assertTrue(bot.claim_update(late.update_id))
+
+    async def test_bench_times_both_modes_until_processed(self):
+        before = bot.WEBHOOK_METRICS["received"]
+        webhook = await bot.bench_ingestion_mode("webhook", self._updates(10, 5))
+        polling = await bot.bench_ingestion_mode("polling", self._updates(20, 5))
+        self.assertEqual((webhook["mode"], webhook["updates"]), ("webhook", 5))
+        self.assertEqual((polling["mode"], polling["updates"]), ("polling", 5))
+        self.assertEqual(bot.WEBHOOK_METRICS["received"] - before, 5)
+        queue = bot._WEBHOOK["queue"]
+        self.assertTrue(queue is None or queue.qsize() == 0)
+        self.assertEqual(bot.processed_updates.count_documents({"_id": {"$in": self.update_ids}}), 0)
+        self.assertFalse(any(update_id in bot._SEEN_UPDATE_IDS for update_id in self.update_ids))
+
+    async def test_poll_loop_waits_for_the_poller_lease(self):
+        calls = []
+        polled = bot.asyncio.Event()
+
+        async def get_updates(**kwargs):
+            calls.append(kwargs["offset"])
+            polled.set()
+            await bot.asyncio.Event().wait()
+
+        bot.cron_leases.delete_one({"_id": bot.POLL_LEASE_ID})
+        self.assertTrue(bot.acquire_cron_lease(bot.POLL_LEASE_ID, "other-instance"))
+        original_load, original_check = bot.load_poll_offset, bot.POLL_LEASE_CHECK_SEC
+        bot.load_poll_offset, bot.POLL_LEASE_CHECK_SEC = (lambda: None), 0.05
+        task = bot.asyncio.create_task(bot._poll_updates_loop(get_updates))
+        try:
+            await bot.asyncio.sleep(0.2)
+            self.assertEqual(calls, [])
+            self.assertFalse(bot._POLLER["owner"])
+            bot.release_cron_lease(bot.POLL_LEASE_ID, "other-instance")
+            await bot.asyncio.wait_for(polled.wait(), timeout=5)
+            self.assertTrue(bot._POLLER["owner"])
+        finally:
+            task.cancel()
+            await bot.asyncio.gather(task, return_exceptions=True)
+            bot.load_poll_offset, bot.POLL_LEASE_CHECK_SEC = original_load, original_check
+        self.assertFalse(bot._POLLER["owner"])
+        self.assertIsNone(bot.cron_leases.find_one({"_id": bot.POLL_LEASE_ID}))
+
+
+class BrobotUpdateDedupeTests(unittest.TestCase):
+    def setUp(self):
+        self.update_id = 990000000 + bot.random.randint(0, 999999)
+        bot.processed_updates.delete_one({"_id": self.update_id})
+        bot._SEEN_UPDATE_IDS.pop(self.update_id, None)
+
+    def tearDown(self):
+        bot.processed_updates.delete_one({"_id": self.update_id})
+        bot._SEEN_UPDATE_IDS.pop(self.update_id, None)
+
+    def test_redelivered_update_is_dropped_from_memory_and_store(self):
+        before = dict(bot.UPDATE_DEDUPE_METRICS)
+        self.assertTrue(bot.claim_update(self.update_id))
+        self.assertFalse(bot.claim_update(self.update_id))
+        bot._SEEN_UPDATE_IDS.pop(self.update_id, None)
+        self.assertFalse(bot.claim_update(self.update_id))
+        self.assertEqual(bot.UPDATE_DEDUPE_METRICS["duplicate_memory"] - before["duplicate_memory"], 1)
+        self.assertEqual(bot.UPDATE_DEDUPE_METRICS["duplicate_store"] - before["duplicate_store"], 1)
+
+    def test_released_update_can_be_claimed_again(self):
+        self.assertTrue(bot.claim_update(self.update_id))
+        bot.release_update(self.update_id)
+        self.assertTrue(bot.claim_update(self.update_id))
+
+
+class BrobotSendSmoothingTests(unittest.TestCase):
+    def setUp(self):
+        self.timers, self.tick = bot.TIMER_SERVICE_ENABLED, bot.CRON_DAILY_TICK_MIN
+
+    def tearDown(self):
+        bot.TIMER_SERVICE_ENABLED, bot.CRON_DAILY_TICK_MIN = self.timers, self.tick
+
+    def test_jitter_is_stable_and_flattens_the_hourly_peak(self):
+        bot.TIMER_SERVICE_ENABLED = True
+        self.assertEqual(bot.loop_jitter_minute(810295446), bot.loop_jitter_minute(810295446))
+        report = bot.simulate_send_smoothing(range(500_000_000, 500_010_000))
+        self.assertEqual(report["tick_minutes"], 1)
+        self.assertEqual(report["peak_per_tick_before"], 10_000)
+        self.assertEqual(report["busy_ticks_after"], bot.DAILY_LOOP_JITTER_MIN)
+        self.assertEqual(report["max_delay_min_after"], 0)
+        self.assertLess(report["peak_per_tick_after"], 2 * 10_000 / bot.DAILY_LOOP_JITTER_MIN)
+
+    def test_without_timers_jitter_snaps_to_the_cron_tick(self):
+        bot.TIMER_SERVICE_ENABLED = False
+        bot.CRON_DAILY_TICK_MIN = 15
+        report = bot.simulate_send_smoothing(range(500_000_000, 500_010_000))
+        self.assertEqual((report["tick_minutes"], report["max_delay_min_after"]), (15, 0))
+        self.assertEqual(report["busy_ticks_after"], -(-bot.DAILY_LOOP_JITTER_MIN // 15))
+        self.assertEqual(bot.loop_jitter_for_profile(1, {"loop_jitter_minute": 44}), 30)
+        bot.CRON_DAILY_TICK_MIN = 60
+        self.assertEqual(bot.simulate_send_smoothing(range(500_000_000, 500_001_000))["busy_ticks_after"], 1)
+
+
+class BrobotWeeklyCohortTests(unittest.TestCase):
+    def test_weekly_facts_are_built_from_plain_records(self):
+        facts = bot.build_weekly_summary_facts(
+            [{"status": "done", "selected_goal": "thesis"}, {"status": "partial"}, {"status": "skipped"}],
+            [{"kind": "loop_status", "data": {"status": "missed"}}, {"kind": "loop_status", "data": {"status": "missed"}}],
+            [{"blocker": "tired", "progress_occurred": True, "mode": "tiny_step"}],
+            {"evening": 3},
+        )
+        self.assertEqual(facts["days_active"], 2)
+        self.assertEqual(facts["key_wins"], ["thesis"])
+        self.assertEqual(facts["main_blocker_pattern"], "missed")
+        self.assertEqual(facts["what_worked"], "tiny_step")
+        self.assertEqual(facts["top_slump_hour"], "evening")
+        self.assertEqual(facts["effective_style"], "tiny_step")
+
+    def test_cohort_is_due_only_on_local_monday_morning(self):
+        hour = bot.WEEKLY_SUMMARY_LOCAL_HOUR
+        monday = bot.dt.datetime(2026, 10, 19, hour, 30, tzinfo=bot.ZoneInfo("Asia/Tokyo")).astimezone(bot.dt.timezone.utc)
+        self.assertEqual(bot.weekly_cohort_week("Asia/Tokyo", monday), "2026-W43")
+        self.assertIsNone(bot.weekly_cohort_week("America/Toronto", monday))
+        self.assertIsNone(bot.weekly_cohort_week("Asia/Tokyo", monday - bot.timedelta(hours=1)))
+
+
+class BrobotWeeklySummaryAttemptTests(unittest.IsolatedAsyncioTestCase):
+    USER_IDS = (980_296_900, 980_296_901)
+    WEEK = "2026-W43"
+
+    def setUp(self):
+        bot.users.delete_many({"user_id": {"$in": list(self.USER_IDS)}})
+        bot.users.insert_many([{"user_id": uid, "name": f"weekly-{uid}"} for uid in self.USER_IDS])
+
+    def tearDown(self):
+        bot.users.delete_many({"user_id": {"$in": list(self.USER_IDS)}})
+        bot.memory.delete_many({"user_id": {"$in": list(self.USER_IDS)}})
+        bot.logs.delete_many({"user_id": {"$in": list(self.USER_IDS)}})
+
+    async def test_blocked_user_is_not_rephrased_every_tick(self):
+        blocked, flaky = self.USER_IDS
+        phrased = []
+
+        async def phrase_weekly_summaries_batch(facts_by_user):
+            phrased.append(sorted(facts_by_user))
+            return {uid: "Weekly summary." for uid in facts_by_user}
+
+        async def deliver_message(bot_, user_id, **kwargs):
+            if user_id == blocked:
+                raise bot.Forbidden("Forbidden: bot was blocked by the user")
+            raise RuntimeError("network blip")
+
+        originals = bot.phrase_weekly_summaries_batch, bot.deliver_message
+        bot.phrase_weekly_summaries_batch, bot.deliver_message = phrase_weekly_summaries_batch, deliver_message
+        try:
+            await bot.send_weekly_summary_batch(bot.tg_app, {uid: {"days_active": 1} for uid in self.USER_IDS}, self.WEEK)
+        finally:
+            bot.phrase_weekly_summaries_batch, bot.deliver_message = originals
+        self.assertEqual(phrased, [sorted(self.USER_IDS)])
+        docs = {doc["user_id"]: doc for doc in bot.users.find({"user_id": {"$in": list(self.USER_IDS)}})}
+        self.assertEqual(docs[blocked].get("weekly_summary_attempted_week"), self.WEEK)
+        self.assertNotIn("weekly_summary_attempted_week", docs[flaky])
+        self.assertNotIn("weekly_summary_week", docs[blocked])
+
+
+class BrobotCronLeaseTests(unittest.TestCase):
+    LEASE = "test_lease"
+
+    def setUp(self):
+        bot.cron_leases.delete_many({"_id": {"$regex": f"^{self.LEASE}"}})
+
+    def tearDown(self):
+        bot.cron_leases.delete_many({"_id": {"$regex": f"^{self.LEASE}"}})
+
+    def test_second_owner_is_refused_until_release_or_expiry(self):
+        self.assertTrue(bot.acquire_cron_lease(self.LEASE, "owner-a"))
+        self.assertFalse(bot.acquire_cron_lease(self.LEASE, "owner-b"))
+        self.assertTrue(bot.renew_cron_lease(self.LEASE, "owner-a"))
+        bot.cron_leases.update_one({"_id": self.LEASE}, {"$set": {"expires_at": bot.dt.datetime.now(bot.dt.timezone.utc) - bot.timedelta(seconds=1)}})
+        self.assertTrue(bot.acquire_cron_lease(self.LEASE, "owner-b"))
+        self.assertFalse(bot.renew_cron_lease(self.LEASE, "owner-a"))
+
+    def test_follow_up_requests_collapse_into_one(self):
+        self.assertTrue(bot.acquire_cron_lease(self.LEASE, "owner-a"))
+        bot.request_cron_follow_up(self.LEASE)
+        bot.request_cron_follow_up(self.LEASE)
+        self.assertTrue(bot.take_cron_follow_up(self.LEASE, "owner-a"))
+        self.assertFalse(bot.take_cron_follow_up(self.LEASE, "owner-a"))
+
+    def test_runs_in_another_sharding_mode_conflict(self):
+        sharded = bot.shard_job_name(self.LEASE, (0, 2))
+        self.assertTrue(bot.acquire_cron_lease(sharded, "owner-a"))
+        self.assertEqual(bot.conflicting_cron_leases(self.LEASE), [sharded])
+        self.assertEqual(bot.conflicting_cron_leases(bot.shard_job_name(self.LEASE, (0, 3))), [sharded])
+        self.assertEqual(bot.conflicting_cron_leases(bot.shard_job_name(self.LEASE, (1, 2))), [])
+
+    def test_shards_partition_users_without_overlap(self):
+        user_ids = [980_297_000 + offset for offset in range(12)]
+        bot.users.delete_many({"user_id": {"$in": user_ids}})
+        bot.users.insert_many([{"user_id": uid, "name": f"shard-{uid}"} for uid in user_ids])
+        try:
+            slices = [
+                {doc["user_id"] for doc in bot.users.find({"user_id": {"$in": user_ids}, **bot.shard_filter((index, 3))})}
+                for index in range(3)
+            ]
+        finally:
+            bot.users.delete_many({"user_id": {"$in": user_ids}})
+        self.assertEqual(set().union(*slices), set(user_ids))
+        self.assertEqual(sum(len(part) for part in slices), len(user_ids))
+        self.assertEqual(bot.shard_filter((0, 1)), {})
+        self.assertEqual(bot.shard_job_name("daily", (1, 3)), "daily:shard1of3")
+
+
+class BrobotCronCursorTests(unittest.TestCase):
+    def test_cursor_query_resumes_after_checkpoint_within_shard(self):
+        sharded = bot.due_user_query((1, 3))
+        self.assertIs(bot._after_user_id(sharded, None), sharded)
+        resumed = bot._after_user_id(sharded, 42)
+        self.assertEqual(resumed["user_id"]["$gt"], 42)
+        self.assertEqual(resumed["user_id"]["$mod"], [3, 1])
+
+
+class BrobotDailyLoopBudgetTests(unittest.IsolatedAsyncioTestCase):
+    USER_IDS = [980_296_700, 980_296_701, 980_296_702]
+    SHARD = (7, 9)
+
+    async def asyncSetUp(self):
+        self.cursor_id = f"cron_cursor:{bot.shard_job_name('daily', self.SHARD)}"
+        bot.system_state.delete_one({"_id": self.cursor_id})
+        bot.users.delete_many({"user_id": {"$in": self.USER_IDS}})
+        bot.users.insert_many([{"user_id": uid, "name": f"budget-{uid}"} for uid in self.USER_IDS])
+        self.originals = bot.due_user_query, bot.run_daily_loop_for_user, bot.CRON_CHUNK_SIZE
+        self.visited = []
+
+        async def run_daily_loop_for_user(app, uid):
+            self.visited.append(uid)
+            await bot.asyncio.sleep(0.1)
+
+        bot.due_user_query = lambda shard=None: {"user_id": {"$in": self.USER_IDS}}
+        bot.run_daily_loop_for_user = run_daily_loop_for_user
+        bot.CRON_CHUNK_SIZE = 2
+
+    async def asyncTearDown(self):
+        bot.due_user_query, bot.run_daily_loop_for_user, bot.CRON_CHUNK_SIZE = self.originals
+        bot.users.delete_many({"user_id": {"$in": self.USER_IDS}})
+        bot.system_state.delete_one({"_id": self.cursor_id})
+
+    async def test_budget_stops_checkpoints_resumes_and_resets(self):
+        first = await bot.run_daily_loop_service(bot.tg_app, self.SHARD, budget_sec=0.05)
+        self.assertEqual(self.visited, self.USER_IDS[:2])
+        self.assertEqual((first["pass_complete"], first["resumed_from"], first["runs_this_pass"], first["scanned"]), (False, None, 1, 2))
+        self.assertIsNone(first["remaining"])
+        self.assertEqual(bot.system_state.find_one({"_id": self.cursor_id})["last_user_id"], self.USER_IDS[1])
+
+        second = await bot.run_daily_loop_service(bot.tg_app, self.SHARD, budget_sec=0.05)
+        self.assertEqual(self.visited, self.USER_IDS)
+        self.assertEqual((second["pass_complete"], second["resumed_from"], second["runs_this_pass"], second["remaining"]), (True, self.USER_IDS[1], 2, 0))
+        cursor = bot.system_state.find_one({"_id": self.cursor_id})
+        self.assertIsNone(cursor["last_user_id"])
+        self.assertEqual((cursor["runs_this_pass"], cursor["last_pass_runs"], cursor["last_pass_scanned"]), (0, 2, 3))
+
+        third = await bot.run_daily_loop_service(bot.tg_app, self.SHARD, budget_sec=0.05)
+        self.assertEqual(self.visited[3:], self.USER_IDS[:2])
+        self.assertEqual((third["resumed_from"], third["remaining"]), (None, 1))
+
+
+class BrobotCronLeaseLossTests(unittest.IsolatedAsyncioTestCase):
+    LEASE = "test_lease_loss"
+
+    async def asyncSetUp(self):
+        bot.cron_leases.delete_one({"_id": self.LEASE})
+        self.ttl = bot.CRON_LEASE_TTL_SEC
+        bot.CRON_LEASE_TTL_SEC = 0.15
+
+    async def asyncTearDown(self):
+        bot.CRON_LEASE_TTL_SEC = self.ttl
+        bot.cron_leases.delete_one({"_id": self.LEASE})
+
+    async def test_run_stops_taking_work_once_the_lease_is_taken_over(self):
+        done = []
+
+        async def work(item):
+            done.append(item)
+
+        async with bot.cron_lease(self.LEASE, "owner-a") as held:
+            self.assertTrue(held)
+            self.assertFalse(bot.cron_lease_lost())
+            bot.cron_leases.update_one({"_id": self.LEASE}, {"$set": {"owner": "owner-b"}})
+            await bot.asyncio.sleep(0.2)
+            self.assertTrue(bot.cron_lease_lost())
+            run = await bot.fan_out("lease_loss", [1, 2, 3], work)
+        self.assertEqual(done, [])
+        self.assertEqual((run["items"], run["skipped"]), (0, 3))
+        self.assertFalse(bot.cron_lease_lost())
+        self.assertEqual(bot.cron_leases.find_one({"_id": self.LEASE})["owner"], "owner-b")
+
+
+class BrobotOutboxTests(unittest.IsolatedAsyncioTestCase):
+    USER_ID = 980_296_100
+
+    async def asyncTearDown(self):
+        await bot.flush_inline_outbox()
+        bot.clear_test_mode()
+        bot.set_test_clock(None)
+
+    async def test_rerun_after_interrupted_pass_does_not_resend(self):
+        scenario = "fresh_morning"
+        bot.clear_test_outbox(self.USER_ID)
+        bot.set_test_clock(dev_scenarios.SCENARIO_DEFS[scenario]["clock"])
+        bot.set_test_mode(suppress_telegram=True, scenario=scenario, user_id=self.USER_ID)
+        bot.seed_scenario(self.USER_ID, scenario, reset=True)
+        await bot.run_daily_loop_for_user(bot.tg_app, self.USER_ID)
+        # Simulate a crash between the send and the intention update.
+        bot.daily_intentions.update_one(
+            {"user_id": self.USER_ID, "date": bot.today_key_for_user(self.USER_ID)},
+            {"$unset": {"morning_prompt_sent_at": ""}},
+        )
+        await bot.run_daily_loop_for_user(bot.tg_app, self.USER_ID)
+        await bot.flush_inline_outbox(self.USER_ID)
+
+        prompts = [m for m in bot.get_test_outbox(self.USER_ID) if m["message_type"] == "morning_prompt"]
+        self.assertEqual(len(prompts), 1)
+        items = list(bot.outbox.find({"user_id": self.USER_ID}))
+        self.assertEqual(len(items), 1)
+        self.assertEqual(items[0]["status"], "sent")
+        self.assertIsNotNone(bot.get_today_intention(self.USER_ID).get("morning_prompt_sent_at"))
+
+    async def test_worker_merges_pending_daily_loop_messages_for_one_user(self):
+        bot.clear_test_outbox(self.USER_ID)
+        bot.outbox.delete_many({"user_id": self.USER_ID})
+        bot.set_test_mode(suppress_telegram=True, scenario="outbox_merge", user_id=self.USER_ID)
+        prompt, _ = bot.enqueue_outbox(self.USER_ID, f"{self.USER_ID}:merge:morning", text="Morning check.", message_type="morning_prompt", phase="morning", reply_markup=bot.morning_anchor_buttons())
+        nudge, _ = bot.enqueue_outbox(self.USER_ID, f"{self.USER_ID}:merge:intervention", text="Start with two minutes.", message_type="intervention", phase="intervention")
+        items = [bot._claim_outbox_item({"_id": prompt["_id"]}), bot._claim_outbox_item({"_id": nudge["_id"]})]
+
+        sent = await bot.deliver_outbox_for_user(bot.tg_app.bot, items)
+
+        self.assertEqual(sent, 2)
+        captured = bot.get_test_outbox(self.USER_ID)
+        self.assertEqual(len(captured), 1)
+        self.assertEqual(captured[0]["text"], "Start with two minutes.\n\nMorning check.")
+        stored = list(bot.outbox.find({"user_id": self.USER_ID}))
+        self.assertEqual({doc["status"] for doc in stored}, {"sent"})
+        self.assertEqual({doc["merged_into"] for doc in stored}, {nudge["idempotency_key"]})
+        bot.outbox.delete_many({"user_id": self.USER_ID})
+
+    async def test_inline_sends_inside_the_merge_window_go_out_as_one_message(self):
+        user_id = self.USER_ID + 1
+        bot.reset_user_test_data(user_id)
+        bot.clear_test_outbox(user_id)
+        bot.set_test_mode(suppress_telegram=True, scenario="outbox_merge", user_id=user_id)
+        original_window = bot.OUTBOX_MERGE_WINDOW_SEC
+        bot.OUTBOX_MERGE_WINDOW_SEC = 0.2
+        try:
+            first = await bot.send_proactive_message(bot.tg_app, user_id, text="Start with two minutes.", message_type="intervention", phase="intervention", trigger="merge_window")
+            second = await bot.send_proactive_message(bot.tg_app, user_id, text="Morning check.", message_type="morning_prompt", phase="morning", reply_markup=bot.morning_anchor_buttons())
+            self.assertEqual((first, second), (True, True))
+            self.assertEqual(bot.get_test_outbox(user_id), [])
+            self.assertEqual(bot.outbox.count_documents({"user_id": user_id, "next_attempt_at": {"$lte": bot.dt.datetime.now(bot.dt.timezone.utc)}}), 0)
+            await bot._INLINE_HOLDS[user_id]["task"]
+        finally:
+            bot.OUTBOX_MERGE_WINDOW_SEC = original_window
+        captured = bot.get_test_outbox(user_id)
+        self.assertEqual([message["text"] for message in captured], ["Start with two minutes.\n\nMorning check."])
+        self.assertEqual({doc["status"] for doc in bot.outbox.find({"user_id": user_id})}, {"sent"})
+        self.assertNotIn(user_id, bot._INLINE_HOLDS)
+        bot.reset_user_test_data(user_id)
+
+    def test_merge_rules_group_daily_loop_messages_but_not_session_messages(self):
+        base = bot.dt.datetime(2026, 4, 7, tzinfo=bot.dt.timezone.utc)
+
+        def item(message_type, minute, parse_mode=None):
+            return {"message_type": message_type, "created_at": base + bot.timedelta(minutes=minute), "parse_mode": parse_mode}
+
+        groups = bot.group_outbox_items([
+            item("morning_prompt", 1),
+            item("intervention", 2),
+            item("session_nudge", 3, "Markdown"),
+            item("session_nudge", 4, "Markdown"),
+        ])
+        self.assertEqual(
+            [[entry["message_type"] for entry in group] for group in groups],
+            [["intervention", "morning_prompt"], ["session_nudge"], ["session_nudge"]],
+        )
+
+
+class BrobotNextDueTests(unittest.IsolatedAsyncioTestCase):
+    USER_ID = 980_296_200
+
+    async def asyncTearDown(self):
+        await bot.flush_inline_outbox()
+        bot.clear_test_mode()
+        bot.set_test_clock(None)
+
+    async def test_loop_pass_schedules_next_due_and_inputs_invalidate_it(self):
+        scenario = "fresh_morning"
+        bot.set_test_clock(dev_scenarios.SCENARIO_DEFS[scenario]["clock"])
+        bot.set_test_mode(suppress_telegram=True, scenario=scenario, user_id=self.USER_ID)
+        bot.seed_scenario(self.USER_ID, scenario, reset=True)
+        await bot.run_daily_loop_for_user(bot.tg_app, self.USER_ID)
+
+        morning_sent_at = bot.ensure_aware(bot.get_today_intention(self.USER_ID)["morning_prompt_sent_at"])
+        next_due = bot.ensure_aware(bot.users.find_one({"user_id": self.USER_ID})["next_due_at"])
+        self.assertGreater(next_due, bot.current_utc_now())
+        self.assertLessEqual(next_due, morning_sent_at + bot.timedelta(hours=2))
+
+        bot.upsert_today_intention(self.USER_ID, target="ship the draft")
+        next_due = bot.ensure_aware(bot.users.find_one({"user_id": self.USER_ID})["next_due_at"])
+        self.assertLessEqual(next_due, bot.current_utc_now())
+
+    async def test_outcome_stats_leave_the_schedule_alone(self):
+        user_id = self.USER_ID + 3
+        bot.reset_user_test_data(user_id)
+        bot.seed_test_user(user_id)
+        try:
+            later = bot.ensure_aware(bot.current_utc_now() + bot.timedelta(hours=6)).replace(microsecond=0)
+            bot.users.update_one({"user_id": user_id}, {"$set": {"next_due_at": later}})
+            bot.record_outcome(user_id, {"outcome_type": "button_tap", "message_type": "morning_prompt", "phase": "morning"})
+            bot.update_control_stat(user_id, "timing_hour", "morning:9", attempts_delta=1, successes_delta=1, mark_used=True)
+            bot.increment_memory_counter(user_id, "time_of_day_slumps", "8")
+            self.assertEqual(bot.ensure_aware(bot.users.find_one({"user_id": user_id})["next_due_at"]), later)
+        finally:
+            bot.reset_user_test_data(user_id)
+
+
+class BrobotDailyPlanTests(unittest.TestCase):
+    USER_ID = 980_296_220
+
+    def test_daily_plan_is_cached_per_day_and_dropped_on_timing_changes(self):
+        user_id = self.USER_ID
+        bot.reset_user_test_data(user_id)
+        bot.seed_test_user(user_id)
+        try:
+            plan = bot.daily_plan_for_user(user_id)
+            self.assertEqual((plan["morning"], plan["minute"]), (bot.daily_loop_hours_for_user(user_id)["morning"], 0))
+            self.assertEqual(plan["current_goal"]["goal"], "optimization-of-brobot")
+            self.assertEqual(bot.daily_plan_for_user(user_id)["built_at"], plan["built_at"])
+            bot.upsert_today_intention(user_id, target="ship the draft")
+            self.assertEqual(bot.daily_plans.count_documents({"user_id": user_id}), 1)
+            bot.set_profile_fields(user_id, loop_anchor_hour=7)
+            self.assertEqual(bot.daily_plans.count_documents({"user_id": user_id}), 0)
+            self.assertEqual(bot.daily_plan_for_user(user_id)["morning"], bot.daily_loop_hours_for_user(user_id)["morning"])
+            bot.increment_memory_counter(user_id, "time_of_day_activity", "9")
+            bot.update_control_stat(user_id, "timing_hour", "morning:9", attempts_delta=1, successes_delta=1, mark_used=True)
+            bot.increment_memory_counter(user_id, "time_of_day_slumps", "9")
+            self.assertEqual(bot.daily_plans.count_documents({"user_id": user_id}), 1)
+        finally:
+            bot.reset_user_test_data(user_id)
+
+
+class BrobotSessionTickTests(unittest.IsolatedAsyncioTestCase):
+    USER_ID = 980_296_230
+
+    async def asyncTearDown(self):
+        bot.sessions.delete_many({"user_id": self.USER_ID})
+        bot.outbox.delete_many({"user_id": self.USER_ID})
+        bot.clear_test_mode()
+
+    def test_due_sessions_query_skips_sessions_not_yet_due(self):
+        user_id = self.USER_ID
+        bot.sessions.delete_many({"user_id": user_id})
+        current = bot.now()
+        later = current + bot.timedelta(minutes=30)
+        base = {"user_id": user_id, "state": "ACTIVE", "goal": "write", "asked_completion": False, "nudges_enabled": True}
+        waiting = bot.sessions.insert_one({**base, "next_check_at": later, "ends_at": later}).inserted_id
+        nudge_due = bot.sessions.insert_one({**base, "next_check_at": current - bot.timedelta(minutes=1), "ends_at": later}).inserted_id
+        ended = bot.sessions.insert_one({**base, "next_check_at": later, "ends_at": current - bot.timedelta(minutes=1)}).inserted_id
+        try:
+            query = {**bot.due_sessions_query(current), "user_id": user_id}
+            found = {doc["_id"] for doc in bot.sessions.find(query, bot.SESSION_TICK_PROJECTION)}
+        finally:
+            bot.sessions.delete_many({"user_id": user_id})
+        self.assertEqual(found, {nudge_due, ended})
+        self.assertNotIn(waiting, found)
+
+    async def test_stale_tick_write_does_not_overwrite_a_callback(self):
+        bot.set_test_mode(suppress_telegram=True, scenario="session_tick", user_id=self.USER_ID)
+        current = bot.now()
+        session_id = bot.sessions.insert_one({
+            "user_id": self.USER_ID,
+            "state": "ACTIVE",
+            "goal": "write",
+            "asked_completion": False,
+            "nudges_enabled": True,
+            "nudges_sent": 0,
+            "next_check_at": current - bot.timedelta(minutes=1),
+            "ends_at": current + bot.timedelta(minutes=30),
+        }).inserted_id
+        ops = []
+        await bot.run_session_tick_for_doc(bot.tg_app, bot.sessions.find_one({"_id": session_id}, bot.SESSION_TICK_PROJECTION), ops)
+        self.assertEqual(len(ops), 1)
+        # sess:start_yes lands between the tick and the cron run's bulk_write.
+        callback_check = current + bot.timedelta(minutes=20)
+        bot.sessions.update_one({"_id": session_id}, {"$set": {"started_confirmed": True, "next_check_at": callback_check}})
+
+        self.assertEqual(bot.sessions.bulk_write(ops, ordered=False).modified_count, 0)
+        doc = bot.sessions.find_one({"_id": session_id})
+        self.assertEqual(doc["nudges_sent"], 0)
+        self.assertLess(abs((bot.ensure_aware(doc["next_check_at"]) - callback_check).total_seconds()), 1)
+
+        # When the callback's check comes due, the next tick finds nudge1 already queued and moves on from it.
+        bot.sessions.update_one({"_id": session_id}, {"$set": {"next_check_at": current - bot.timedelta(seconds=1)}})
+        await bot.run_session_tick_for_doc(bot.tg_app, bot.sessions.find_one({"_id": session_id}, bot.SESSION_TICK_PROJECTION))
+        doc = bot.sessions.find_one({"_id": session_id})
+        self.assertEqual(doc["nudges_sent"], 1)
+        self.assertGreater(bot.ensure_aware(doc["next_check_at"]), current)
+
+
+class BrobotTimerServiceTests(unittest.IsolatedAsyncioTestCase):
+    USER_ID = 980_296_250
+
+    async def asyncSetUp(self):
+        bot.cron_leases.delete_one({"_id": bot.TIMER_LEASE_ID})
+        bot.reset_user_test_data(self.USER_ID)
+        bot.seed_test_user(self.USER_ID)
+
+    async def asyncTearDown(self):
+        bot.cron_leases.delete_one({"_id": bot.TIMER_LEASE_ID})
+        bot.reset_user_test_data(self.USER_ID)
+        bot.clear_test_mode()
+        bot.set_test_clock(None)
+
+    def test_only_one_instance_holds_the_timer_lease(self):
+        self.assertTrue(bot.hold_timer_lease("instance-a", False))
+        self.assertFalse(bot.hold_timer_lease("instance-b", False))
+        self.assertTrue(bot.hold_timer_lease("instance-a", True))
+        self.assertFalse(bot.hold_timer_lease("instance-b", True))
+
+    def test_timer_times_follow_the_wall_clock_under_a_dev_clock(self):
+        bot.set_test_clock("2026-04-07T06:00:00+00:00")
+        run_at = bot.timer_wall_clock(bot.current_utc_now() + bot.timedelta(minutes=10))
+        expected = bot.dt.datetime.now(bot.dt.timezone.utc) + bot.timedelta(minutes=10)
+        self.assertLess(abs((run_at - expected).total_seconds()), 5)
+        past = bot.timer_wall_clock(bot.current_utc_now() - bot.timedelta(hours=1))
+        self.assertLessEqual(past, bot.dt.datetime.now(bot.dt.timezone.utc))
+
+    async def test_daily_loop_timer_waits_for_the_users_updates(self):
+        calls = []
+        original = bot.run_daily_loop_for_user
+
+        async def record(app, uid):
+            calls.append(uid)
+
+        bot.run_daily_loop_for_user = record
+        try:
+            async with bot.user_serial(self.USER_ID):
+                fire = bot.asyncio.create_task(bot.fire_daily_loop_timer(self.USER_ID, bot.dt.datetime.now(bot.dt.timezone.utc).isoformat()))
+                await bot.asyncio.sleep(0.05)
+                self.assertEqual(calls, [])
+            await fire
+        finally:
+            bot.run_daily_loop_for_user = original
+        self.assertEqual(calls, [self.USER_ID])
+
+    async def test_duplicate_nudge_catches_the_count_up_once(self):
+        bot.set_test_mode(suppress_telegram=True, scenario="timer_duplicate", user_id=self.USER_ID)
+        current = bot.now()
+        session_id = bot.sessions.insert_one({
+            "user_id": self.USER_ID,
+            "state": "ACTIVE",
+            "goal": "write",
+            "asked_completion": False,
+            "nudges_enabled": True,
+            "nudges_sent": 0,
+            "next_check_at": current - bot.timedelta(minutes=1),
+            "ends_at": current + bot.timedelta(minutes=30),
+        }).inserted_id
+        key = bot.outbox_key(
+            self.USER_ID,
+            bot.local_now_for_user(self.USER_ID).date().isoformat(),
+            phase="focus",
+            trigger="session_nudge",
+            related_session_id=str(session_id),
+            extra="nudge1",
+        )
+        bot.enqueue_outbox(self.USER_ID, key, text="nudge", message_type="session_nudge", phase="focus")
+        try:
+            stale = bot.sessions.find_one({"_id": session_id})
+            # The timer and a cron tick both saw nudges_sent=0 and found nudge1 already queued.
+            await bot.run_session_tick_for_doc(bot.tg_app, stale)
+            await bot.run_session_tick_for_doc(bot.tg_app, stale)
+            doc = bot.sessions.find_one({"_id": session_id})
+        finally:
+            bot.outbox.delete_many({"user_id": self.USER_ID})
+            bot.sessions.delete_many({"user_id": self.USER_ID})
+        self.assertEqual(doc["nudges_sent"], 1)
+        self.assertGreater(bot.ensure_aware(doc["next_check_at"]), current)
+
+
+class BrobotEditCacheTests(unittest.IsolatedAsyncioTestCase):
+    async def test_edit_is_skipped_only_when_the_callback_message_already_matches(self):
+        edits = []
+        markup = bot.InlineKeyboardMarkup([[bot.InlineKeyboardButton("Go", callback_data="noop")]])
+
+        class _Message:
+            chat_id = 9300001
+            message_id = 42
+
+            def __init__(self, text, reply_markup):
+                self.text = text
+                self.reply_markup = reply_markup
+
+        class _Query:
+            def __init__(self, message):
+                self.message = message
+
+            async def edit_message_text(self, **kwargs):
+                edits.append(kwargs)
+
+            async def answer(self, *args, **kwargs):
+                raise AssertionError("no-op edits must not answer the query again")
+
+        before = dict(bot.EDIT_CACHE_METRICS)
+        self.assertFalse(await bot.safe_edit_message_text(_Query(_Message("Settings", markup)), "Settings", reply_markup=markup))
+        self.assertTrue(await bot.safe_edit_message_text(_Query(_Message("Settings", markup)), "Settings", reply_markup=None))
+        self.assertTrue(await bot.safe_edit_message_text(_Query(_Message("Menu", markup)), "Settings", reply_markup=markup))
+        self.assertTrue(await bot.safe_edit_message_text(_Query(_Message("Settings", None)), "Settings", parse_mode="Markdown"))
+        self.assertEqual(len(edits), 3)
+        self.assertEqual(bot.EDIT_CACHE_METRICS["edits_avoided"] - before["edits_avoided"], 1)
+
+
 if __name__ == "__main__":
     unittest.main()